@@ -0,0 +1,241 @@
+# benchmark.py - BENCHMARK DE INFERENCIA ONNX / KERAS
+#
+# Uso:
+#   python benchmark.py --batch-sizes 1,8,32 --threads 1,2,4 --output bench.json
+#   python benchmark.py --fuente dataset --keras
+#
+# El JSON resultante se puede comparar entre commits para detectar regresiones.
+
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+PROJECT_ROOT = Path(__file__).parent
+PLANTAS_DIR = PROJECT_ROOT / "data" / "plantas"
+EXTENSIONES = ['.jpg', '.jpeg', '.png', '.JPG', '.JPEG', '.PNG']
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def rss_pico_mb():
+    """Memoria residente máxima del proceso hasta el momento (MB) o None"""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta KB, macOS bytes
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+def commit_actual():
+    """Hash corto del commit actual (None fuera de un repo git)"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+            stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+def cargar_imagenes(fuente, cantidad, tamano_sintetico, semilla=0):
+    """
+    Imágenes PIL RGB de prueba
+    
+    Args:
+        fuente: "sintetica" (ruido aleatorio) o "dataset" (muestra de data/plantas)
+        cantidad: Número de imágenes
+        tamano_sintetico: (ancho, alto) de las imágenes sintéticas
+    """
+    rng = np.random.default_rng(semilla)
+    
+    if fuente == "sintetica":
+        ancho, alto = tamano_sintetico
+        return [Image.fromarray(rng.integers(0, 256, (alto, ancho, 3), dtype=np.uint8))
+                for _ in range(cantidad)]
+    
+    rutas = sorted(ruta for ruta in PLANTAS_DIR.glob("*/*") if ruta.suffix in EXTENSIONES)
+    if not rutas:
+        raise FileNotFoundError(f"No hay imágenes en {PLANTAS_DIR}")
+    
+    elegidas = rng.choice(len(rutas), min(cantidad, len(rutas)), replace=False)
+    return [Image.open(rutas[i]).convert('RGB') for i in elegidas]
+
+def medir(funcion, iteraciones, calentamiento, imagenes_por_iteracion):
+    """
+    Ejecuta funcion(i) varias veces y resume sus latencias
+    
+    Returns:
+        dict: Percentiles de latencia (ms), imágenes/segundo y RSS pico
+    """
+    for i in range(calentamiento):
+        funcion(i)
+    
+    latencias = np.empty(iteraciones)
+    inicio_total = time.perf_counter()
+    for i in range(iteraciones):
+        inicio = time.perf_counter()
+        funcion(i)
+        latencias[i] = time.perf_counter() - inicio
+    total = time.perf_counter() - inicio_total
+    
+    latencias_ms = latencias * 1000
+    return {
+        "iteraciones": iteraciones,
+        "imagenes_por_iteracion": imagenes_por_iteracion,
+        "p50_ms": float(np.percentile(latencias_ms, 50)),
+        "p95_ms": float(np.percentile(latencias_ms, 95)),
+        "p99_ms": float(np.percentile(latencias_ms, 99)),
+        "media_ms": float(latencias_ms.mean()),
+        "imagenes_por_segundo": iteraciones * imagenes_por_iteracion / total if total > 0 else None,
+        "rss_pico_mb": rss_pico_mb()
+    }
+
+def importar_app():
+    """Importa streamlit_app sin servidor (las llamadas st.* quedan sin efecto)"""
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    sys.path.insert(0, str(PROJECT_ROOT))
+    os.chdir(PROJECT_ROOT)  # CONFIG usa rutas relativas a la raíz del proyecto
+    import streamlit_app
+    return streamlit_app
+
+def benchmark_preprocesamiento(app, imagenes, args):
+    """preprocess_image por imagen"""
+    return medir(
+        lambda i: app.preprocess_image(imagenes[i % len(imagenes)]),
+        args.iteraciones, args.calentamiento, 1
+    )
+
+def benchmark_onnx(app, imagenes, species_list, args):
+    """
+    predict_with_onnx (batch 1) y run_onnx_batch por tamaño de lote y número de hilos
+    
+    Las imágenes se preprocesan antes de medir: solo se mide la inferencia.
+    """
+    import onnxruntime as ort
+    
+    model_path = app.CONFIG["onnx_model_path"]
+    if args.int8:
+        model_path = app.CONFIG["quantized_model_path"]
+    
+    preprocesadas = np.concatenate([app.preprocess_image(imagen) for imagen in imagenes])
+    resultados = []
+    
+    for hilos in args.threads:
+        app.CONFIG["ort_intra_op_threads"] = hilos
+        session = app._create_session(ort, model_path)
+        
+        for batch_size in args.batch_sizes:
+            if batch_size == 1:
+                funcion = lambda i: app.predict_with_onnx(
+                    session, preprocesadas[i % len(preprocesadas)][np.newaxis], species_list
+                )
+                nombre = "predict_with_onnx"
+            else:
+                # Lotes tomados de forma circular de las imágenes disponibles
+                lotes = [np.take(preprocesadas, np.arange(j, j + batch_size) % len(preprocesadas), axis=0)
+                         for j in range(0, max(len(preprocesadas), batch_size), batch_size)]
+                funcion = lambda i, lotes=lotes: app.run_onnx_batch(session, lotes[i % len(lotes)])
+                nombre = "run_onnx_batch"
+            
+            metricas = medir(funcion, args.iteraciones, args.calentamiento, batch_size)
+            metricas.update({"funcion": nombre, "batch_size": batch_size, "intra_op_threads": hilos})
+            resultados.append(metricas)
+            print(f"   ONNX hilos={hilos} batch={batch_size}: p50 {metricas['p50_ms']:.2f} ms | "
+                  f"{metricas['imagenes_por_segundo']:.1f} img/s", file=sys.stderr)
+        
+        del session
+    
+    return {"modelo": Path(model_path).name, "ort_version": ort.__version__, "casos": resultados}
+
+def benchmark_keras(imagenes, args):
+    """ModelUtils.predecir_especie con el preprocesamiento de ImageProcessor"""
+    sys.path.insert(0, str(PROJECT_ROOT))
+    from model.model_utils import ModelUtils
+    from utils.image_processing import ImageProcessor
+    
+    model_utils = ModelUtils()
+    if not model_utils.cargar_modelo():
+        return {"error": "No se pudo cargar el modelo Keras"}
+    
+    processor = ImageProcessor()
+    preprocesadas = [processor.procesar_para_prediccion(np.asarray(imagen)) for imagen in imagenes]
+    
+    metricas = medir(
+        lambda i: model_utils.predecir_especie(preprocesadas[i % len(preprocesadas)]),
+        args.iteraciones, args.calentamiento, 1
+    )
+    metricas["funcion"] = "ModelUtils.predecir_especie"
+    return metricas
+
+def _lista_enteros(texto):
+    return [int(valor) for valor in texto.split(",") if valor.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de inferencia de BucaraFlora")
+    parser.add_argument("--fuente", choices=["sintetica", "dataset", "ambas"], default="ambas",
+                        help="Origen de las imágenes de prueba")
+    parser.add_argument("--num-imagenes", type=int, default=32, help="Imágenes distintas por fuente")
+    parser.add_argument("--tamano-sintetico", type=_lista_enteros, default=[640, 480],
+                        help="Ancho,alto de las imágenes sintéticas")
+    parser.add_argument("--batch-sizes", type=_lista_enteros, default=[1, 8, 32])
+    parser.add_argument("--threads", type=_lista_enteros, default=[0],
+                        help="intra_op_num_threads a probar (0 = valor por defecto de ORT)")
+    parser.add_argument("--iteraciones", type=int, default=100)
+    parser.add_argument("--calentamiento", type=int, default=10)
+    parser.add_argument("--int8", action="store_true", help="Usar el modelo cuantizado INT8")
+    parser.add_argument("--keras", action="store_true", help="Incluir ModelUtils.predecir_especie (requiere TensorFlow)")
+    parser.add_argument("--output", help="Archivo JSON de salida (por defecto stdout)")
+    args = parser.parse_args()
+    
+    app = importar_app()
+    
+    with open(PROJECT_ROOT / app.CONFIG["species_path"], 'r', encoding='utf-8') as f:
+        species_list = json.load(f)
+    
+    fuentes = ["sintetica", "dataset"] if args.fuente == "ambas" else [args.fuente]
+    
+    reporte = {
+        "timestamp": datetime.now().isoformat(),
+        "commit": commit_actual(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "argumentos": vars(args),
+        "resultados": {}
+    }
+    
+    for fuente in fuentes:
+        print(f"📊 Fuente: {fuente}", file=sys.stderr)
+        imagenes = cargar_imagenes(fuente, args.num_imagenes, args.tamano_sintetico)
+        
+        resultado = {
+            "preprocess_image": benchmark_preprocesamiento(app, imagenes, args),
+            "onnx": benchmark_onnx(app, imagenes, species_list, args)
+        }
+        if args.keras:
+            resultado["keras"] = benchmark_keras(imagenes, args)
+        
+        reporte["resultados"][fuente] = resultado
+    
+    reporte["rss_pico_mb"] = rss_pico_mb()
+    
+    salida = json.dumps(reporte, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(salida)
+        print(f"✅ Resultados guardados en {args.output}", file=sys.stderr)
+    else:
+        print(salida)
+
+if __name__ == "__main__":
+    main()
@@ -25,7 +25,12 @@ MODEL_CONFIG = {
     "base_model": "MobileNetV2",
     "freeze_base": True,
     "fine_tune_layers": 20,
-    "image_quality": 85
+    "image_quality": 85,
+    "prediction_cache_size": 128,
+    "dataset_workers": min(8, os.cpu_count() or 1),
+    "data_pipeline": "mmap",  # memoria | mmap | streaming
+    "augmentation_seed": None,  # Entero para augmentation reproducible
+    "cache_embeddings": True  # Con freeze_base, entrenar la cabeza sobre embeddings cacheados
 }
 
 # ==================== CONFIGURACIÓN DE RE-ENTRENAMIENTO ====================
@@ -38,7 +43,20 @@ RETRAINING_CONFIG = {
     "max_attempts_per_prediction": 3,
     "top_species_to_show": 6,
     "min_accuracy_to_replace": 0.80,
-    "accuracy_improvement_threshold": 0.95
+    "accuracy_improvement_threshold": 0.95,
+    "incremental_epochs": 5,
+    "incremental_learning_rate": 0.00001,
+    "incremental_replay_ratio": 2,  # Imágenes antiguas por cada imagen nueva
+    "incremental_replay_min_per_species": 2
+}
+
+# ==================== CONFIGURACIÓN DE CUANTIZACIÓN INT8 ====================
+QUANTIZATION_CONFIG = {
+    "calibration_images_per_species": 2,
+    "eval_images_per_species": 3,
+    "max_top1_drop": 0.01,  # Caída máxima de precisión top-1 aceptada
+    "max_top5_drop": 0.005,
+    "min_eval_images": 100  # Con menos imágenes no vistas el INT8 no se aprueba
 }
 
 # ==================== CONFIGURACIÓN DE FIREBASE FIRESTORE ====================
@@ -48,6 +66,18 @@ FIREBASE_CONFIG = {
     "service_account_path": "bucaraflora-f0161-firebase-adminsdk-fbsvc-be20c93d27.json",
     "database_type": "firestore",  # ← FIRESTORE, no Realtime Database
     
+    # CACHE LOCAL DE LA COLECCIÓN PLANTAS
+    "species_cache_ttl_hours": 24,  # Recargar desde Firestore pasado este tiempo
+    "species_cache_version": 1,  # Incrementar para invalidar snapshots anteriores
+    "species_cache_retry_minutes": 5,  # Espera entre cargas fallidas
+    
+    # ESCRITURA EN LOTES DE ANÁLISIS DE USUARIOS
+    "analysis_batch_size": 500,  # Máximo de Firestore por batch
+    "analysis_flush_interval_s": 2.0,
+    "analysis_max_retries": 5,
+    "analysis_backoff_base_s": 0.5,
+    "analysis_backoff_max_s": 30.0,
+    
     # COLECCIONES DE FIRESTORE
     "collections": {
         # Colección principal de plantas (tu estructura existente)
@@ -108,6 +138,14 @@ STREAMLIT_CONFIG = {
     "image_quality": 85
 }
 
+# ==================== CONFIGURACIÓN DE SESIONES ====================
+SESSION_CONFIG = {
+    "thumbnail_size": 256,  # Lado máximo de la miniatura JPEG en memoria
+    "thumbnail_quality": 75,
+    "image_max_age_hours": 2,  # Originales en disco más viejos que esto se eliminan al iniciar
+    "store_backend": "sqlite"  # memoria (por proceso) | sqlite (compartido entre workers locales)
+}
+
 # ==================== ESTADOS DEL SISTEMA ====================
 SYSTEM_STATES = {
     "training_idle": "idle",
@@ -122,8 +160,22 @@ PATHS = {
     "model_file": MODEL_DIR / MODEL_CONFIG["model_name"],
     "backup_model_file": MODEL_DIR / MODEL_CONFIG["backup_model_name"],
     "species_list_file": MODEL_DIR / MODEL_CONFIG["species_list_name"],
+    "onnx_model_file": MODEL_DIR / "plant_classifier.onnx",
+    "onnx_int8_model_file": MODEL_DIR / "plant_classifier.int8.onnx",
+    "onnx_int8_report_file": MODEL_DIR / "plant_classifier.int8.json",
     "training_log_file": LOGS_DIR / "training_logs.txt",
-    "session_data_file": DATA_DIR / "sessions.json",
+    "session_data_file": DATA_DIR / "sessions.json",  # Formato anterior, se migra al log JSONL
+    "session_log_dir": DATA_DIR / "sessions",
+    "session_stats_file": DATA_DIR / "sessions" / "estadisticas.json",
+    "session_images_dir": DATA_DIR / "cache" / "sesiones",
+    "session_store_file": DATA_DIR / "sessions" / "activas.sqlite3",
+    "dataset_cache_dir": DATA_DIR / "cache" / "imagenes",
+    "dataset_mmap_dir": DATA_DIR / "cache" / "dataset_mmap",
+    "embedding_cache_dir": DATA_DIR / "cache" / "embeddings",
+    "training_manifest_file": MODEL_DIR / "training_manifest.json",
+    "similarity_index_file": MODEL_DIR / "similarity_index.npz",
+    "species_cache_file": DATA_DIR / "cache" / "especies_firestore.json",
+    "analysis_journal_file": DATA_DIR / "analisis_pendientes.jsonl",
     "system_log_file": LOGS_DIR / "system.log"
 }
 
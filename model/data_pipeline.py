@@ -0,0 +1,136 @@
+# model/data_pipeline.py - PIPELINE tf.data EN STREAMING PARA ENTRENAMIENTO
+
+import tensorflow as tf
+import numpy as np
+import math
+import sys
+from pathlib import Path
+
+# Agregar el directorio padre al path para importar config
+sys.path.append(str(Path(__file__).parent.parent))
+from config import MODEL_CONFIG
+
+AUTOTUNE = tf.data.AUTOTUNE
+
+def decodificar_y_redimensionar(ruta):
+    """
+    Lee y decodifica una imagen, la redimensiona manteniendo aspecto con
+    padding negro (equivalente a ImageProcessor) y la normaliza a 0-1
+    """
+    target_h, target_w = MODEL_CONFIG["target_size"]
+    
+    contenido = tf.io.read_file(ruta)
+    imagen = tf.io.decode_image(contenido, channels=3, expand_animations=False)
+    imagen = tf.image.resize_with_pad(imagen, target_h, target_w)
+    imagen = imagen / 255.0
+    imagen.set_shape((target_h, target_w, 3))
+    
+    return imagen
+
+def _rotar(imagen, angulo_grados):
+    """Rota alrededor del centro con relleno negro (como cv2.warpAffine)"""
+    h = tf.cast(tf.shape(imagen)[0], tf.float32)
+    w = tf.cast(tf.shape(imagen)[1], tf.float32)
+    cx = tf.floor(w / 2)
+    cy = tf.floor(h / 2)
+    
+    angulo = angulo_grados * math.pi / 180.0
+    cos = tf.cos(angulo)
+    sin = tf.sin(angulo)
+    
+    # Transformación salida -> entrada
+    transformacion = tf.stack([
+        cos, -sin, cx - cos * cx + sin * cy,
+        sin, cos, cy - sin * cx - cos * cy,
+        0.0, 0.0
+    ])
+    
+    rotada = tf.raw_ops.ImageProjectiveTransformV3(
+        images=imagen[tf.newaxis],
+        transforms=transformacion[tf.newaxis],
+        output_shape=tf.shape(imagen)[:2],
+        fill_value=0.0,
+        interpolation="BILINEAR",
+        fill_mode="CONSTANT"
+    )
+    
+    return rotada[0]
+
+def aumentar_imagen(imagen):
+    """
+    Transformaciones equivalentes a DatasetManager._aplicar_augmentation,
+    evaluadas de nuevo en cada época
+    """
+    # Rotación aleatoria (-15 a +15 grados)
+    rotar = tf.random.uniform(()) > 0.5
+    angulo = tf.random.uniform((), -15.0, 15.0)
+    imagen = tf.cond(rotar, lambda: _rotar(imagen, angulo), lambda: imagen)
+    
+    # Flip horizontal
+    imagen = tf.cond(
+        tf.random.uniform(()) > 0.5,
+        lambda: tf.image.flip_left_right(imagen),
+        lambda: imagen
+    )
+    
+    # Ajuste de brillo
+    factor = tf.random.uniform((), 0.8, 1.2)
+    imagen = tf.cond(
+        tf.random.uniform(()) > 0.5,
+        lambda: tf.clip_by_value(imagen * factor, 0.0, 1.0),
+        lambda: imagen
+    )
+    
+    # Ruido gaussiano leve
+    imagen = tf.cond(
+        tf.random.uniform(()) > 0.7,
+        lambda: tf.clip_by_value(imagen + tf.random.normal(tf.shape(imagen), 0.0, 0.02), 0.0, 1.0),
+        lambda: imagen
+    )
+    
+    return imagen
+
+def crear_dataset_streaming(rutas, etiquetas, entrenamiento=True, incluir_augmentation=True,
+                            batch_size=None):
+    """
+    Crea un tf.data.Dataset que decodifica las imágenes bajo demanda
+    
+    Args:
+        rutas: Lista de rutas de imágenes
+        etiquetas: Etiquetas alineadas con rutas
+        entrenamiento: Si barajar y aplicar augmentation
+        incluir_augmentation: Añadir una pasada aumentada de cada imagen por época
+        batch_size: Tamaño de lote (usa config si es None)
+    
+    Returns:
+        tf.data.Dataset: Lotes (imagenes float32, etiquetas) con prefetch
+    """
+    if batch_size is None:
+        batch_size = MODEL_CONFIG["batch_size"]
+    
+    rutas = np.asarray([str(ruta) for ruta in rutas])
+    etiquetas = np.asarray(etiquetas, dtype=np.int64)
+    aumentar = np.zeros(len(rutas), dtype=bool)
+    
+    if entrenamiento and incluir_augmentation:
+        # Cada imagen aparece una vez original y una vez aumentada por época
+        rutas = np.concatenate([rutas, rutas])
+        etiquetas = np.concatenate([etiquetas, etiquetas])
+        aumentar = np.concatenate([aumentar, np.ones(len(aumentar), dtype=bool)])
+    
+    dataset = tf.data.Dataset.from_tensor_slices((rutas, etiquetas, aumentar))
+    
+    if entrenamiento:
+        # Solo se barajan rutas (strings), no píxeles
+        dataset = dataset.shuffle(len(rutas), reshuffle_each_iteration=True)
+    
+    def cargar(ruta, etiqueta, aplicar_aumento):
+        imagen = decodificar_y_redimensionar(ruta)
+        imagen = tf.cond(aplicar_aumento, lambda: aumentar_imagen(imagen), lambda: imagen)
+        return imagen, etiqueta
+    
+    dataset = dataset.map(cargar, num_parallel_calls=AUTOTUNE, deterministic=not entrenamiento)
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.prefetch(AUTOTUNE)
+    
+    return dataset
@@ -0,0 +1,99 @@
+# model/embedding_cache.py - CACHE EN DISCO DE EMBEDDINGS DEL MODELO BASE
+
+import numpy as np
+import os
+import sys
+from pathlib import Path
+
+# Agregar el directorio padre al path para importar config
+sys.path.append(str(Path(__file__).parent.parent))
+from config import MODEL_CONFIG, PATHS
+
+def version_backbone():
+    """
+    Identificador del extractor de características
+    
+    Los embeddings solo son válidos para el mismo modelo base, pesos y
+    tamaño de entrada; cambiar cualquiera usa un archivo de cache distinto.
+    """
+    h, w = MODEL_CONFIG["target_size"]
+    return f"{MODEL_CONFIG['base_model']}_imagenet_{h}x{w}_gap"
+
+class CacheEmbeddings:
+    """
+    Embeddings (salida de GlobalAveragePooling2D) indexados por hash del archivo
+    
+    Se guardan en un único .npz por versión del backbone: claves (hashes)
+    y una matriz float32 (N, D) con una fila por clave.
+    """
+    
+    def __init__(self, version=None, directorio=None):
+        self.version = version or version_backbone()
+        self.archivo = Path(directorio or PATHS["embedding_cache_dir"]) / f"{self.version}.npz"
+        self._indice = {}
+        self._vectores = None
+        self._cargar()
+    
+    def _cargar(self):
+        """Carga el archivo de cache si existe"""
+        if not self.archivo.exists():
+            return
+        
+        try:
+            with np.load(self.archivo) as datos:
+                claves = datos["claves"].tolist()
+                self._vectores = datos["vectores"]
+            self._indice = {clave: i for i, clave in enumerate(claves)}
+            print(f"💾 Cache de embeddings: {len(self._indice)} vectores ({self.version})")
+        except Exception as e:
+            print(f"⚠️ Cache de embeddings ilegible, se recalculará: {e}")
+            self._indice = {}
+            self._vectores = None
+    
+    def __contains__(self, clave):
+        return clave in self._indice
+    
+    def __len__(self):
+        return len(self._indice)
+    
+    def agregar(self, claves, vectores):
+        """Agrega vectores nuevos (se escriben a disco con guardar())"""
+        nuevos = [(clave, vector) for clave, vector in zip(claves, vectores) if clave not in self._indice]
+        if not nuevos:
+            return
+        
+        inicio = len(self._indice)
+        for i, (clave, _) in enumerate(nuevos):
+            self._indice[clave] = inicio + i
+        
+        bloque = np.asarray([vector for _, vector in nuevos], dtype=np.float32)
+        self._vectores = bloque if self._vectores is None else np.concatenate([self._vectores, bloque])
+    
+    def obtener(self, claves):
+        """
+        Retorna los embeddings de una lista de claves
+        
+        Returns:
+            tuple: (matriz float32 (N, D), máscara de claves encontradas)
+        """
+        encontradas = np.array([clave in self._indice for clave in claves], dtype=bool)
+        if self._vectores is None:
+            return np.empty((len(claves), 0), dtype=np.float32), encontradas
+        
+        filas = np.array([self._indice.get(clave, 0) for clave in claves], dtype=np.int64)
+        vectores = self._vectores[filas]
+        vectores[~encontradas] = 0
+        return vectores, encontradas
+    
+    def guardar(self):
+        """Escribe la cache de forma atómica"""
+        if self._vectores is None:
+            return
+        
+        self.archivo.parent.mkdir(parents=True, exist_ok=True)
+        claves = np.array(sorted(self._indice, key=self._indice.get))
+        
+        tmp_file = self.archivo.with_suffix(".tmp")
+        with open(tmp_file, 'wb') as f:
+            np.savez(f, claves=claves, vectores=self._vectores)
+        os.replace(tmp_file, self.archivo)
@@ -9,6 +9,37 @@ from datetime import datetime
 sys.path.append(str(Path(__file__).parent.parent))
 from config import PATHS, RETRAINING_CONFIG
 
+def top_k_indices(probabilidades, k, mascara_excluidas=None):
+    """
+    Índices de las k probabilidades más altas, de mayor a menor
+    
+    Args:
+        probabilidades: Array (clases,) o (batch, clases)
+        k: Número de índices a retornar
+        mascara_excluidas: Máscara booleana (clases,) de especies a ignorar
+    
+    Returns:
+        numpy array (k,) o (batch, k). Si quedan menos de k especies válidas,
+        las posiciones sobrantes pueden contener índices excluidos.
+    """
+    puntajes = probabilidades
+    if mascara_excluidas is not None:
+        puntajes = np.where(mascara_excluidas, -np.inf, probabilidades)
+    
+    num_clases = puntajes.shape[-1]
+    k = min(k, num_clases)
+    
+    if k < num_clases:
+        candidatos = np.argpartition(puntajes, -k, axis=-1)[..., -k:]
+    else:
+        candidatos = np.broadcast_to(np.arange(num_clases), puntajes.shape)
+    
+    # Ordenar solo los k candidatos (de mayor a menor)
+    valores = np.take_along_axis(puntajes, candidatos, axis=-1)
+    orden = np.argsort(-valores, axis=-1, kind="stable")
+    
+    return np.take_along_axis(candidatos, orden, axis=-1)
+
 class ModelUtils:
     """Utilidades para cargar y usar el modelo entrenado"""
     
@@ -17,6 +48,9 @@ class ModelUtils:
         self.species_names = None
         self.num_classes = None
         self.metadata = None
+        self._indice_especies = {}
+        self._indice_similitud = None
+        self._modelo_embeddings = None
     
     def cargar_modelo(self):
         """
@@ -56,6 +90,9 @@ class ModelUtils:
                     print(f"❌ No se encontraron metadatos ni lista de especies")
                     return False
             
+            # Índice nombre -> posición para exclusiones en O(1)
+            self._indice_especies = {nombre: idx for idx, nombre in enumerate(self.species_names)}
+            
             return True
             
         except Exception as e:
@@ -79,113 +116,160 @@ class ModelUtils:
         try:
             # Hacer predicción inicial
             predicciones = self.model.predict(imagen_procesada, verbose=0)
-            predicciones = predicciones[0]  # Remover dimensión batch
-            predicciones_originales = predicciones.copy()  # Guardar copia original
             
-            # 🔧 DEBUG: Verificar exclusiones
-            if especies_excluir:
-                print(f"🚫 ModelUtils: Excluyendo {len(especies_excluir)} especies")
-                especies_excluidas_indices = []
-                
-                # Aplicar exclusiones si se especifican
-                for especie in especies_excluir:
-                    if especie in self.species_names:
-                        idx = self.species_names.index(especie)
-                        especies_excluidas_indices.append(idx)
-                        # Poner probabilidad muy baja (no 0 para evitar división por 0)
-                        predicciones[idx] = 1e-10
-                        print(f"   🚫 Excluida: {especie} (índice {idx}, prob original: {predicciones_originales[idx]:.4f})")
-                
-                # Re-normalizar probabilidades
-                suma_predicciones = np.sum(predicciones)
-                if suma_predicciones > 0:
-                    predicciones = predicciones / suma_predicciones
-                    print(f"✅ ModelUtils: Predicciones re-normalizadas (suma: {suma_predicciones:.4f})")
-                else:
-                    print("⚠️ WARNING: Suma de predicciones es 0 después de exclusiones")
-                    # Fallback: restaurar predicciones originales y tomar siguiente mejor
-                    predicciones = predicciones_originales.copy()
-                    for idx in especies_excluidas_indices:
-                        predicciones[idx] = 0
+            return self.rankear_predicciones(predicciones[0], especies_excluir)
             
-            # Obtener índice de la predicción principal
-            idx_prediccion = np.argmax(predicciones)
-            confianza = float(predicciones[idx_prediccion])
-            especie_predicha = self.species_names[idx_prediccion]
+        except Exception as e:
+            print(f"❌ ERROR en predicción: {e}")
+            return {"error": f"Error en predicción: {e}"}
+    
+    def calcular_probabilidades(self, imagen_procesada):
+        """
+        Ejecuta solo el forward pass del modelo
+        
+        Args:
+            imagen_procesada: Imagen procesada con batch dimension (1, 224, 224, 3)
+        
+        Returns:
+            numpy array (clases,) con las probabilidades o None si falla
+        """
+        if self.model is None:
+            return None
+        
+        try:
+            return self.model.predict(imagen_procesada, verbose=0)[0]
+        except Exception as e:
+            print(f"❌ ERROR en forward pass: {e}")
+            return None
+    
+    def predecir_lote(self, imagenes_procesadas, especies_excluir=None, top_k=10):
+        """
+        Predice varias imágenes en una sola pasada del modelo
+        
+        Args:
+            imagenes_procesadas: Array (batch, 224, 224, 3)
+            especies_excluir: Especies a excluir (comunes a todo el lote)
+            top_k: Número de predicciones por imagen
+        
+        Returns:
+            list: Un diccionario por imagen con la misma estructura que predecir_especie
+        """
+        if self.model is None:
+            return [{"error": "Modelo no cargado"}]
+        
+        try:
+            predicciones = self.model.predict(imagenes_procesadas, verbose=0)
+            mascara = self._mascara_exclusion(especies_excluir)
             
-            # 🔧 VERIFICACIÓN CRÍTICA: ¿La predicción está en especies excluidas?
-            if especies_excluir and especie_predicha in especies_excluir:
-                print(f"⚠️ CRITICAL: Predicción '{especie_predicha}' está en especies excluidas!")
-                
-                # Buscar la siguiente mejor que NO esté excluida
-                indices_ordenados = np.argsort(predicciones)[::-1]  # De mayor a menor
-                
-                prediccion_encontrada = False
-                for idx in indices_ordenados:
-                    especie_candidata = self.species_names[idx]
-                    if especies_excluir is None or especie_candidata not in especies_excluir:
-                        idx_prediccion = idx
-                        confianza = float(predicciones[idx])
-                        especie_predicha = especie_candidata
-                        print(f"✅ OVERRIDE: Usando '{especie_predicha}' en su lugar (confianza: {confianza:.4f})")
-                        prediccion_encontrada = True
-                        break
-                
-                if not prediccion_encontrada:
-                    print("❌ CRITICAL: No se encontró ninguna especie válida!")
-                    return {
-                        "error": "No hay especies válidas disponibles",
-                        "mensaje": "Todas las especies posibles están excluidas"
-                    }
+            # Top-k vectorizado sobre toda la matriz (batch, clases)
+            top_lote = top_k_indices(predicciones, top_k, mascara)
             
-            # 🔧 SEGUNDA VERIFICACIÓN: Confianza mínima
-            if confianza < 1e-8:
-                print(f"⚠️ WARNING: Confianza muy baja: {confianza}")
-                # Buscar alternativa con mejor confianza
-                indices_ordenados = np.argsort(predicciones_originales)[::-1]
-                for idx in indices_ordenados:
-                    especie_candidata = self.species_names[idx]
-                    confianza_candidata = float(predicciones_originales[idx])
-                    if (especies_excluir is None or especie_candidata not in especies_excluir) and confianza_candidata > 1e-8:
-                        idx_prediccion = idx
-                        confianza = confianza_candidata
-                        especie_predicha = especie_candidata
-                        print(f"✅ FALLBACK: Usando '{especie_predicha}' (confianza original: {confianza:.4f})")
-                        break
+            return [
+                self.rankear_predicciones(fila, especies_excluir, top_k=top_k, top_indices=top_fila)
+                for fila, top_fila in zip(predicciones, top_lote)
+            ]
             
-            # Obtener top-K predicciones (sin especies excluidas)
-            top_indices = np.argsort(predicciones_originales)[::-1]
-            top_predicciones = []
+        except Exception as e:
+            print(f"❌ ERROR en predicción por lote: {e}")
+            return [{"error": f"Error en predicción: {e}"}]
+    
+    def _mascara_exclusion(self, especies_excluir):
+        """Construye la máscara booleana de especies excluidas (None si no hay)"""
+        if not especies_excluir:
+            return None
+        
+        indices = [self._indice_especies[especie] for especie in especies_excluir
+                   if especie in self._indice_especies]
+        
+        if not indices:
+            return None
+        
+        mascara = np.zeros(len(self.species_names), dtype=bool)
+        mascara[indices] = True
+        return mascara
+    
+    def rankear_predicciones(self, predicciones_originales, especies_excluir=None, top_k=10, top_indices=None):
+        """
+        Aplica exclusiones y construye el resultado a partir de un vector de probabilidades
+        
+        Args:
+            predicciones_originales: Vector de probabilidades (clases,) del modelo
+            especies_excluir: Especies a excluir
+            top_k: Número de predicciones en top_predicciones
+            top_indices: Top-k ya calculado (opcional, para lotes)
+        
+        Returns:
+            dict: Información de la predicción
+        """
+        mascara = self._mascara_exclusion(especies_excluir)
+        predicciones = predicciones_originales
+        
+        if mascara is not None:
+            print(f"🚫 ModelUtils: Excluyendo {int(mascara.sum())} especies")
             
-            for idx in top_indices:
-                especie_top = self.species_names[idx]
-                confianza_top = float(predicciones_originales[idx])
-                
-                # Solo incluir si no está excluida
-                if especies_excluir is None or especie_top not in especies_excluir:
-                    top_predicciones.append({
-                        "especie": especie_top,
-                        "confianza": confianza_top,
-                        "indice": int(idx)
-                    })
-                
-                # Limitar a top 10
-                if len(top_predicciones) >= 10:
-                    break
+            # Poner probabilidad muy baja (no 0 para evitar división por 0) y re-normalizar
+            predicciones = predicciones_originales.copy()
+            predicciones[mascara] = 1e-10
             
-            resultado = {
-                "especie_predicha": especie_predicha,
-                "confianza": confianza,
-                "indice_especie": int(idx_prediccion),
-                "top_predicciones": top_predicciones
-            }
+            suma_predicciones = np.sum(predicciones)
+            if suma_predicciones > 0:
+                predicciones /= suma_predicciones
+            else:
+                print("⚠️ WARNING: Suma de predicciones es 0 después de exclusiones")
+                predicciones = predicciones_originales.copy()
+                predicciones[mascara] = 0
             
-            print(f"✅ ModelUtils: Predicción final: {especie_predicha} (confianza: {confianza:.4f})")
-            return resultado
+            # Mejor especie que NO esté excluida
+            if mascara.all():
+                print("❌ CRITICAL: No se encontró ninguna especie válida!")
+                return {
+                    "error": "No hay especies válidas disponibles",
+                    "mensaje": "Todas las especies posibles están excluidas"
+                }
+            idx_prediccion = int(np.argmax(np.where(mascara, -np.inf, predicciones)))
+        else:
+            idx_prediccion = int(np.argmax(predicciones))
+        
+        confianza = float(predicciones[idx_prediccion])
+        
+        # Confianza mínima: usar la mejor probabilidad original válida
+        if confianza < 1e-8:
+            print(f"⚠️ WARNING: Confianza muy baja: {confianza}")
+            validas = predicciones_originales > 1e-8
+            if mascara is not None:
+                validas &= ~mascara
             
-        except Exception as e:
-            print(f"❌ ERROR en predicción: {e}")
-            return {"error": f"Error en predicción: {e}"}
+            if validas.any():
+                idx_prediccion = int(np.argmax(np.where(validas, predicciones_originales, -np.inf)))
+                confianza = float(predicciones_originales[idx_prediccion])
+                print(f"✅ FALLBACK: Usando '{self.species_names[idx_prediccion]}' (confianza original: {confianza:.4f})")
+        
+        especie_predicha = self.species_names[idx_prediccion]
+        
+        # Top-K sobre probabilidades originales (sin especies excluidas)
+        if top_indices is None:
+            top_indices = top_k_indices(predicciones_originales, top_k, mascara)
+        if mascara is not None:
+            top_indices = top_indices[~mascara[top_indices]]
+        
+        top_predicciones = [
+            {
+                "especie": self.species_names[idx],
+                "confianza": float(predicciones_originales[idx]),
+                "indice": int(idx)
+            }
+            for idx in top_indices
+        ]
+        
+        resultado = {
+            "especie_predicha": especie_predicha,
+            "confianza": confianza,
+            "indice_especie": idx_prediccion,
+            "top_predicciones": top_predicciones
+        }
+        
+        print(f"✅ ModelUtils: Predicción final: {especie_predicha} (confianza: {confianza:.4f})")
+        return resultado
     
     def obtener_top_especies(self, imagen_procesada, top_k=6, especies_excluir=None):
         """
@@ -200,7 +284,25 @@ class ModelUtils:
             list: Lista de especies ordenadas por probabilidad
         """
         prediccion = self.predecir_especie(imagen_procesada, especies_excluir)
+        return self._extraer_top_especies(prediccion, top_k)
+    
+    def obtener_top_desde_probabilidades(self, probabilidades, top_k=6, especies_excluir=None):
+        """
+        Igual que obtener_top_especies pero a partir de probabilidades ya calculadas
+        
+        Args:
+            probabilidades: Vector (clases,) retornado por calcular_probabilidades
+            top_k: Número de especies a retornar
+            especies_excluir: Especies a excluir
         
+        Returns:
+            list: Lista de especies ordenadas por probabilidad
+        """
+        prediccion = self.rankear_predicciones(probabilidades, especies_excluir, top_k=max(top_k, 10))
+        return self._extraer_top_especies(prediccion, top_k)
+    
+    def _extraer_top_especies(self, prediccion, top_k):
+        """Recorta top_predicciones a top_k con el log habitual"""
         if "error" in prediccion:
             print(f"❌ Error en obtener_top_especies: {prediccion['error']}")
             return []
@@ -355,6 +457,9 @@ class ModelUtils:
         """
         Obtiene especies similares basándose en características del modelo
         
+        Usa los centroides de embeddings del índice de similitud; sin índice
+        retorna especies del mismo género.
+        
         Args:
             especie_objetivo: Nombre de la especie objetivo
             cantidad: Número de especies similares a retornar
@@ -362,12 +467,15 @@ class ModelUtils:
         Returns:
             list: Lista de especies similares
         """
-        if not self.species_names or especie_objetivo not in self.species_names:
+        if not self.species_names or especie_objetivo not in self._indice_especies:
             return []
         
         try:
-            # Para un modelo más sofisticado, esto podría usar embeddings
-            # Por ahora, retornar especies del mismo género o familia
+            indice = self._obtener_indice_similitud()
+            if indice is not None:
+                return [especie for especie, _ in indice.especies_similares(especie_objetivo, cantidad)]
+            
+            # Sin índice: especies del mismo género
             genero_objetivo = especie_objetivo.split('_')[0]
             
             especies_similares = []
@@ -384,6 +492,108 @@ class ModelUtils:
             print(f"❌ Error obteniendo especies similares: {e}")
             return []
     
+    def obtener_imagenes_similares(self, imagen_procesada, cantidad=5):
+        """
+        Imágenes de referencia del dataset más parecidas a una imagen
+        
+        Args:
+            imagen_procesada: Imagen procesada con batch dimension (1, 224, 224, 3)
+            cantidad: Número de imágenes a retornar
+        
+        Returns:
+            list: [{"ruta", "especie", "similitud"}, ...] (vacía sin índice)
+        """
+        indice = self._obtener_indice_similitud()
+        if indice is None:
+            return []
+        
+        try:
+            embedding = self.calcular_embeddings(imagen_procesada)[0]
+            return indice.imagenes_similares(embedding, cantidad)
+        except Exception as e:
+            print(f"❌ Error obteniendo imágenes similares: {e}")
+            return []
+    
+    def calcular_embeddings(self, imagenes_procesadas):
+        """
+        Salida de la penúltima capa (Dense antes de predictions)
+        
+        Args:
+            imagenes_procesadas: Array (N, 224, 224, 3)
+        
+        Returns:
+            numpy array (N, D)
+        """
+        if self._modelo_embeddings is None:
+            capas_densas = [capa for capa in self.model.layers if isinstance(capa, tf.keras.layers.Dense)]
+            self._modelo_embeddings = tf.keras.Model(self.model.inputs, capas_densas[-2].output)
+        
+        return self._modelo_embeddings.predict(imagenes_procesadas, verbose=0)
+    
+    def _obtener_indice_similitud(self):
+        """
+        Carga (una vez) el índice de similitud si corresponde al modelo actual
+        
+        Un índice de otro modelo (especies o huella del archivo distintas) se
+        ignora como si no existiera; se reconstruye al entrenar
+        (actualizar_indice_similitud) o con
+        `python model/model_utils.py --reconstruir-indice`.
+        """
+        if self._indice_similitud is None:
+            from model.similarity_index import IndiceSimilitud, huella_modelo
+            
+            indice = IndiceSimilitud.cargar()
+            if indice is not None and (indice.species_names != list(self.species_names) or
+                                       indice.huella_modelo != huella_modelo()):
+                print("⚠️ Índice de similitud desactualizado respecto al modelo, se ignora")
+                indice = None
+            
+            # False: ya se intentó cargar y no hay índice válido
+            self._indice_similitud = indice if indice is not None else False
+        
+        return self._indice_similitud or None
+    
+    def construir_indice_similitud(self, tamano_bloque=256):
+        """
+        Calcula los embeddings de todo el dataset y guarda el índice de similitud
+        
+        Returns:
+            IndiceSimilitud o None si el dataset no coincide con el modelo
+        """
+        from model.similarity_index import IndiceSimilitud, huella_modelo
+        from utils.image_processing import DatasetManager
+        
+        dataset_manager = DatasetManager()
+        rutas, etiquetas, nombres_especies = dataset_manager.listar_imagenes_dataset(verbose=False)
+        
+        if nombres_especies != list(self.species_names):
+            print("⚠️ Las carpetas del dataset no coinciden con las especies del modelo, índice no construido")
+            return None
+        
+        print(f"🧮 Construyendo índice de similitud con {len(rutas)} imágenes...")
+        
+        embeddings = []
+        validas = []
+        for inicio in range(0, len(rutas), tamano_bloque):
+            imagenes, validas_bloque = dataset_manager.cargar_imagenes_uint8(rutas[inicio:inicio + tamano_bloque])
+            validas.append(validas_bloque)
+            if validas_bloque.any():
+                entrada = np.divide(imagenes[validas_bloque], np.float32(255.0), dtype=np.float32)
+                embeddings.append(self.calcular_embeddings(entrada))
+        
+        validas = np.concatenate(validas)
+        indice = IndiceSimilitud.desde_embeddings(
+            np.concatenate(embeddings),
+            np.asarray(etiquetas)[validas],
+            self.species_names,
+            [ruta for ruta, ok in zip(rutas, validas) if ok],
+            huella=huella_modelo()
+        )
+        indice.guardar()
+        
+        self._indice_similitud = indice
+        return indice
+    
     def test_prediccion_con_exclusiones(self, test_image=None, especies_a_excluir=None):
         """
         Función de test para verificar que las exclusiones funcionan correctamente
@@ -573,4 +783,10 @@ if __name__ == "__main__":
         
         # Ejecutar test de exclusiones
         print(f"\n🧪 EJECUTANDO TEST DE EXCLUSIONES...")
-        test_exclusiones_modelo()
\ No newline at end of file
+        test_exclusiones_modelo()
+        
+        # python model/model_utils.py --reconstruir-indice
+        if "--reconstruir-indice" in sys.argv:
+            model_utils = ModelUtils()
+            if model_utils.cargar_modelo():
+                model_utils.construir_indice_similitud()
\ No newline at end of file
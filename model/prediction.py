@@ -4,15 +4,17 @@ from pathlib import Path
 from datetime import datetime
 import requests
 import json
+from collections import OrderedDict
 
 # Agregar directorio padre al path
 sys.path.append(str(Path(__file__).parent.parent))
 
-from config import RETRAINING_CONFIG, API_CONFIG
+from config import RETRAINING_CONFIG, API_CONFIG, MODEL_CONFIG
 from model.model_utils import ModelUtils
-from utils.image_processing import procesar_imagen_simple
-from utils.firebase_config import obtener_info_planta, guardar_analisis
-from utils.session_manager import SesionPrediccion
+from utils.image_processing import procesar_imagen_simple, calcular_hash_imagen
+from utils.firebase_config import obtener_info_planta, obtener_info_plantas_lote, guardar_analisis
+from utils.session_manager import SesionPrediccion, guardar_sesion_activa, sesion_desactualizada
+from utils.tracing import span
 
 class PlantPredictor:
     """Sistema principal de predicción de plantas"""
@@ -20,6 +22,11 @@ class PlantPredictor:
     def __init__(self):
         self.model_utils = None
         self.modelo_cargado = False
+        
+        # Probabilidades por imagen (hash del contenido -> vector)
+        self._cache_probabilidades = OrderedDict()
+        self.max_cache_probabilidades = MODEL_CONFIG["prediction_cache_size"]
+        
         self.cargar_modelo()
     
     def cargar_modelo(self):
@@ -41,6 +48,40 @@ class PlantPredictor:
         """Verifica si el modelo está disponible"""
         return self.modelo_cargado and self.model_utils is not None
     
+    def obtener_probabilidades(self, imagen):
+        """
+        Retorna el vector de probabilidades de una imagen, ejecutando el modelo
+        solo la primera vez (cache por hash del contenido)
+        
+        Args:
+            imagen: Imagen a analizar (PIL Image, numpy array, etc.)
+        
+        Returns:
+            numpy array (clases,) o None si no se pudo procesar
+        """
+        with span("hash"):
+            clave = calcular_hash_imagen(imagen)
+        
+        if clave is not None and clave in self._cache_probabilidades:
+            self._cache_probabilidades.move_to_end(clave)
+            return self._cache_probabilidades[clave]
+        
+        with span("preprocess"):
+            imagen_procesada = procesar_imagen_simple(imagen)
+        if imagen_procesada is None:
+            return None
+        
+        with span("inference"):
+            probabilidades = self.model_utils.calcular_probabilidades(imagen_procesada)
+        
+        if probabilidades is not None and clave is not None:
+            probabilidades.setflags(write=False)  # Compartido entre intentos
+            self._cache_probabilidades[clave] = probabilidades
+            while len(self._cache_probabilidades) > self.max_cache_probabilidades:
+                self._cache_probabilidades.popitem(last=False)
+        
+        return probabilidades
+    
     def predecir_planta(self, imagen, especies_excluir=None):
         """
         Predice la especie de una planta
@@ -59,23 +100,25 @@ class PlantPredictor:
             }
         
         try:
-            # Procesar imagen
-            imagen_procesada = procesar_imagen_simple(imagen)
+            # Probabilidades (forward pass solo la primera vez por imagen)
+            probabilidades = self.obtener_probabilidades(imagen)
             
-            if imagen_procesada is None:
+            if probabilidades is None:
                 return {
                     "error": "Error procesando imagen",
                     "mensaje": "No se pudo procesar la imagen"
                 }
             
-            # Hacer predicción
-            resultado = self.model_utils.predecir_especie(imagen_procesada, especies_excluir)
+            # Re-rankear con las exclusiones actuales
+            with span("topk"):
+                resultado = self.model_utils.rankear_predicciones(probabilidades, especies_excluir)
             
             if "error" in resultado:
                 return resultado
             
             # Obtener información adicional de la especie
-            info_especie = obtener_info_planta(resultado["especie_predicha"])
+            with span("db_lookup"):
+                info_especie = obtener_info_planta(resultado["especie_predicha"])
             
             # Preparar respuesta completa
             respuesta = {
@@ -111,23 +154,25 @@ class PlantPredictor:
             return []
         
         try:
-            # Procesar imagen
-            imagen_procesada = procesar_imagen_simple(imagen)
+            # Probabilidades cacheadas de la imagen
+            probabilidades = self.obtener_probabilidades(imagen)
             
-            if imagen_procesada is None:
+            if probabilidades is None:
                 return []
             
             # Obtener top especies
-            top_especies = self.model_utils.obtener_top_especies(
-                imagen_procesada, cantidad, especies_excluir
+            top_especies = self.model_utils.obtener_top_desde_probabilidades(
+                probabilidades, cantidad, especies_excluir
             )
             
+            # Información de todas las especies en una sola lectura
+            with span("db_lookup"):
+                infos_especies = obtener_info_plantas_lote([especie_data["especie"] for especie_data in top_especies])
+            
             # Agregar información completa de cada especie
             especies_completas = []
             
-            for especie_data in top_especies:
-                info_especie = obtener_info_planta(especie_data["especie"])
-                
+            for especie_data, info_especie in zip(top_especies, infos_especies):
                 especie_completa = {
                     "especie": especie_data["especie"],
                     "confianza": especie_data["confianza"],
@@ -267,6 +312,8 @@ class SessionManager:
                 confianza=resultado["confianza"],
                 correcto=None  # Usuario aún no ha confirmado
             )
+            if not guardar_sesion_activa(sesion):
+                return sesion_desactualizada(sesion.session_id)
         
         return resultado
     
@@ -277,6 +324,9 @@ class SessionManager:
             confianza=sesion.predicciones_anteriores[-1]["confianza"] if sesion.predicciones_anteriores else 0.0,
             correcto=True
         )
+        if not guardar_sesion_activa(sesion):
+            # Otro worker actualizó la sesión primero: no duplicar el feedback
+            return sesion_desactualizada(sesion.session_id)
         
         # Guardar feedback
         return self.predictor.guardar_resultado_feedback(
@@ -288,19 +338,30 @@ class SessionManager:
         )
     
     def rechazar_prediccion(self, sesion, especie_rechazada):
-        """Rechaza la predicción actual"""
+        """
+        Rechaza la predicción actual
+        
+        Returns:
+            bool: Si ya hay que mostrar las top especies; None si otro worker
+                  modificó la sesión
+        """
         # Actualizar sesión
         if sesion.predicciones_anteriores:
             sesion.predicciones_anteriores[-1]["correcto"] = False
         
         sesion.especies_descartadas.add(especie_rechazada)
         sesion.intento_actual += 1
+        if not guardar_sesion_activa(sesion):
+            return None
         
         return sesion.necesita_top_especies()
     
     def completar_con_seleccion_manual(self, sesion, especie_seleccionada):
         """Completa la sesión con selección manual del usuario"""
         sesion.completar_con_seleccion_manual(especie_seleccionada)
+        if not guardar_sesion_activa(sesion):
+            # Otro worker actualizó la sesión primero: no duplicar el feedback
+            return sesion_desactualizada(sesion.session_id)
         
         # Guardar feedback
         return self.predictor.guardar_resultado_feedback(
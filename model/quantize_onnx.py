@@ -0,0 +1,256 @@
+# model/quantize_onnx.py - CUANTIZACIÓN ESTÁTICA INT8 DEL MODELO ONNX
+
+import numpy as np
+import json
+import sys
+import time
+import hashlib
+from pathlib import Path
+from datetime import datetime
+from PIL import Image
+
+# Agregar el directorio padre al path para importar config
+sys.path.append(str(Path(__file__).parent.parent))
+from config import MODEL_CONFIG, PATHS, QUANTIZATION_CONFIG
+from utils.image_processing import DatasetManager
+
+def preprocesar_imagen(ruta):
+    """
+    Mismo preprocesamiento que streamlit_app.preprocess_image
+    
+    Returns:
+        numpy array float32 (224, 224, 3) normalizado 0-1
+    """
+    imagen = Image.open(ruta).convert('RGB')
+    imagen = imagen.resize(MODEL_CONFIG["target_size"], Image.Resampling.LANCZOS)
+    return np.asarray(imagen, dtype=np.float32) / 255.0
+
+def hash_archivo(ruta):
+    """Hash del contenido de un archivo (identifica el modelo fp32 evaluado)"""
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            hasher.update(bloque)
+    return hasher.hexdigest()
+
+def seleccionar_imagenes(species_list, semilla=42):
+    """
+    Elige imágenes de calibración y de evaluación (disjuntas) por especie
+    
+    La evaluación sale de la validación persistida en el manifiesto de
+    entrenamiento y de imágenes que el modelo no vio; la calibración puede
+    usar imágenes de entrenamiento.
+    
+    Args:
+        species_list: Lista de especies del modelo ONNX (define las etiquetas)
+        semilla: Semilla del muestreo
+    
+    Returns:
+        tuple: (rutas_calibracion, rutas_evaluacion, etiquetas_evaluacion)
+    """
+    rng = np.random.default_rng(semilla)
+    n_calibracion = QUANTIZATION_CONFIG["calibration_images_per_species"]
+    n_evaluacion = QUANTIZATION_CONFIG["eval_images_per_species"]
+    
+    dataset_manager = DatasetManager()
+    rutas, etiquetas, nombres_especies = dataset_manager.listar_imagenes_dataset(verbose=False)
+    indice_modelo = {nombre: idx for idx, nombre in enumerate(species_list)}
+    
+    manifiesto = dataset_manager.cargar_manifiesto_entrenamiento()
+    if manifiesto.get("validacion"):
+        no_vistas = dataset_manager.marcar_validacion(rutas, manifiesto)
+        no_vistas |= [dataset_manager.es_imagen_nueva(ruta, manifiesto) for ruta in rutas]
+    else:
+        print("⚠️ El manifiesto no registra la validación: la evaluación incluye imágenes de entrenamiento")
+        no_vistas = np.ones(len(rutas), dtype=bool)
+    
+    por_especie = {}
+    for ruta, etiqueta, no_vista in zip(rutas, etiquetas, no_vistas):
+        por_especie.setdefault(nombres_especies[etiqueta], ([], []))[0 if no_vista else 1].append(ruta)
+    
+    calibracion, evaluacion, etiquetas_evaluacion = [], [], []
+    for especie, (rutas_no_vistas, rutas_entrenadas) in por_especie.items():
+        if especie not in indice_modelo:
+            continue
+        
+        # Evaluación primero y solo con imágenes no vistas; el resto puede calibrar
+        no_vistas_especie = [rutas_no_vistas[i] for i in rng.permutation(len(rutas_no_vistas))]
+        eval_especie = no_vistas_especie[:n_evaluacion]
+        evaluacion.extend(eval_especie)
+        etiquetas_evaluacion.extend([indice_modelo[especie]] * len(eval_especie))
+        
+        restantes = no_vistas_especie[n_evaluacion:] + rutas_entrenadas
+        calibracion.extend(restantes[i] for i in rng.permutation(len(restantes))[:n_calibracion])
+    
+    return calibracion, evaluacion, np.asarray(etiquetas_evaluacion, dtype=np.int64)
+
+def evaluar_modelo_onnx(model_path, rutas, etiquetas, batch_size=32):
+    """
+    Top-1 / top-5 y latencia de un modelo ONNX sobre un conjunto de imágenes
+    
+    Returns:
+        dict: Métricas de precisión, latencia y tamaño
+    """
+    import onnxruntime as ort
+    
+    session = ort.InferenceSession(str(model_path))
+    entrada = session.get_inputs()[0]
+    input_name = entrada.name
+    dimension_batch = entrada.shape[0]
+    if isinstance(dimension_batch, int) and dimension_batch > 0:
+        batch_size = dimension_batch
+    
+    aciertos_top1 = 0
+    aciertos_top5 = 0
+    latencias = []
+    
+    for inicio in range(0, len(rutas), batch_size):
+        lote = np.stack([preprocesar_imagen(ruta) for ruta in rutas[inicio:inicio + batch_size]])
+        n = len(lote)
+        if n < batch_size and isinstance(dimension_batch, int):
+            lote = np.concatenate([lote, np.zeros((batch_size - n,) + lote.shape[1:], dtype=np.float32)])
+        
+        inicio_tiempo = time.perf_counter()
+        probabilidades = session.run(None, {input_name: lote})[0][:n]
+        latencias.append((time.perf_counter() - inicio_tiempo) / n)
+        
+        reales = etiquetas[inicio:inicio + n]
+        k = min(5, probabilidades.shape[1])
+        top5 = np.argpartition(probabilidades, -k, axis=1)[:, -k:]
+        aciertos_top1 += int((probabilidades.argmax(axis=1) == reales).sum())
+        aciertos_top5 += int((top5 == reales[:, None]).any(axis=1).sum())
+    
+    total = max(len(rutas), 1)
+    return {
+        "top1": aciertos_top1 / total,
+        "top5": aciertos_top5 / total,
+        "latencia_ms_por_imagen": float(np.mean(latencias) * 1000) if latencias else 0.0,
+        "tamano_mb": Path(model_path).stat().st_size / (1024 * 1024),
+        "imagenes": len(rutas)
+    }
+
+def _crear_lector_calibracion(input_name, rutas):
+    """CalibrationDataReader que entrega una imagen por llamada"""
+    from onnxruntime.quantization import CalibrationDataReader
+    
+    class LectorCalibracion(CalibrationDataReader):
+        def __init__(self):
+            self._indice = 0
+        
+        def get_next(self):
+            if self._indice >= len(rutas):
+                return None
+            imagen = preprocesar_imagen(rutas[self._indice])[np.newaxis]
+            self._indice += 1
+            return {input_name: imagen}
+        
+        def rewind(self):
+            self._indice = 0
+    
+    return LectorCalibracion()
+
+def cuantizar_modelo():
+    """
+    Genera el modelo INT8, lo compara con el fp32 y escribe el reporte
+    
+    El modelo cuantizado solo queda aprobado si se evaluó con al menos
+    min_eval_images imágenes y la caída de top-1 y top-5 está dentro de la
+    tolerancia de QUANTIZATION_CONFIG; streamlit_app solo lo sirve con el
+    reporte aprobado y el mismo modelo fp32.
+    
+    Returns:
+        dict: Reporte de la cuantización
+    """
+    import onnxruntime as ort
+    from onnxruntime.quantization import quantize_static, QuantFormat, QuantType, CalibrationMethod
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+    
+    modelo_fp32 = PATHS["onnx_model_file"]
+    modelo_int8 = PATHS["onnx_int8_model_file"]
+    reporte_file = PATHS["onnx_int8_report_file"]
+    
+    if not modelo_fp32.exists():
+        raise FileNotFoundError(f"Modelo ONNX no encontrado: {modelo_fp32}")
+    
+    with open(PATHS["species_list_file"], 'r', encoding='utf-8') as f:
+        species_list = json.load(f)
+    
+    calibracion, evaluacion, etiquetas_evaluacion = seleccionar_imagenes(species_list)
+    print(f"📊 Calibración: {len(calibracion)} imágenes | Evaluación: {len(evaluacion)} imágenes")
+    
+    # Inferencia de shapes y fusión previa recomendadas para cuantización estática
+    modelo_preprocesado = modelo_int8.with_name(modelo_int8.stem + ".pre.onnx")
+    quant_pre_process(str(modelo_fp32), str(modelo_preprocesado))
+    
+    input_name = ort.InferenceSession(str(modelo_fp32)).get_inputs()[0].name
+    
+    print("🔧 Cuantizando a INT8 (QDQ, por canal)...")
+    quantize_static(
+        str(modelo_preprocesado),
+        str(modelo_int8),
+        _crear_lector_calibracion(input_name, calibracion),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QInt8,
+        weight_type=QuantType.QInt8,
+        calibrate_method=CalibrationMethod.MinMax
+    )
+    modelo_preprocesado.unlink(missing_ok=True)
+    
+    print("📈 Evaluando fp32 vs INT8...")
+    metricas_fp32 = evaluar_modelo_onnx(modelo_fp32, evaluacion, etiquetas_evaluacion)
+    metricas_int8 = evaluar_modelo_onnx(modelo_int8, evaluacion, etiquetas_evaluacion)
+    
+    caida_top1 = metricas_fp32["top1"] - metricas_int8["top1"]
+    caida_top5 = metricas_fp32["top5"] - metricas_int8["top5"]
+    evaluacion_suficiente = len(evaluacion) >= QUANTIZATION_CONFIG["min_eval_images"]
+    if not evaluacion_suficiente:
+        print(f"⚠️ Solo {len(evaluacion)} imágenes de evaluación "
+              f"(mínimo {QUANTIZATION_CONFIG['min_eval_images']}): el modelo INT8 no se aprueba")
+    aprobado = (evaluacion_suficiente and
+                caida_top1 <= QUANTIZATION_CONFIG["max_top1_drop"] and
+                caida_top5 <= QUANTIZATION_CONFIG["max_top5_drop"])
+    
+    reporte = {
+        "timestamp": datetime.now().isoformat(),
+        "aprobado": aprobado,
+        "modelo_fp32": modelo_fp32.name,
+        "modelo_fp32_hash": hash_archivo(modelo_fp32),
+        "modelo_int8": modelo_int8.name,
+        "fp32": metricas_fp32,
+        "int8": metricas_int8,
+        "caida_top1": caida_top1,
+        "caida_top5": caida_top5,
+        "tolerancia": {
+            "max_top1_drop": QUANTIZATION_CONFIG["max_top1_drop"],
+            "max_top5_drop": QUANTIZATION_CONFIG["max_top5_drop"],
+            "min_eval_images": QUANTIZATION_CONFIG["min_eval_images"]
+        },
+        "imagenes_calibracion": len(calibracion),
+        "imagenes_evaluacion": len(evaluacion)
+    }
+    
+    with open(reporte_file, 'w', encoding='utf-8') as f:
+        json.dump(reporte, f, ensure_ascii=False, indent=2)
+    
+    print(f"✅ Reporte guardado: {reporte_file}")
+    return reporte
+
+if __name__ == "__main__":
+    print("🔢 CUANTIZACIÓN INT8 DEL MODELO ONNX")
+    print("="*50)
+    
+    reporte = cuantizar_modelo()
+    
+    print(f"\n📊 RESULTADOS:")
+    for nombre in ("fp32", "int8"):
+        m = reporte[nombre]
+        print(f"   {nombre}: top-1 {m['top1']:.3f} | top-5 {m['top5']:.3f} | "
+              f"{m['latencia_ms_por_imagen']:.1f} ms/imagen | {m['tamano_mb']:.2f} MB")
+    
+    if reporte["aprobado"]:
+        print(f"\n✅ Modelo INT8 aprobado (caída top-1 {reporte['caida_top1']:.3f})")
+    else:
+        print(f"\n❌ Modelo INT8 rechazado: caída top-1 {reporte['caida_top1']:.3f}, "
+              f"top-5 {reporte['caida_top5']:.3f} con {reporte['imagenes_evaluacion']} imágenes "
+              f"de evaluación (tolerancia {reporte['tolerancia']})")
@@ -0,0 +1,183 @@
+# model/similarity_index.py - ÍNDICE DE SIMILITUD ENTRE ESPECIES E IMÁGENES
+
+import numpy as np
+import os
+import sys
+from pathlib import Path
+from datetime import datetime
+
+# Agregar el directorio padre al path para importar config
+sys.path.append(str(Path(__file__).parent.parent))
+from config import PATHS
+from model.model_utils import top_k_indices
+
+def huella_modelo(ruta=None):
+    """
+    Identifica la versión del archivo del modelo (mtime y tamaño)
+    
+    Returns:
+        str o None si el modelo no existe
+    """
+    try:
+        info = Path(ruta or PATHS["model_file"]).stat()
+    except FileNotFoundError:
+        return None
+    return f"{info.st_mtime_ns}-{info.st_size}"
+
+def _normalizar(vectores):
+    """Normaliza filas a norma 1 (las filas nulas quedan en cero)"""
+    normas = np.linalg.norm(vectores, axis=-1, keepdims=True)
+    return np.divide(vectores, normas, out=np.zeros_like(vectores), where=normas > 0)
+
+class IndiceSimilitud:
+    """
+    Centroides por especie y embeddings de imágenes de referencia
+    
+    Los vectores salen de la penúltima capa del modelo, normalizados, y se
+    guardan en float16. La similitud coseno contra todas las especies (o
+    imágenes) es un único producto matriz-vector. huella_modelo identifica
+    el modelo con que se calcularon (ver huella_modelo()).
+    """
+    
+    def __init__(self, centroides, species_names, embeddings_imagenes=None,
+                 etiquetas_imagenes=None, rutas_imagenes=None, timestamp=None, huella_modelo=None):
+        self.centroides = np.asarray(centroides, dtype=np.float16)
+        self.species_names = list(species_names)
+        self.embeddings_imagenes = (np.asarray(embeddings_imagenes, dtype=np.float16)
+                                    if embeddings_imagenes is not None else None)
+        self.etiquetas_imagenes = (np.asarray(etiquetas_imagenes, dtype=np.int32)
+                                   if etiquetas_imagenes is not None else None)
+        self.rutas_imagenes = list(rutas_imagenes) if rutas_imagenes is not None else []
+        self.timestamp = timestamp or datetime.now().isoformat()
+        self.huella_modelo = huella_modelo
+        self._indice_especies = {nombre: idx for idx, nombre in enumerate(self.species_names)}
+        
+        # float16 en disco; float32 en memoria para usar BLAS en el producto
+        self._centroides = self.centroides.astype(np.float32)
+        self._imagenes = (self.embeddings_imagenes.astype(np.float32)
+                          if self.embeddings_imagenes is not None else None)
+    
+    @classmethod
+    def desde_embeddings(cls, embeddings, etiquetas, species_names, rutas=None, huella=None):
+        """
+        Construye el índice a partir de los embeddings de cada imagen
+        
+        Args:
+            embeddings: Array (N, D) de la penúltima capa
+            etiquetas: Etiqueta (N,) de cada imagen
+            species_names: Lista de especies del modelo
+            rutas: Rutas de las imágenes (opcional, para imágenes similares)
+            huella: huella_modelo() del modelo que calculó los embeddings
+        """
+        embeddings = _normalizar(np.asarray(embeddings, dtype=np.float32))
+        etiquetas = np.asarray(etiquetas, dtype=np.int64)
+        
+        sumas = np.zeros((len(species_names), embeddings.shape[1]), dtype=np.float32)
+        np.add.at(sumas, etiquetas, embeddings)
+        
+        return cls(_normalizar(sumas), species_names, embeddings, etiquetas,
+                   [str(ruta) for ruta in rutas] if rutas is not None else None,
+                   huella_modelo=huella)
+    
+    def guardar(self, archivo=None):
+        """Guarda el índice en un .npz (escritura atómica)"""
+        archivo = Path(archivo or PATHS["similarity_index_file"])
+        tmp_file = archivo.with_suffix(".tmp")
+        
+        with open(tmp_file, 'wb') as f:
+            np.savez(
+                f,
+                centroides=self.centroides,
+                species_names=np.array(self.species_names),
+                embeddings_imagenes=(self.embeddings_imagenes if self.embeddings_imagenes is not None
+                                     else np.empty((0, self.centroides.shape[1]), dtype=np.float16)),
+                etiquetas_imagenes=(self.etiquetas_imagenes if self.etiquetas_imagenes is not None
+                                    else np.empty(0, dtype=np.int32)),
+                rutas_imagenes=np.array(self.rutas_imagenes, dtype=str),
+                timestamp=np.array(self.timestamp),
+                huella_modelo=np.array(self.huella_modelo or "")
+            )
+        os.replace(tmp_file, archivo)
+        
+        print(f"✅ Índice de similitud guardado: {len(self.species_names)} especies, "
+              f"{len(self.rutas_imagenes)} imágenes")
+    
+    @classmethod
+    def cargar(cls, archivo=None):
+        """
+        Carga el índice desde disco
+        
+        Returns:
+            IndiceSimilitud o None si no existe
+        """
+        archivo = Path(archivo or PATHS["similarity_index_file"])
+        if not archivo.exists():
+            return None
+        
+        try:
+            with np.load(archivo) as datos:
+                embeddings = datos["embeddings_imagenes"]
+                return cls(
+                    datos["centroides"],
+                    datos["species_names"].tolist(),
+                    embeddings if len(embeddings) else None,
+                    datos["etiquetas_imagenes"] if len(embeddings) else None,
+                    datos["rutas_imagenes"].tolist(),
+                    str(datos["timestamp"]),
+                    # Índices anteriores a la huella: quedan sin modelo asociado
+                    (str(datos["huella_modelo"]) or None) if "huella_modelo" in datos else None
+                )
+        except Exception as e:
+            print(f"⚠️ Error cargando índice de similitud: {e}")
+            return None
+    
+    def especies_similares(self, especie, cantidad=5):
+        """
+        Especies con centroide más cercano al de una especie
+        
+        Returns:
+            list: [(nombre_especie, similitud), ...] de mayor a menor
+        """
+        idx = self._indice_especies.get(especie)
+        if idx is None:
+            return []
+        
+        excluir = np.zeros(len(self.species_names), dtype=bool)
+        excluir[idx] = True
+        return self.especies_cercanas(self._centroides[idx], cantidad, excluir)
+    
+    def especies_cercanas(self, vector, cantidad=5, mascara_excluidas=None):
+        """
+        Especies más cercanas a un embedding arbitrario
+        
+        Returns:
+            list: [(nombre_especie, similitud), ...] de mayor a menor
+        """
+        similitudes = self._centroides @ _normalizar(np.asarray(vector, dtype=np.float32))
+        cantidad = min(cantidad, len(self.species_names) - (mascara_excluidas.sum() if mascara_excluidas is not None else 0))
+        
+        return [
+            (self.species_names[i], float(similitudes[i]))
+            for i in top_k_indices(similitudes, cantidad, mascara_excluidas)
+        ]
+    
+    def imagenes_similares(self, vector, cantidad=5):
+        """
+        Imágenes de referencia más cercanas a un embedding
+        
+        Returns:
+            list: [{"ruta", "especie", "similitud"}, ...] de mayor a menor
+        """
+        if self._imagenes is None:
+            return []
+        
+        similitudes = self._imagenes @ _normalizar(np.asarray(vector, dtype=np.float32))
+        
+        return [
+            {
+                "ruta": self.rutas_imagenes[i] if i < len(self.rutas_imagenes) else None,
+                "especie": self.species_names[self.etiquetas_imagenes[i]],
+                "similitud": float(similitudes[i])
+            }
+            for i in top_k_indices(similitudes, cantidad)
+        ]
@@ -29,7 +29,79 @@ from pathlib import Path
 # Agregar el directorio padre al path para importar módulos
 sys.path.append(str(Path(__file__).parent.parent))
 from config import MODEL_CONFIG, PATHS, RETRAINING_CONFIG, LOGS_DIR
-from utils.image_processing import DatasetManager
+from utils.image_processing import DatasetManager, calcular_hash_imagen
+
+class SecuenciaImagenes(keras.utils.Sequence):
+    """
+    Lotes desde un dataset uint8 memory-mapped, convertidos a float32 al vuelo
+    
+    Solo el lote actual vive en RAM como float32; el split train/val se hace
+    con arrays de índices sobre el mismo archivo, sin copiar imágenes.
+    """
+    
+    def __init__(self, imagenes, etiquetas, indices, batch_size, aumentador=None,
+                 incluir_augmentation=False, mezclar=False):
+        """
+        Args:
+            imagenes: Array uint8 (N, 224, 224, 3), normalmente np.memmap
+            etiquetas: Etiquetas (N,) alineadas con imagenes
+            indices: Filas de imagenes que forman esta secuencia
+            batch_size: Tamaño de lote
+            aumentador: AumentadorLotes aplicado a las filas aumentadas del lote
+            incluir_augmentation: Añadir una copia aumentada de cada imagen por época
+            mezclar: Barajar el orden al final de cada época
+        """
+        super().__init__()
+        self.imagenes = imagenes
+        self.etiquetas = np.asarray(etiquetas)
+        self.batch_size = batch_size
+        self.aumentador = aumentador
+        self.mezclar = mezclar
+        
+        indices = np.asarray(indices, dtype=np.int64)
+        if incluir_augmentation and aumentador is not None:
+            # Cada imagen aparece una vez original y una vez aumentada por época
+            self.indices = np.concatenate([indices, indices])
+            self.aumentadas = np.concatenate([np.zeros(len(indices), bool), np.ones(len(indices), bool)])
+        else:
+            self.indices = indices
+            self.aumentadas = np.zeros(len(indices), bool)
+        
+        self.on_epoch_end()
+    
+    def __len__(self):
+        return int(np.ceil(len(self.indices) / self.batch_size))
+    
+    def __getitem__(self, idx):
+        seleccion = slice(idx * self.batch_size, (idx + 1) * self.batch_size)
+        filas = self.indices[seleccion]
+        aumentar = self.aumentadas[seleccion]
+        
+        # Lectura del memmap en orden de filas para aprovechar la localidad en disco
+        orden = np.argsort(filas, kind="stable")
+        filas = filas[orden]
+        aumentar = aumentar[orden]
+        
+        lote = np.divide(self.imagenes[filas], np.float32(255.0), dtype=np.float32)
+        
+        if aumentar.any():
+            lote[aumentar] = self.aumentador.aumentar_lote(lote[aumentar])
+        
+        return lote, self.etiquetas[filas]
+    
+    def on_epoch_end(self):
+        if self.mezclar:
+            permutacion = np.random.permutation(len(self.indices))
+            self.indices = self.indices[permutacion]
+            self.aumentadas = self.aumentadas[permutacion]
+    
+    def etiquetas_en_orden(self):
+        """Etiquetas en el orden en que la secuencia entrega las imágenes (sin mezclar)"""
+        etiquetas = [
+            self.etiquetas[np.sort(self.indices[i * self.batch_size:(i + 1) * self.batch_size], kind="stable")]
+            for i in range(len(self))
+        ]
+        return np.concatenate(etiquetas) if etiquetas else np.array([], dtype=np.int64)
 
 class PlantModelTrainer:
     """Clase para entrenar y gestionar el modelo de clasificación de plantas"""
@@ -40,6 +112,8 @@ class PlantModelTrainer:
         self.dataset_manager = DatasetManager()
         self.num_classes = None
         self.species_names = None
+        self.split_rutas = None  # (rutas_train, y_train, rutas_val, y_val) del último preparar_datos
+        self.archivos_entrenados = None  # Estado de los archivos al cargarlos (para el manifiesto)
         
         # Configurar GPU si está disponible
         self._configurar_gpu()
@@ -71,9 +145,32 @@ class PlantModelTrainer:
         """
         print(f"🏗️ Creando modelo para {num_classes} especies...")
         
+        base_model = self._crear_base_model()
+        
+        # Congelar capas del modelo base inicialmente
+        base_model.trainable = not MODEL_CONFIG["freeze_base"]
+        
+        # Crear el modelo completo
+        model = keras.Sequential([
+            base_model,
+            layers.GlobalAveragePooling2D(),
+            *self._capas_clasificador(num_classes)
+        ])
+        
+        # Compilar modelo
+        model.compile(
+            optimizer=Adam(learning_rate=MODEL_CONFIG["learning_rate"]),
+            loss='sparse_categorical_crossentropy',
+            metrics=['accuracy', tf.keras.metrics.SparseTopKCategoricalAccuracy(k=3, name='top_3_accuracy')]
+        )
+        
+        print(f"✅ Modelo creado con {model.count_params():,} parámetros")
+        return model
+    
+    def _crear_base_model(self):
+        """Modelo base pre-entrenado en ImageNet, sin la capa de clasificación"""
         input_shape = MODEL_CONFIG["input_shape"]
         
-        # Modelo base pre-entrenado
         if MODEL_CONFIG["base_model"] == "MobileNetV2":
             base_model = MobileNetV2(
                 weights='imagenet',
@@ -89,64 +186,170 @@ class PlantModelTrainer:
         else:
             raise ValueError(f"Modelo base no soportado: {MODEL_CONFIG['base_model']}")
         
-        # Congelar capas del modelo base inicialmente
-        base_model.trainable = not MODEL_CONFIG["freeze_base"]
-        
-        # Crear el modelo completo
-        model = keras.Sequential([
-            base_model,
-            layers.GlobalAveragePooling2D(),
+        return base_model
+    
+    def _capas_clasificador(self, num_classes):
+        """Capas de clasificación sobre el embedding (compartidas con la cabeza)"""
+        return [
             layers.Dropout(0.2),
             layers.Dense(128, activation='relu'),
             layers.Dropout(0.2),
             layers.Dense(num_classes, activation='softmax', name='predictions')
-        ])
-        
-        # Compilar modelo
-        model.compile(
-            optimizer=Adam(learning_rate=MODEL_CONFIG["learning_rate"]),
-            loss='sparse_categorical_crossentropy',
-            metrics=['accuracy', tf.keras.metrics.SparseTopKCategoricalAccuracy(k=3, name='top_3_accuracy')]
-        )
-        
-        print(f"✅ Modelo creado con {model.count_params():,} parámetros")
-        return model
+        ]
     
-    def preparar_datos(self, incluir_augmentation=True):
+    def preparar_datos(self, incluir_augmentation=True, pipeline=None, cargar_entrenamiento=True):
         """
         Prepara los datos para entrenamiento
         
         Args:
             incluir_augmentation: Si aplicar data augmentation
+            pipeline: "memoria", "mmap" o "streaming" (usa config si es None)
+            cargar_entrenamiento: Con "memoria", False no carga X_train en RAM
+                                  (entrenamiento sobre embeddings sin fine-tuning)
         
         Returns:
             tuple: (X_train, X_val, y_train, y_val, species_names)
+            Con "mmap" X_train y X_val son SecuenciaImagenes; con "streaming", tf.data.Dataset
         """
         print("📊 Preparando datos de entrenamiento...")
         
-        # Cargar dataset completo
-        X, y, species_names = self.dataset_manager.cargar_dataset_completo(
-            incluir_augmentation=incluir_augmentation
-        )
+        if pipeline is None:
+            pipeline = MODEL_CONFIG["data_pipeline"]
+        
+        if pipeline == "mmap":
+            return self._preparar_datos_mmap(incluir_augmentation)
+        if pipeline == "streaming":
+            return self._preparar_datos_streaming(incluir_augmentation)
+        if pipeline != "memoria":
+            raise ValueError(f"Pipeline de datos no soportado: {pipeline}")
+        
+        # Estado de los archivos antes de decodificarlos (lo posterior cuenta como nuevo)
+        rutas, etiquetas, species_names = self.dataset_manager.listar_imagenes_dataset(verbose=False)
+        etiquetas = np.asarray(etiquetas, dtype=np.int64)
+        self.archivos_entrenados = self.dataset_manager.capturar_estado_archivos(rutas, etiquetas)
         
         self.num_classes = len(species_names)
         self.species_names = species_names
+        self.dataset_manager._guardar_lista_especies(species_names)
         
-        # Dividir en entrenamiento y validación
-        X_train, X_val, y_train, y_val = train_test_split(
-            X, y, 
+        # Dividir por archivo (igual que mmap/streaming): la copia aumentada de
+        # una imagen queda del mismo lado y el split se comparte con los embeddings
+        idx_train, idx_val = train_test_split(
+            np.arange(len(etiquetas)),
             test_size=MODEL_CONFIG["validation_split"],
             random_state=42,
-            stratify=y  # Mantener proporción de clases
+            stratify=etiquetas  # Mantener proporción de clases
         )
+        self.split_rutas = ([rutas[i] for i in idx_train], etiquetas[idx_train],
+                            [rutas[i] for i in idx_val], etiquetas[idx_val])
+        rutas_train, y_train, rutas_val, y_val = self.split_rutas
+        
+        X_val, y_val, validas_val = self.dataset_manager.cargar_imagenes_float(rutas_val, y_val)
+        self.dataset_manager.descartar_archivos(self.archivos_entrenados, rutas_val, validas_val)
+        if cargar_entrenamiento:
+            X_train, y_train, validas_train = self.dataset_manager.cargar_imagenes_float(
+                rutas_train, y_train, incluir_augmentation=incluir_augmentation
+            )
+            self.dataset_manager.descartar_archivos(self.archivos_entrenados, rutas_train, validas_train)
+        else:
+            X_train = None
+        self.dataset_manager.limpiar_cache(rutas)
         
         print(f"📈 Datos preparados:")
-        print(f"   - Entrenamiento: {len(X_train)} imágenes")
+        print(f"   - Entrenamiento: {len(X_train) if X_train is not None else len(rutas_train)} imágenes")
         print(f"   - Validación: {len(X_val)} imágenes")
         print(f"   - Clases: {self.num_classes}")
         
         return X_train, X_val, y_train, y_val, species_names
     
+    def _preparar_datos_mmap(self, incluir_augmentation):
+        """Split train/val por índices sobre el dataset memory-mapped"""
+        imagenes, etiquetas, rutas, species_names = self.dataset_manager.obtener_dataset_mmap()
+        self.archivos_entrenados = self.dataset_manager.capturar_estado_archivos(rutas, etiquetas)
+        
+        self.num_classes = len(species_names)
+        self.species_names = species_names
+        
+        # Dividir índices, no imágenes
+        idx_train, idx_val = train_test_split(
+            np.arange(len(etiquetas)),
+            test_size=MODEL_CONFIG["validation_split"],
+            random_state=42,
+            stratify=etiquetas  # Mantener proporción de clases
+        )
+        idx_val = np.sort(idx_val)
+        
+        X_train = SecuenciaImagenes(
+            imagenes, etiquetas, idx_train, MODEL_CONFIG["batch_size"],
+            aumentador=self.dataset_manager.aumentador,
+            incluir_augmentation=incluir_augmentation,
+            mezclar=True
+        )
+        X_val = SecuenciaImagenes(imagenes, etiquetas, idx_val, MODEL_CONFIG["batch_size"])
+        
+        y_train = etiquetas[idx_train]
+        y_val = etiquetas[idx_val]
+        self.split_rutas = ([rutas[i] for i in idx_train], y_train, [rutas[i] for i in idx_val], y_val)
+        
+        print(f"📈 Datos preparados (memory-mapped uint8):")
+        print(f"   - Entrenamiento: {len(X_train.indices)} imágenes por época")
+        print(f"   - Validación: {len(idx_val)} imágenes")
+        print(f"   - Clases: {self.num_classes}")
+        
+        return X_train, X_val, y_train, y_val, species_names
+    
+    def _preparar_datos_streaming(self, incluir_augmentation):
+        """Split por rutas; las imágenes se leen de data/plantas en cada época"""
+        from model.data_pipeline import crear_dataset_streaming
+        
+        rutas, etiquetas, species_names = self.dataset_manager.listar_imagenes_dataset(verbose=False)
+        etiquetas = np.asarray(etiquetas, dtype=np.int64)
+        self.archivos_entrenados = self.dataset_manager.capturar_estado_archivos(rutas, etiquetas)
+        
+        self.num_classes = len(species_names)
+        self.species_names = species_names
+        self.dataset_manager._guardar_lista_especies(species_names)
+        
+        idx_train, idx_val = train_test_split(
+            np.arange(len(etiquetas)),
+            test_size=MODEL_CONFIG["validation_split"],
+            random_state=42,
+            stratify=etiquetas  # Mantener proporción de clases
+        )
+        
+        y_train = etiquetas[idx_train]
+        y_val = etiquetas[idx_val]
+        self.split_rutas = ([rutas[i] for i in idx_train], y_train, [rutas[i] for i in idx_val], y_val)
+        
+        X_train = crear_dataset_streaming(
+            [rutas[i] for i in idx_train], y_train,
+            entrenamiento=True, incluir_augmentation=incluir_augmentation
+        )
+        X_val = crear_dataset_streaming([rutas[i] for i in idx_val], y_val, entrenamiento=False)
+        
+        print(f"📈 Datos preparados (streaming tf.data):")
+        print(f"   - Entrenamiento: {len(idx_train) * (2 if incluir_augmentation else 1)} imágenes por época")
+        print(f"   - Validación: {len(idx_val)} imágenes")
+        print(f"   - Clases: {self.num_classes}")
+        
+        return X_train, X_val, y_train, y_val, species_names
+    
+    def _es_flujo(self, X):
+        """True si X entrega lotes (Sequence o tf.data) en lugar de un array"""
+        return isinstance(X, (keras.utils.Sequence, tf.data.Dataset))
+    
+    def _argumentos_fit(self, X_train, X_val, y_train, y_val):
+        """Argumentos de model.fit para arrays en memoria o flujos de lotes"""
+        if self._es_flujo(X_train):
+            return {"x": X_train, "validation_data": X_val}
+        
+        return {
+            "x": X_train,
+            "y": y_train,
+            "batch_size": MODEL_CONFIG["batch_size"],
+            "validation_data": (X_val, y_val)
+        }
+    
     def entrenar_modelo(self, X_train, X_val, y_train, y_val, epochs=None):
         """
         Entrena el modelo
@@ -192,10 +395,8 @@ class PlantModelTrainer:
         
         # Entrenar
         self.history = self.model.fit(
-            X_train, y_train,
-            batch_size=MODEL_CONFIG["batch_size"],
+            **self._argumentos_fit(X_train, X_val, y_train, y_val),
             epochs=epochs,
-            validation_data=(X_val, y_val),
             callbacks=callbacks,
             verbose=1
         )
@@ -203,6 +404,141 @@ class PlantModelTrainer:
         print("✅ Entrenamiento completado")
         return self.history
     
+    def extraer_embeddings(self, rutas, tamano_bloque=256):
+        """
+        Embeddings del modelo base congelado, calculados una vez por imagen
+        
+        Las imágenes ya vistas (mismo hash de archivo y misma versión del
+        backbone) se leen de la cache en disco sin decodificarlas.
+        
+        Args:
+            rutas: Rutas de las imágenes
+            tamano_bloque: Imágenes decodificadas por bloque
+        
+        Returns:
+            tuple: (embeddings float32 (N, D), máscara de imágenes válidas)
+        """
+        from model.embedding_cache import CacheEmbeddings
+        
+        cache = CacheEmbeddings()
+        claves = [calcular_hash_imagen(ruta) for ruta in rutas]
+        faltantes = [i for i, clave in enumerate(claves) if clave not in cache]
+        
+        if faltantes:
+            print(f"🧮 Calculando embeddings de {len(faltantes)} imágenes ({len(rutas) - len(faltantes)} en cache)...")
+            extractor = keras.Sequential([self._crear_base_model(), layers.GlobalAveragePooling2D()])
+            
+            try:
+                for inicio in range(0, len(faltantes), tamano_bloque):
+                    bloque = faltantes[inicio:inicio + tamano_bloque]
+                    imagenes, validas = self.dataset_manager.cargar_imagenes_uint8([rutas[i] for i in bloque])
+                    if not validas.any():
+                        continue
+                    
+                    entrada = np.divide(imagenes[validas], np.float32(255.0), dtype=np.float32)
+                    vectores = extractor.predict(entrada, batch_size=MODEL_CONFIG["batch_size"], verbose=0)
+                    cache.agregar([claves[i] for i, ok in zip(bloque, validas) if ok], vectores)
+            finally:
+                # Conservar lo calculado aunque se interrumpa
+                cache.guardar()
+        else:
+            print(f"💾 Embeddings de {len(rutas)} imágenes tomados de la cache")
+        
+        return cache.obtener(claves)
+    
+    def entrenar_cabeza_con_embeddings(self, epochs=None):
+        """
+        Entrena solo las capas de clasificación sobre embeddings cacheados
+        
+        Equivale a entrenar_modelo con el modelo base congelado, sin repetir
+        su forward pass en cada época. Las imágenes se usan sin augmentation
+        (cada imagen tiene un único embedding); el fine-tuning posterior sí
+        trabaja sobre píxeles aumentados.
+        
+        Returns:
+            Historia del entrenamiento
+        """
+        if epochs is None:
+            epochs = MODEL_CONFIG["epochs"]
+        
+        if self.split_rutas is None:
+            rutas, etiquetas, _ = self.dataset_manager.listar_imagenes_dataset(verbose=False)
+            etiquetas = np.asarray(etiquetas, dtype=np.int64)
+            idx_train, idx_val = train_test_split(
+                np.arange(len(etiquetas)),
+                test_size=MODEL_CONFIG["validation_split"],
+                random_state=42,
+                stratify=etiquetas  # Mantener proporción de clases
+            )
+            self.split_rutas = ([rutas[i] for i in idx_train], etiquetas[idx_train],
+                                [rutas[i] for i in idx_val], etiquetas[idx_val])
+        
+        rutas_train, y_train, rutas_val, y_val = self.split_rutas
+        E_train, validas_train = self.extraer_embeddings(rutas_train)
+        E_val, validas_val = self.extraer_embeddings(rutas_val)
+        if self.archivos_entrenados is not None:
+            self.dataset_manager.descartar_archivos(self.archivos_entrenados, rutas_train, validas_train)
+            self.dataset_manager.descartar_archivos(self.archivos_entrenados, rutas_val, validas_val)
+        
+        print(f"🚀 Entrenando cabeza de clasificación sobre embeddings por {epochs} épocas...")
+        
+        cabeza = keras.Sequential([
+            layers.Input(shape=(E_train.shape[1],)),
+            *self._capas_clasificador(self.num_classes)
+        ])
+        cabeza.compile(
+            optimizer=Adam(learning_rate=MODEL_CONFIG["learning_rate"]),
+            loss='sparse_categorical_crossentropy',
+            metrics=['accuracy', tf.keras.metrics.SparseTopKCategoricalAccuracy(k=3, name='top_3_accuracy')]
+        )
+        
+        callbacks = [
+            EarlyStopping(
+                monitor='val_accuracy',
+                patience=10,
+                restore_best_weights=True,
+                verbose=1
+            ),
+            ReduceLROnPlateau(
+                monitor='val_loss',
+                factor=0.2,
+                patience=5,
+                min_lr=1e-7,
+                verbose=1
+            )
+        ]
+        
+        self.history = cabeza.fit(
+            E_train[validas_train], y_train[validas_train],
+            validation_data=(E_val[validas_val], y_val[validas_val]),
+            batch_size=MODEL_CONFIG["batch_size"],
+            epochs=epochs,
+            callbacks=callbacks,
+            verbose=1
+        )
+        
+        # Montar el modelo completo con la cabeza entrenada
+        self.model = self.crear_modelo(self.num_classes)
+        densas_modelo = [capa for capa in self.model.layers if isinstance(capa, layers.Dense)]
+        densas_cabeza = [capa for capa in cabeza.layers if isinstance(capa, layers.Dense)]
+        for destino, origen in zip(densas_modelo, densas_cabeza):
+            destino.set_weights(origen.get_weights())
+        
+        print("✅ Entrenamiento de la cabeza completado")
+        return self.history
+    
+    def actualizar_indice_similitud(self):
+        """Reconstruye el índice de similitud de especies con el modelo actual"""
+        try:
+            from model.model_utils import ModelUtils
+            
+            model_utils = ModelUtils()
+            model_utils.model = self.model
+            model_utils.species_names = self.species_names
+            model_utils.construir_indice_similitud()
+        except Exception as e:
+            print(f"⚠️ No se pudo actualizar el índice de similitud: {e}")
+    
     def evaluar_modelo(self, X_val, y_val):
         """
         Evalúa el rendimiento del modelo
@@ -219,12 +555,13 @@ class PlantModelTrainer:
             print("❌ No hay modelo para evaluar")
             return None
         
-        # Predicciones
-        y_pred_proba = self.model.predict(X_val)
-        y_pred = np.argmax(y_pred_proba, axis=1)
-        
         # Métricas básicas
-        loss, accuracy, top3_accuracy = self.model.evaluate(X_val, y_val, verbose=0)
+        if self._es_flujo(X_val):
+            loss, accuracy, top3_accuracy = self.model.evaluate(X_val, verbose=0)
+            if isinstance(X_val, SecuenciaImagenes):
+                y_val = X_val.etiquetas_en_orden()
+        else:
+            loss, accuracy, top3_accuracy = self.model.evaluate(X_val, y_val, verbose=0)
         
         # Top-5 accuracy manual
         y_pred_proba = self.model.predict(X_val, verbose=0)
@@ -363,10 +700,8 @@ class PlantModelTrainer:
         ]
         
         history_fine = self.model.fit(
-            X_train, y_train,
-            batch_size=MODEL_CONFIG["batch_size"],
+            **self._argumentos_fit(X_train, X_val, y_train, y_val),
             epochs=fine_tune_epochs,
-            validation_data=(X_val, y_val),
             callbacks=callbacks,
             verbose=1
         )
@@ -374,6 +709,150 @@ class PlantModelTrainer:
         print("✅ Fine-tuning completado")
         return history_fine
     
+    def preparar_datos_incrementales(self, rutas, etiquetas, incluir_augmentation=True):
+        """
+        Prepara solo las imágenes nuevas más un replay de imágenes ya entrenadas
+        
+        Args:
+            rutas, etiquetas: Dataset completo (de listar_imagenes_dataset)
+            incluir_augmentation: Si aplicar data augmentation
+        
+        Returns:
+            tuple: (X_train, X_val, y_train, y_val) o None si no hay imágenes nuevas
+        """
+        print("📊 Preparando datos incrementales...")
+        
+        etiquetas = np.asarray(etiquetas, dtype=np.int64)
+        manifiesto = self.dataset_manager.cargar_manifiesto_entrenamiento()
+        
+        nuevas = np.array([self.dataset_manager.es_imagen_nueva(ruta, manifiesto) for ruta in rutas], dtype=bool)
+        idx_nuevas = np.flatnonzero(nuevas)
+        
+        if len(idx_nuevas) == 0:
+            print("ℹ️ No hay imágenes nuevas desde el último entrenamiento")
+            return None
+        
+        # La validación persistida del modelo anterior sigue fuera del entrenamiento
+        validacion = self.dataset_manager.marcar_validacion(rutas, manifiesto) & ~nuevas
+        idx_replay = self._muestrear_replay(np.flatnonzero(~nuevas & ~validacion), etiquetas, len(idx_nuevas))
+        seleccion = np.sort(np.concatenate([idx_nuevas, idx_replay]))
+        
+        # Solo se decodifican las imágenes seleccionadas
+        imagenes, validas = self.dataset_manager.cargar_imagenes_uint8([rutas[i] for i in seleccion])
+        self.dataset_manager.limpiar_cache(rutas)
+        if self.archivos_entrenados is not None:
+            self.dataset_manager.descartar_archivos(self.archivos_entrenados, [rutas[i] for i in seleccion], validas)
+        imagenes = imagenes[validas]
+        y = etiquetas[seleccion][validas]
+        rutas_seleccion = [rutas[i] for i in seleccion[validas]]
+        
+        try:
+            idx_train, idx_val = train_test_split(
+                np.arange(len(y)),
+                test_size=MODEL_CONFIG["validation_split"],
+                random_state=42,
+                stratify=y  # Mantener proporción de clases
+            )
+        except ValueError:
+            # Clases con una sola imagen en la muestra
+            idx_train, idx_val = train_test_split(
+                np.arange(len(y)),
+                test_size=MODEL_CONFIG["validation_split"],
+                random_state=42
+            )
+        idx_val = np.sort(idx_val)
+        
+        # Validación acumulada (se persiste en el manifiesto): la anterior más la nueva
+        idx_val_anterior = np.flatnonzero(validacion)
+        self.split_rutas = (
+            [rutas_seleccion[i] for i in idx_train], y[idx_train],
+            [rutas[i] for i in idx_val_anterior] + [rutas_seleccion[i] for i in idx_val],
+            np.concatenate([etiquetas[idx_val_anterior], y[idx_val]])
+        )
+        
+        X_train = SecuenciaImagenes(
+            imagenes, y, idx_train, MODEL_CONFIG["batch_size"],
+            aumentador=self.dataset_manager.aumentador,
+            incluir_augmentation=incluir_augmentation,
+            mezclar=True
+        )
+        X_val = SecuenciaImagenes(imagenes, y, idx_val, MODEL_CONFIG["batch_size"])
+        
+        print(f"📈 Datos incrementales preparados:")
+        print(f"   - Imágenes nuevas: {len(idx_nuevas)}")
+        print(f"   - Replay de imágenes antiguas: {len(idx_replay)}")
+        print(f"   - Entrenamiento: {len(X_train.indices)} imágenes por época")
+        print(f"   - Validación: {len(idx_val)} imágenes")
+        
+        return X_train, X_val, y[idx_train], y[idx_val]
+    
+    def _muestrear_replay(self, indices_antiguos, etiquetas, num_nuevas):
+        """
+        Elige imágenes ya entrenadas para mezclar con las nuevas
+        
+        Toma un mínimo por especie (para que las especies sin imágenes nuevas
+        no se olviden) y completa al azar hasta replay_ratio * num_nuevas.
+        """
+        rng = np.random.default_rng()
+        cantidad = RETRAINING_CONFIG["incremental_replay_ratio"] * num_nuevas
+        minimo = RETRAINING_CONFIG["incremental_replay_min_per_species"]
+        
+        etiquetas_antiguas = etiquetas[indices_antiguos]
+        elegidas = [
+            rng.choice(indices_antiguos[etiquetas_antiguas == clase],
+                       min(minimo, int((etiquetas_antiguas == clase).sum())), replace=False)
+            for clase in np.unique(etiquetas_antiguas)
+        ]
+        elegidas = np.concatenate(elegidas) if elegidas else np.array([], dtype=np.int64)
+        
+        restantes = np.setdiff1d(indices_antiguos, elegidas)
+        faltantes = min(max(0, cantidad - len(elegidas)), len(restantes))
+        if faltantes:
+            elegidas = np.concatenate([elegidas, rng.choice(restantes, faltantes, replace=False)])
+        
+        return elegidas.astype(np.int64)
+    
+    def entrenar_incremental(self, X_train, X_val, y_train, y_val, epochs=None):
+        """
+        Continúa el entrenamiento del modelo cargado con learning rate bajo
+        
+        No usa ModelCheckpoint: el modelo en producción solo se reemplaza
+        si el resultado pasa la validación.
+        """
+        if self.model is None:
+            print("❌ No hay modelo cargado para entrenamiento incremental")
+            return None
+        
+        if epochs is None:
+            epochs = RETRAINING_CONFIG["incremental_epochs"]
+        
+        print(f"🔁 Entrenamiento incremental por {epochs} épocas...")
+        
+        self.model.compile(
+            optimizer=Adam(learning_rate=RETRAINING_CONFIG["incremental_learning_rate"]),
+            loss='sparse_categorical_crossentropy',
+            metrics=['accuracy', tf.keras.metrics.SparseTopKCategoricalAccuracy(k=3, name='top_3_accuracy')]
+        )
+        
+        callbacks = [
+            EarlyStopping(
+                monitor='val_accuracy',
+                patience=2,
+                restore_best_weights=True,
+                verbose=1
+            )
+        ]
+        
+        self.history = self.model.fit(
+            **self._argumentos_fit(X_train, X_val, y_train, y_val),
+            epochs=epochs,
+            callbacks=callbacks,
+            verbose=1
+        )
+        
+        print("✅ Entrenamiento incremental completado")
+        return self.history
+    
     def generar_reporte_entrenamiento(self, metricas, guardar_graficos=True):
         """
         Genera un reporte completo del entrenamiento
@@ -495,13 +974,18 @@ def entrenar_modelo_completo(incluir_fine_tuning=True):
     trainer = PlantModelTrainer()
     
     try:
-        # 1. Preparar datos
+        # 1. Preparar datos (la cabeza sobre embeddings no usa X_train; solo el fine-tuning)
+        usar_embeddings = MODEL_CONFIG["freeze_base"] and MODEL_CONFIG["cache_embeddings"]
         X_train, X_val, y_train, y_val, species_names = trainer.preparar_datos(
-            incluir_augmentation=True
+            incluir_augmentation=True,
+            cargar_entrenamiento=incluir_fine_tuning or not usar_embeddings
         )
         
-        # 2. Crear y entrenar modelo
-        trainer.entrenar_modelo(X_train, X_val, y_train, y_val)
+        # 2. Crear y entrenar modelo (con base congelada basta entrenar la cabeza)
+        if usar_embeddings:
+            trainer.entrenar_cabeza_con_embeddings()
+        else:
+            trainer.entrenar_modelo(X_train, X_val, y_train, y_val)
         
         # 3. Fine-tuning si se solicita
         if incluir_fine_tuning:
@@ -510,8 +994,12 @@ def entrenar_modelo_completo(incluir_fine_tuning=True):
         # 4. Evaluar modelo final
         metricas = trainer.evaluar_modelo(X_val, y_val)
         
-        # 5. Guardar modelo
+        # 5. Guardar modelo y registrar los archivos tal como estaban al cargarlos
         trainer.guardar_modelo_completo(metricas)
+        trainer.dataset_manager.guardar_manifiesto_entrenamiento(
+            trainer.archivos_entrenados, species_names, "completo", validacion=trainer.split_rutas[2]
+        )
+        trainer.actualizar_indice_similitud()
         
         # 6. Generar reporte
         reporte_file = trainer.generar_reporte_entrenamiento(metricas)
@@ -533,6 +1021,89 @@ def entrenar_modelo_completo(incluir_fine_tuning=True):
             "error": str(e)
         }
 
+def entrenar_modelo_incremental(incluir_augmentation=True):
+    """
+    Re-entrena a partir del modelo actual usando solo las imágenes nuevas
+    más un replay de imágenes antiguas
+    
+    Si no hay modelo previo o cambió la lista de especies, hace un
+    entrenamiento completo.
+    
+    Returns:
+        dict: Resultados del entrenamiento
+    """
+    print("🚀 INICIANDO ENTRENAMIENTO INCREMENTAL")
+    print("="*50)
+    
+    trainer = PlantModelTrainer()
+    
+    if not trainer.cargar_modelo_existente():
+        print("⚠️ Sin modelo previo, se realizará entrenamiento completo")
+        return entrenar_modelo_completo()
+    
+    try:
+        rutas, etiquetas, species_names = trainer.dataset_manager.listar_imagenes_dataset(verbose=False)
+        # Estado de los archivos antes de entrenar (lo que cambie durante el entrenamiento queda como nuevo)
+        trainer.archivos_entrenados = trainer.dataset_manager.capturar_estado_archivos(rutas, etiquetas)
+        
+        # La capa de salida depende del número y orden de especies
+        if species_names != trainer.species_names:
+            print("⚠️ La lista de especies cambió, se requiere entrenamiento completo")
+            return entrenar_modelo_completo()
+        
+        # 1. Preparar imágenes nuevas + replay
+        datos = trainer.preparar_datos_incrementales(rutas, etiquetas, incluir_augmentation)
+        if datos is None:
+            return {"status": "sin_cambios"}
+        X_train, X_val, y_train, y_val = datos
+        
+        # 2. Precisión del modelo actual sobre la misma validación
+        metricas_previas = trainer.evaluar_modelo(X_val, y_val)
+        
+        # 3. Entrenar
+        trainer.entrenar_incremental(X_train, X_val, y_train, y_val)
+        metricas = trainer.evaluar_modelo(X_val, y_val)
+        
+        # 4. Reemplazar solo si no empeora
+        umbral = metricas_previas["accuracy"] * RETRAINING_CONFIG["accuracy_improvement_threshold"]
+        if metricas["accuracy"] < umbral:
+            print(f"❌ Precisión {metricas['accuracy']:.3f} bajo el umbral {umbral:.3f}, se conserva el modelo actual")
+            return {
+                "status": "rechazado",
+                "metricas": metricas,
+                "metricas_previas": metricas_previas
+            }
+        
+        # 5. Guardar modelo y manifiesto
+        trainer.crear_backup_modelo_actual()
+        trainer.guardar_modelo_completo(metricas)
+        trainer.dataset_manager.guardar_manifiesto_entrenamiento(
+            trainer.archivos_entrenados, species_names, "incremental", validacion=trainer.split_rutas[2]
+        )
+        trainer.actualizar_indice_similitud()
+        
+        # 6. Generar reporte
+        reporte_file = trainer.generar_reporte_entrenamiento(metricas)
+        
+        resultado = {
+            "status": "exitoso",
+            "modo": "incremental",
+            "metricas": metricas,
+            "metricas_previas": metricas_previas,
+            "reporte_file": str(reporte_file),
+            "model_file": str(PATHS["model_file"])
+        }
+        
+        print("🎉 ENTRENAMIENTO INCREMENTAL COMPLETADO")
+        return resultado
+        
+    except Exception as e:
+        print(f"❌ ERROR EN ENTRENAMIENTO INCREMENTAL: {e}")
+        return {
+            "status": "error",
+            "error": str(e)
+        }
+
 if __name__ == "__main__":
     # Si ejecutas este archivo directamente, entrena el modelo
     print("🤖 ENTRENAMIENTO DEL MODELO DE PLANTAS")
@@ -551,10 +1122,15 @@ if __name__ == "__main__":
     
     print("✅ Dataset validado. Iniciando entrenamiento...")
     
-    # Entrenar modelo
-    resultado = entrenar_modelo_completo(incluir_fine_tuning=True)
+    # Entrenar modelo (--incremental: solo imágenes nuevas + replay)
+    if "--incremental" in sys.argv:
+        resultado = entrenar_modelo_incremental()
+    else:
+        resultado = entrenar_modelo_completo(incluir_fine_tuning=True)
     
-    if resultado["status"] == "exitoso":
+    if resultado["status"] in ("sin_cambios", "rechazado"):
+        print(f"\nℹ️ Modelo sin cambios ({resultado['status']})")
+    elif resultado["status"] == "exitoso":
         print(f"\n🎯 MODELO ENTRENADO:")
         print(f"   📁 Archivo: {resultado['model_file']}")
         print(f"   📊 Precisión: {resultado['metricas']['accuracy']:.3f}")
@@ -2,6 +2,7 @@
 # Migrado desde TensorFlow para máxima compatibilidad Python 3.13
 
 import streamlit as st
+import os
 import sys
 from pathlib import Path
 from PIL import Image
@@ -9,6 +10,7 @@ import numpy as np
 from datetime import datetime
 import json
 import time
+import hashlib
 
 # ==================== CONFIGURACIÓN DE LA PÁGINA ====================
 st.set_page_config(
@@ -21,10 +23,34 @@ st.set_page_config(
 # ==================== CONFIGURACIÓN SIMPLIFICADA ====================
 CONFIG = {
     "onnx_model_path": "model/plant_classifier.onnx",
+    "use_quantized_model": True,  # Solo si model/quantize_onnx.py lo aprobó
+    "quantized_model_path": "model/plant_classifier.int8.onnx",
+    "quantization_report_path": "model/plant_classifier.int8.json",
+    # ONNX Runtime: con varios workers por host, repartir los núcleos entre ellos
+    "ort_intra_op_threads": 0,  # 0 = valor por defecto de ORT (todos los núcleos)
+    "ort_inter_op_threads": 0,
+    "ort_execution_mode": "sequential",  # sequential | parallel
+    "ort_graph_optimization_level": "all",  # disable | basic | extended | all
+    "ort_enable_mem_arena": True,
+    "ort_enable_mem_pattern": True,
+    "ort_allow_spinning": True,  # False reduce el uso de CPU en hosts compartidos
+    "ort_providers": ["CPUExecutionProvider"],
+    "ort_save_optimized_model": True,
+    "ort_optimized_model_dir": "model/optimized",
     "species_path": "model/species_list.json",
     "target_size": (224, 224),
     "max_file_size_mb": 10,
-    "top_predictions": 5
+    "top_predictions": 5,
+    "batch_size": 32,
+    "micro_batching": True,
+    "micro_batch_max_size": 16,
+    "micro_batch_max_latency_ms": 5.0,
+    "micro_batch_timeout_s": 30.0,  # Espera máxima de una solicitud en el batcher
+    # Tiempos por etapa (decode, preprocess, inference, topk, db_lookup, render)
+    "tracing_window": 1000,
+    "tracing_export_interval_s": 60,
+    "tracing_json_path": "logs/stage_latency.json",
+    "tracing_prometheus_path": "logs/stage_latency.prom"
 }
 
 # ==================== CSS PERSONALIZADO ====================
@@ -85,6 +111,112 @@ st.markdown("""
 
 # ==================== FUNCIONES DE CARGA DEL MODELO ====================
 
+def _quantized_model_approved():
+    """True si el modelo INT8 existe y pasó el control de precisión para el modelo fp32 actual"""
+    report_path = Path(CONFIG["quantization_report_path"])
+    if not Path(CONFIG["quantized_model_path"]).exists() or not report_path.exists():
+        return False
+    
+    try:
+        with open(report_path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+        
+        if not report.get("aprobado"):
+            return False
+        
+        # El reporte debe corresponder al mismo modelo fp32 que se tiene en disco
+        hasher = hashlib.blake2b(digest_size=16)
+        with open(CONFIG["onnx_model_path"], 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                hasher.update(block)
+        return hasher.hexdigest() == report.get("modelo_fp32_hash")
+    except Exception:
+        return False
+
+def _create_session_options(ort, optimization_level=None):
+    """SessionOptions de ONNX Runtime a partir de CONFIG"""
+    levels = {
+        "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    }
+    
+    session_options = ort.SessionOptions()
+    session_options.graph_optimization_level = levels[optimization_level or CONFIG["ort_graph_optimization_level"]]
+    session_options.intra_op_num_threads = CONFIG["ort_intra_op_threads"]
+    session_options.inter_op_num_threads = CONFIG["ort_inter_op_threads"]
+    session_options.execution_mode = (
+        ort.ExecutionMode.ORT_PARALLEL if CONFIG["ort_execution_mode"] == "parallel"
+        else ort.ExecutionMode.ORT_SEQUENTIAL
+    )
+    session_options.enable_cpu_mem_arena = CONFIG["ort_enable_mem_arena"]
+    session_options.enable_mem_pattern = CONFIG["ort_enable_mem_pattern"]
+    if not CONFIG["ort_allow_spinning"]:
+        session_options.add_session_config_entry("session.intra_op.allow_spinning", "0")
+    
+    return session_options
+
+def _session_providers(ort):
+    """Execution providers configurados que están disponibles en este host"""
+    available = ort.get_available_providers()
+    providers = [p for p in CONFIG["ort_providers"] if p in available]
+    return providers or ["CPUExecutionProvider"]
+
+def _optimized_model_path(ort, model_path, providers):
+    """
+    Ruta del grafo optimizado en disco para un modelo
+    
+    El grafo optimizado depende de la versión de ORT, del nivel de
+    optimización y de los providers, así que todos forman parte del nombre.
+    """
+    provider_tag = "-".join(p.replace("ExecutionProvider", "").lower() for p in providers)
+    name = (f"{Path(model_path).stem}.{CONFIG['ort_graph_optimization_level']}"
+            f".{provider_tag}.ort{ort.__version__}.onnx")
+    return Path(CONFIG["ort_optimized_model_dir"]) / name
+
+def _create_session(ort, model_path):
+    """
+    Crea la sesión reutilizando el grafo optimizado guardado si está al día
+    
+    El primer arranque optimiza y serializa el grafo; los siguientes lo cargan
+    con las optimizaciones desactivadas. Se regenera si el modelo original es
+    más reciente que el optimizado.
+    """
+    providers = _session_providers(ort)
+    
+    if not CONFIG["ort_save_optimized_model"] or CONFIG["ort_graph_optimization_level"] == "disable":
+        return ort.InferenceSession(model_path, _create_session_options(ort), providers=providers)
+    
+    optimized_path = _optimized_model_path(ort, model_path, providers)
+    
+    if optimized_path.exists() and optimized_path.stat().st_mtime >= Path(model_path).stat().st_mtime:
+        try:
+            return ort.InferenceSession(
+                str(optimized_path), _create_session_options(ort, "disable"), providers=providers
+            )
+        except Exception:
+            pass  # Archivo dañado: se regenera abajo
+    
+    # Archivo temporal por proceso: varios workers pueden arrancar a la vez
+    optimized_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = optimized_path.with_suffix(f".{os.getpid()}.tmp")
+    
+    session_options = _create_session_options(ort)
+    session_options.optimized_model_filepath = str(tmp_path)
+    try:
+        session = ort.InferenceSession(model_path, session_options, providers=providers)
+    except Exception:
+        tmp_path.unlink(missing_ok=True)  # Grafo a medio escribir
+        raise
+    
+    try:
+        os.replace(tmp_path, optimized_path)
+    except OSError:
+        tmp_path.unlink(missing_ok=True)
+    
+    return session
+
 @st.cache_resource
 def load_onnx_model():
     """Carga el modelo ONNX - Ultra rápido y eficiente"""
@@ -98,11 +230,12 @@ def load_onnx_model():
             st.info("💡 Asegúrate de ejecutar step2_convert_model.py primero")
             return None
         
-        # Configurar sesión ONNX con optimizaciones
-        session_options = ort.SessionOptions()
-        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Variante INT8 (python model/quantize_onnx.py) si está aprobada
+        if CONFIG["use_quantized_model"] and _quantized_model_approved():
+            model_path = CONFIG["quantized_model_path"]
         
-        session = ort.InferenceSession(model_path, session_options)
+        # Configurar sesión ONNX con optimizaciones (grafo optimizado cacheado en disco)
+        session = _create_session(ort, model_path)
         
         return session
         
@@ -135,17 +268,20 @@ def load_species_list():
 
 # ==================== FUNCIONES DE PROCESAMIENTO ====================
 
+def _preprocess_into(image, out):
+    """Redimensiona y normaliza una imagen escribiendo en un array float32 existente"""
+    img = image.resize(CONFIG["target_size"], Image.Resampling.LANCZOS)
+    
+    # Copiar los píxeles uint8 al buffer y normalizar en el lugar
+    out[...] = np.asarray(img)
+    np.divide(out, 255.0, out=out)
+
 def preprocess_image(image):
     """Procesa la imagen para el modelo ONNX"""
     try:
-        # Redimensionar manteniendo aspecto
-        img = image.resize(CONFIG["target_size"], Image.Resampling.LANCZOS)
-        
-        # Convertir a array numpy y normalizar
-        img_array = np.array(img, dtype=np.float32) / 255.0
-        
-        # Agregar dimensión batch
-        img_array = np.expand_dims(img_array, axis=0)
+        # Buffer con dimensión batch, sin copias intermedias
+        img_array = np.empty((1,) + CONFIG["target_size"] + (3,), dtype=np.float32)
+        _preprocess_into(image, img_array[0])
         
         return img_array
         
@@ -153,6 +289,55 @@ def preprocess_image(image):
         st.error(f"❌ Error procesando imagen: {e}")
         return None
 
+def preprocess_images_batch(images, out=None):
+    """
+    Procesa varias imágenes PIL en un único tensor (N, 224, 224, 3)
+    
+    Args:
+        images: Lista de imágenes PIL
+        out: Buffer float32 (>= N, 224, 224, 3) opcional del llamador
+    
+    Returns:
+        tuple: (tensor del lote o None, índices de las imágenes válidas)
+    """
+    if out is None:
+        out = np.empty((len(images),) + CONFIG["target_size"] + (3,), dtype=np.float32)
+    
+    valid_indices = []
+    
+    for i, image in enumerate(images):
+        try:
+            # Las imágenes válidas se escriben de forma contigua al inicio del buffer
+            _preprocess_into(image, out[len(valid_indices)])
+            valid_indices.append(i)
+        except Exception as e:
+            st.error(f"❌ Error procesando imagen {i + 1}: {e}")
+    
+    if not valid_indices:
+        return None, []
+    
+    return out[:len(valid_indices)], valid_indices
+
+def _top_k_results(predictions, species_list, top_k):
+    """Construye la lista de resultados top-k para un vector de probabilidades"""
+    top_k = min(top_k, len(predictions))
+    
+    # argpartition + orden solo de los k candidatos
+    top_indices = np.argpartition(predictions, -top_k)[-top_k:]
+    top_indices = top_indices[np.argsort(predictions[top_indices])[::-1]]
+    
+    results = []
+    for idx in top_indices:
+        if idx < len(species_list):  # Verificar índice válido
+            results.append({
+                "species": species_list[idx],
+                "confidence": float(predictions[idx]),
+                "percentage": int(predictions[idx] * 100),
+                "index": int(idx)
+            })
+    
+    return results
+
 def predict_with_onnx(session, image_array, species_list, top_k=5):
     """Realiza predicción ultra-rápida con ONNX Runtime"""
     try:
@@ -160,26 +345,155 @@ def predict_with_onnx(session, image_array, species_list, top_k=5):
         input_name = session.get_inputs()[0].name
         output_name = session.get_outputs()[0].name
         
+        tracer = get_tracer()
+        
         # Hacer predicción
         start_time = time.time()
-        predictions = session.run([output_name], {input_name: image_array})[0][0]
+        with tracer.span("inference"):
+            predictions = session.run([output_name], {input_name: image_array})[0][0]
         inference_time = time.time() - start_time
         
-        # Obtener top-k índices
-        top_indices = np.argsort(predictions)[::-1][:top_k]
+        with tracer.span("topk"):
+            return _top_k_results(predictions, species_list, top_k), inference_time
+        
+    except Exception as e:
+        st.error(f"❌ Error en predicción ONNX: {e}")
+        return [], 0
+
+def _fixed_batch_size(session):
+    """Retorna el tamaño de batch fijo del modelo o None si es dinámico"""
+    batch_dim = session.get_inputs()[0].shape[0]
+    if isinstance(batch_dim, int) and batch_dim > 0:
+        return batch_dim
+    return None
+
+def run_onnx_batch(session, batch_array):
+    """
+    Ejecuta session.run sobre un lote y retorna las probabilidades (N, clases)
+    
+    Si el modelo tiene batch fijo, completa el lote con ceros.
+    """
+    input_name = session.get_inputs()[0].name
+    output_name = session.get_outputs()[0].name
+    
+    num_images = len(batch_array)
+    fixed_batch = _fixed_batch_size(session)
+    
+    if fixed_batch and num_images != fixed_batch:
+        outputs = []
+        for start in range(0, num_images, fixed_batch):
+            chunk = batch_array[start:start + fixed_batch]
+            feed = np.zeros((fixed_batch,) + chunk.shape[1:], dtype=np.float32)
+            feed[:len(chunk)] = chunk
+            outputs.append(session.run([output_name], {input_name: feed})[0][:len(chunk)])
+        return np.concatenate(outputs, axis=0)
+    
+    return session.run([output_name], {input_name: batch_array})[0]
+
+def predict_batch_with_onnx(session, images, species_list, top_k=5, batch_size=None):
+    """
+    Realiza predicciones por lotes con ONNX Runtime
+    
+    Args:
+        session: InferenceSession de ONNX Runtime
+        images: Lista de imágenes PIL o array apilado (N, 224, 224, 3) ya procesado
+        species_list: Lista de especies
+        top_k: Número de predicciones por imagen
+        batch_size: Tamaño máximo de cada llamada a session.run (usa config si es None)
+    
+    Returns:
+        tuple: (resultados por imagen, información de tiempos del lote)
+    """
+    if batch_size is None:
+        batch_size = CONFIG["batch_size"]
+    
+    timing = {
+        "preprocess_time": 0.0,
+        "inference_time": 0.0,
+        "total_time": 0.0,
+        "num_images": 0,
+        "batches": [],
+        "images_per_second": 0.0
+    }
+    
+    try:
+        start_total = time.time()
+        
+        # Preparar el tensor del lote
+        if isinstance(images, np.ndarray):
+            batch_array = images.astype(np.float32, copy=False)
+            valid_indices = list(range(len(batch_array)))
+            num_images = len(batch_array)
+        else:
+            start_time = time.time()
+            batch_array, valid_indices = preprocess_images_batch(images)
+            timing["preprocess_time"] = time.time() - start_time
+            num_images = len(images)
+        
+        results = [[] for _ in range(num_images)]
+        timing["num_images"] = num_images
         
-        # Crear lista de resultados
-        results = []
-        for idx in top_indices:
-            if idx < len(species_list):  # Verificar índice válido
-                results.append({
-                    "species": species_list[idx],
-                    "confidence": float(predictions[idx]),
-                    "percentage": int(predictions[idx] * 100),
-                    "index": int(idx)
-                })
+        if batch_array is None:
+            return results, timing
         
-        return results, inference_time
+        # Si el modelo tiene la dimensión batch fija, respetarla
+        fixed_batch = _fixed_batch_size(session)
+        if fixed_batch:
+            batch_size = fixed_batch
+        
+        for start in range(0, len(batch_array), batch_size):
+            chunk = batch_array[start:start + batch_size]
+            
+            start_time = time.time()
+            predictions = run_onnx_batch(session, chunk)
+            chunk_time = time.time() - start_time
+            
+            timing["inference_time"] += chunk_time
+            timing["batches"].append({"size": len(chunk), "time": chunk_time})
+            
+            for offset, row in enumerate(predictions):
+                results[valid_indices[start + offset]] = _top_k_results(row, species_list, top_k)
+        
+        timing["total_time"] = time.time() - start_total
+        if timing["total_time"] > 0:
+            timing["images_per_second"] = len(valid_indices) / timing["total_time"]
+        
+        return results, timing
+        
+    except Exception as e:
+        st.error(f"❌ Error en predicción por lotes ONNX: {e}")
+        return [], timing
+
+def get_tracer():
+    """Tracer compartido con los tiempos por etapa de las identificaciones"""
+    from utils.tracing import obtener_tracer
+    
+    return obtener_tracer(ventana=CONFIG["tracing_window"])
+
+@st.cache_resource
+def get_micro_batcher(_session):
+    """Batcher compartido que agrupa solicitudes concurrentes de todas las sesiones"""
+    from utils.micro_batching import MicroBatcher
+    
+    return MicroBatcher(
+        lambda batch: run_onnx_batch(_session, batch),
+        max_batch_size=CONFIG["micro_batch_max_size"],
+        max_latency_ms=CONFIG["micro_batch_max_latency_ms"]
+    )
+
+def predict_with_micro_batcher(batcher, image_array, species_list, top_k=5):
+    """Predicción a través del micro-batcher compartido (misma salida que predict_with_onnx)"""
+    try:
+        tracer = get_tracer()
+        
+        # Incluye la espera en la cola del batcher
+        start_time = time.time()
+        with tracer.span("inference"):
+            predictions = batcher.predecir(image_array, timeout=CONFIG["micro_batch_timeout_s"])[0]
+        inference_time = time.time() - start_time
+        
+        with tracer.span("topk"):
+            return _top_k_results(predictions, species_list, top_k), inference_time
         
     except Exception as e:
         st.error(f"❌ Error en predicción ONNX: {e}")
@@ -266,6 +580,69 @@ def show_performance_info(inference_time):
         """, unsafe_allow_html=True)
         st.caption("Base de datos")
 
+def show_stage_timings(stage_times, tracer):
+    """Desglose por etapa de esta identificación y percentiles recientes"""
+    summary = tracer.resumen()
+    
+    st.markdown("**⏱️ Tiempo por etapa:**")
+    for stage, duration_ms in stage_times.items():
+        recent = summary.get(stage)
+        line = f"- **{stage}:** {duration_ms:.1f}ms"
+        if recent:
+            line += f" (p50 {recent['p50_ms']:.1f}ms · p95 {recent['p95_ms']:.1f}ms)"
+        st.markdown(line)
+
+def show_batch_mode(session, species_list):
+    """Identificación por lotes para carpetas completas de muestreo"""
+    with st.expander("📂 Identificación por lotes"):
+        uploaded_files = st.file_uploader(
+            "Selecciona varias imágenes",
+            type=['jpg', 'jpeg', 'png'],
+            accept_multiple_files=True,
+            key="batch_uploader"
+        )
+        
+        if not uploaded_files:
+            return
+        
+        if not st.button("🔍 Identificar lote", use_container_width=True):
+            return
+        
+        images = []
+        names = []
+        for uploaded in uploaded_files:
+            if uploaded.size > CONFIG['max_file_size_mb'] * 1024 * 1024:
+                st.warning(f"⚠️ {uploaded.name}: archivo muy grande, omitido")
+                continue
+            try:
+                images.append(Image.open(uploaded).convert('RGB'))
+                names.append(uploaded.name)
+            except Exception as e:
+                st.warning(f"⚠️ {uploaded.name}: no se pudo abrir ({e})")
+        
+        if not images:
+            return
+        
+        with st.spinner(f"🧠 Analizando {len(images)} imágenes..."):
+            results, timing = predict_batch_with_onnx(
+                session, images, species_list, top_k=CONFIG['top_predictions']
+            )
+        
+        rows = []
+        for name, predictions in zip(names, results):
+            best = predictions[0] if predictions else None
+            rows.append({
+                "Archivo": name,
+                "Especie": best["species"].replace('_', ' ') if best else "Error",
+                "Confianza": f"{best['percentage']}%" if best else "-"
+            })
+        
+        st.dataframe(rows, use_container_width=True)
+        st.caption(
+            f"⚡ {timing['num_images']} imágenes en {timing['total_time']*1000:.0f}ms "
+            f"({timing['images_per_second']:.1f} img/s, {len(timing['batches'])} lote(s))"
+        )
+
 def main():
     """Función principal de la aplicación"""
     
@@ -332,8 +709,12 @@ def main():
             return
         
         try:
+            tracer = get_tracer()
+            
             # Cargar y mostrar imagen
+            load_start = time.perf_counter()
             image = Image.open(uploaded_file).convert('RGB')
+            decode_ms = (time.perf_counter() - load_start) * 1000
             
             # Mostrar imagen centrada
             col1, col2, col3 = st.columns([1, 2, 1])
@@ -345,61 +726,74 @@ def main():
             with col2:
                 if st.button("🔍 Identificar con IA", type="primary", use_container_width=True):
                     
-                    with st.spinner("🧠 Analizando con IA ultra-rápida..."):
+                    # La identificación cuenta desde la decodificación de la imagen
+                    with st.spinner("🧠 Analizando con IA ultra-rápida..."), tracer.traza(inicio=load_start) as stage_times:
+                        tracer.registrar("decode", decode_ms)
+                        
                         # Procesar imagen
-                        processed_image = preprocess_image(image)
+                        with tracer.span("preprocess"):
+                            processed_image = preprocess_image(image)
                         
                         if processed_image is not None:
                             # Hacer predicción
-                            predictions, inference_time = predict_with_onnx(
-                                session, processed_image, species_list, 
-                                top_k=CONFIG['top_predictions']
-                            )
+                            if CONFIG["micro_batching"]:
+                                predictions, inference_time = predict_with_micro_batcher(
+                                    get_micro_batcher(session), processed_image, species_list,
+                                    top_k=CONFIG['top_predictions']
+                                )
+                            else:
+                                predictions, inference_time = predict_with_onnx(
+                                    session, processed_image, species_list, 
+                                    top_k=CONFIG['top_predictions']
+                                )
                             
                             if predictions:
-                                # Mostrar información de rendimiento
-                                show_performance_info(inference_time)
-                                
-                                # Resultado principal
-                                best_prediction = predictions[0]
-                                
-                                st.markdown('<div class="prediction-card">', unsafe_allow_html=True)
-                                
-                                # Información de la especie
-                                plant_info = get_plant_info_basic(best_prediction['species'])
-                                
-                                st.markdown(f"### 🌿 {plant_info['common_name']}")
-                                st.markdown(f"**Nombre científico:** {format_species_name(best_prediction['species'])}")
-                                st.markdown(f"**Descripción:** {plant_info['description']}")
+                                # Información de todas las especies mostradas
+                                with tracer.span("db_lookup"):
+                                    plant_infos = [get_plant_info_basic(pred['species']) for pred in predictions]
                                 
-                                # Barra de confianza visual
-                                confidence_pct = best_prediction['percentage']
-                                st.markdown(f"""
-                                <div class="confidence-bar">
-                                    <div class="confidence-fill" style="width: {confidence_pct}%;"></div>
-                                </div>
-                                <p style="text-align: center; font-weight: bold; margin: 0.5rem 0;">
-                                    Confianza: {confidence_pct}%
-                                </p>
-                                """, unsafe_allow_html=True)
-                                
-                                st.markdown('</div>', unsafe_allow_html=True)
-                                
-                                # Mostrar alternativas si hay más predicciones
-                                if len(predictions) > 1:
-                                    st.markdown("### 🤔 Otras posibilidades:")
+                                with tracer.span("render"):
+                                    # Mostrar información de rendimiento
+                                    show_performance_info(inference_time)
+                                    
+                                    # Resultado principal
+                                    best_prediction = predictions[0]
+                                    
+                                    st.markdown('<div class="prediction-card">', unsafe_allow_html=True)
+                                    
+                                    # Información de la especie
+                                    plant_info = plant_infos[0]
+                                    
+                                    st.markdown(f"### 🌿 {plant_info['common_name']}")
+                                    st.markdown(f"**Nombre científico:** {format_species_name(best_prediction['species'])}")
+                                    st.markdown(f"**Descripción:** {plant_info['description']}")
+                                    
+                                    # Barra de confianza visual
+                                    confidence_pct = best_prediction['percentage']
+                                    st.markdown(f"""
+                                    <div class="confidence-bar">
+                                        <div class="confidence-fill" style="width: {confidence_pct}%;"></div>
+                                    </div>
+                                    <p style="text-align: center; font-weight: bold; margin: 0.5rem 0;">
+                                        Confianza: {confidence_pct}%
+                                    </p>
+                                    """, unsafe_allow_html=True)
                                     
-                                    for i, pred in enumerate(predictions[1:], 2):
-                                        alt_info = get_plant_info_basic(pred['species'])
+                                    st.markdown('</div>', unsafe_allow_html=True)
+                                    
+                                    # Mostrar alternativas si hay más predicciones
+                                    if len(predictions) > 1:
+                                        st.markdown("### 🤔 Otras posibilidades:")
                                         
-                                        with st.expander(f"{i}. {alt_info['common_name']} - {pred['percentage']}%"):
-                                            st.markdown(f"**Nombre científico:** {format_species_name(pred['species'])}")
-                                            st.markdown(f"**Confianza:** {pred['percentage']}%")
-                                            st.markdown(f"**Descripción:** {alt_info['description']}")
-                                
-                                # Mensaje de éxito
-                                st.success("🎉 ¡Identificación completada!")
-                                st.balloons()
+                                        for i, (pred, alt_info) in enumerate(zip(predictions[1:], plant_infos[1:]), 2):
+                                            with st.expander(f"{i}. {alt_info['common_name']} - {pred['percentage']}%"):
+                                                st.markdown(f"**Nombre científico:** {format_species_name(pred['species'])}")
+                                                st.markdown(f"**Confianza:** {pred['percentage']}%")
+                                                st.markdown(f"**Descripción:** {alt_info['description']}")
+                                    
+                                    # Mensaje de éxito
+                                    st.success("🎉 ¡Identificación completada!")
+                                    st.balloons()
                                 
                                 # Información técnica
                                 with st.expander("📊 Información técnica"):
@@ -408,6 +802,13 @@ def main():
                                     st.markdown(f"- **Modelo:** 335 especies colombianas")
                                     st.markdown(f"- **Arquitectura:** MobileNetV2 optimizada")
                                     st.markdown(f"- **Index de clase:** {best_prediction['index']}")
+                                    
+                                    if CONFIG["micro_batching"]:
+                                        metrics = get_micro_batcher(session).exportar_metricas()
+                                        st.markdown(f"- **Cola de inferencia:** {metrics['profundidad_cola']} solicitudes")
+                                        st.markdown(f"- **Tamaño medio de lote:** {metrics['tamano_lote']['mean']:.1f}")
+                                    
+                                    show_stage_timings(stage_times, tracer)
                                 
                                 # Botón para nueva consulta
                                 if st.button("🔄 Identificar otra planta", use_container_width=True):
@@ -417,10 +818,18 @@ def main():
                                 st.error("❌ No se pudo realizar la predicción")
                         else:
                             st.error("❌ Error procesando la imagen")
+                    
+                    tracer.exportar_periodico(
+                        CONFIG["tracing_json_path"], CONFIG["tracing_prometheus_path"],
+                        CONFIG["tracing_export_interval_s"]
+                    )
                             
         except Exception as e:
             st.error(f"❌ Error cargando imagen: {e}")
     
+    # Modo por lotes
+    show_batch_mode(session, species_list)
+    
     # Footer
     st.markdown("---")
     st.markdown("""
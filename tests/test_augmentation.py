@@ -0,0 +1,42 @@
+# tests/test_augmentation.py - AUMENTO POR LOTES SOBRE VISTAS INTERCALADAS
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+from utils.augmentation import AumentadorLotes
+
+def _fuentes(n, lado=16):
+    """Imágenes de un solo valor por fila: flip y rotación no cambian el centro"""
+    valores = np.linspace(0.2, 0.7, n, dtype=np.float32)
+    return valores, np.broadcast_to(valores[:, None, None, None], (n, lado, lado, 3)).copy()
+
+def _verificar(valores, aumentadas):
+    assert not np.isnan(aumentadas).any(), "filas sin copiar desde su origen"
+    centros = aumentadas[:, 6:10, 6:10].mean(axis=(1, 2, 3))
+    # Brillo 0.8-1.2 más ruido leve sobre el valor de la fuente
+    assert np.all(centros >= valores * 0.8 - 0.1)
+    assert np.all(centros <= valores * 1.2 + 0.1)
+
+def test_vistas_intercaladas():
+    """Como cargar_imagenes_float: originales en [::2], aumentadas en [1::2]"""
+    valores, fuentes = _fuentes(32)
+    imagenes = np.full((64,) + fuentes.shape[1:], np.nan, dtype=np.float32)
+    imagenes[::2] = fuentes
+    
+    AumentadorLotes(semilla=0, tamano_bloque=8).aumentar_lote(imagenes[::2], out=imagenes[1::2])
+    
+    assert np.array_equal(imagenes[::2], fuentes)
+    _verificar(valores, imagenes[1::2])
+
+@pytest.mark.parametrize("en_sitio", [False, True])
+def test_destino_separado_y_en_sitio(en_sitio):
+    valores, fuentes = _fuentes(16)
+    destino = fuentes if en_sitio else np.full(fuentes.shape, np.nan, dtype=np.float32)
+    
+    AumentadorLotes(semilla=1, tamano_bloque=4).aumentar_lote(fuentes, out=destino)
+    
+    _verificar(valores, destino)
@@ -0,0 +1,119 @@
+# tests/test_session_store.py - CONCURRENCIA DEL ALMACÉN DE SESIONES ACTIVAS
+
+import multiprocessing
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+from utils.session_store import AlmacenSesionesMemoria, AlmacenSesionesSQLite, ConflictoVersion
+
+def _estado(session_id, inicio=None, intento=1):
+    inicio = inicio or datetime.now()
+    return {
+        "datos": {"session_id": session_id, "timestamp_inicio": inicio.isoformat(), "intento_actual": intento},
+        "probabilidades": np.arange(4, dtype=np.float32),
+        "miniatura": b"jpeg"
+    }
+
+@pytest.fixture(params=["memoria", "sqlite"])
+def almacen(request, tmp_path):
+    if request.param == "memoria":
+        return AlmacenSesionesMemoria()
+    return AlmacenSesionesSQLite(tmp_path / "activas.sqlite3")
+
+def test_guardar_y_obtener(almacen):
+    assert almacen.guardar(_estado("a")) == 1
+    
+    estado, version = almacen.obtener("a")
+    assert version == 1
+    assert estado["datos"]["session_id"] == "a"
+    assert np.array_equal(estado["probabilidades"], np.arange(4, dtype=np.float32))
+    assert estado["miniatura"] == b"jpeg"
+
+def test_actualizacion_optimista(almacen):
+    almacen.guardar(_estado("a"))
+    assert almacen.guardar(_estado("a", intento=2), version_esperada=1) == 2
+    
+    # Un segundo escritor que leyó la versión 1 pierde
+    with pytest.raises(ConflictoVersion):
+        almacen.guardar(_estado("a", intento=3), version_esperada=1)
+    assert almacen.obtener("a")[0]["datos"]["intento_actual"] == 2
+    
+    # Insertar una sesión que ya existe también es un conflicto
+    with pytest.raises(ConflictoVersion):
+        almacen.guardar(_estado("a"))
+
+def test_extraer_expiradas(almacen):
+    ahora = datetime.now()
+    almacen.guardar(_estado("vieja", ahora - timedelta(hours=3)))
+    for i in range(5):
+        almacen.guardar(_estado(f"s{i}", ahora + timedelta(seconds=i)))
+    
+    limite = (ahora - timedelta(hours=2)).timestamp()
+    extraidas = almacen.extraer_expiradas(limite, max_sesiones=3)
+    
+    # La expirada y las dos más antiguas por encima del máximo
+    assert [estado["datos"]["session_id"] for estado in extraidas] == ["vieja", "s0", "s1"]
+    assert almacen.contar() == 3
+    assert almacen.obtener("s0") is None
+
+def _worker_crear_y_extraer(ruta, worker, cantidad, cola):
+    almacen = AlmacenSesionesSQLite(ruta)
+    extraidas = []
+    for i in range(cantidad):
+        almacen.guardar(_estado(f"w{worker}-{i}"))
+        extraidas += [estado["datos"]["session_id"] for estado in almacen.extraer_expiradas(0, max_sesiones=20)]
+    cola.put(extraidas)
+
+def test_extraer_expiradas_entre_procesos(tmp_path):
+    """Cada sesión desalojada la extrae exactamente un proceso"""
+    ruta = tmp_path / "activas.sqlite3"
+    AlmacenSesionesSQLite(ruta)
+    
+    contexto = multiprocessing.get_context("spawn")
+    cola = contexto.Queue()
+    procesos = [contexto.Process(target=_worker_crear_y_extraer, args=(ruta, w, 100, cola)) for w in range(4)]
+    for proceso in procesos:
+        proceso.start()
+    extraidas = [session_id for _ in procesos for session_id in cola.get(timeout=60)]
+    for proceso in procesos:
+        proceso.join(timeout=60)
+        assert proceso.exitcode == 0
+    
+    assert len(extraidas) == len(set(extraidas)) == 400 - 20
+    assert AlmacenSesionesSQLite(ruta).contar() == 20
+
+def _worker_actualizar(ruta, cola):
+    almacen = AlmacenSesionesSQLite(ruta)
+    ganadas = 0
+    for _ in range(50):
+        estado, version = almacen.obtener("compartida")
+        estado["datos"]["intento_actual"] += 1
+        try:
+            almacen.guardar(estado, version_esperada=version)
+            ganadas += 1
+        except ConflictoVersion:
+            pass
+    cola.put(ganadas)
+
+def test_actualizaciones_concurrentes_no_se_pierden(tmp_path):
+    """Solo las actualizaciones que ganan la versión cuentan, y ninguna se pisa"""
+    ruta = tmp_path / "activas.sqlite3"
+    AlmacenSesionesSQLite(ruta).guardar(_estado("compartida", intento=0))
+    
+    contexto = multiprocessing.get_context("spawn")
+    cola = contexto.Queue()
+    procesos = [contexto.Process(target=_worker_actualizar, args=(ruta, cola)) for _ in range(4)]
+    for proceso in procesos:
+        proceso.start()
+    ganadas = sum(cola.get(timeout=60) for _ in procesos)
+    for proceso in procesos:
+        proceso.join(timeout=60)
+    
+    estado, version = AlmacenSesionesSQLite(ruta).obtener("compartida")
+    assert estado["datos"]["intento_actual"] == ganadas
+    assert version == ganadas + 1
@@ -0,0 +1,117 @@
+# utils/augmentation.py - DATA AUGMENTATION VECTORIZADO POR LOTES
+
+import cv2
+import numpy as np
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class AumentadorLotes:
+    """
+    Aplica las transformaciones de DatasetManager._aplicar_augmentation a un
+    bloque (N, H, W, 3) float32 de una sola vez
+    
+    Las decisiones y parámetros aleatorios se sortean para todo el bloque con
+    un np.random.Generator; cada bloque usa un generador hijo derivado de la
+    semilla, así el resultado es reproducible sin importar el número de hilos.
+    """
+    
+    def __init__(self, semilla=None, tamano_bloque=64, num_workers=1):
+        """
+        Args:
+            semilla: Semilla o np.random.Generator (None = aleatorio)
+            tamano_bloque: Imágenes por bloque (limita memoria temporal)
+            num_workers: Hilos para procesar bloques en paralelo
+        """
+        self.rng = np.random.default_rng(semilla)
+        self.tamano_bloque = max(1, int(tamano_bloque))
+        self.num_workers = max(1, int(num_workers))
+        self._lock = threading.Lock()
+    
+    def aumentar_lote(self, imagenes, out=None):
+        """
+        Aumenta un lote de imágenes normalizadas (0-1)
+        
+        Args:
+            imagenes: Array float32 (N, H, W, 3)
+            out: Destino (N, H, W, 3); puede ser imagenes (in-place) o una vista
+        
+        Returns:
+            np.array: out con las imágenes aumentadas
+        """
+        if out is None:
+            out = np.empty(imagenes.shape, dtype=np.float32)
+        
+        inicios = range(0, len(imagenes), self.tamano_bloque)
+        with self._lock:
+            generadores = self.rng.spawn(len(inicios))
+        
+        def procesar(inicio, rng):
+            fin = inicio + self.tamano_bloque
+            self._aumentar_bloque(imagenes[inicio:fin], out[inicio:fin], rng)
+        
+        # cv2 y el llenado de números aleatorios liberan el GIL
+        if self.num_workers > 1 and len(inicios) > 1:
+            with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+                list(executor.map(procesar, inicios, generadores))
+        else:
+            for inicio, rng in zip(inicios, generadores):
+                procesar(inicio, rng)
+        
+        return out
+    
+    def _aumentar_bloque(self, origen, destino, rng):
+        """Rotación, flip, brillo y ruido sobre un bloque, en ese orden"""
+        n = len(origen)
+        h, w = origen.shape[1:3]
+        
+        # Sorteos para todo el bloque (mismas probabilidades que el original)
+        rotar = rng.random(n) > 0.5
+        angulos = rng.uniform(-15, 15, n)
+        voltear = rng.random(n) > 0.5
+        brillo = rng.random(n) > 0.5
+        factores = np.where(brillo, rng.uniform(0.8, 1.2, n), 1.0).astype(np.float32)
+        ruido = rng.random(n) > 0.7
+        
+        # Rotación aleatoria (-15 a +15 grados): matrices del bloque en una
+        # sola operación, warp escribiendo directo en destino
+        radianes = np.deg2rad(angulos)
+        alfa, beta = np.cos(radianes), np.sin(radianes)
+        cx, cy = w//2, h//2
+        matrices = np.empty((n, 2, 3))
+        matrices[:, 0, 0] = alfa
+        matrices[:, 0, 1] = beta
+        matrices[:, 0, 2] = (1 - alfa) * cx - beta * cy
+        matrices[:, 1, 0] = -beta
+        matrices[:, 1, 1] = alfa
+        matrices[:, 1, 2] = beta * cx + (1 - alfa) * cy
+        
+        for i in range(n):
+            if rotar[i]:
+                cv2.warpAffine(origen[i], matrices[i], (w, h), dst=destino[i])
+            elif not np.may_share_memory(origen[i], destino[i]):
+                # Por fila (contigua, la comparación de límites es exacta): las
+                # vistas intercaladas [::2] / [1::2] se solapan en límites pero
+                # no comparten elementos
+                destino[i] = origen[i]
+        
+        # Flip horizontal (in-place, sin copias temporales)
+        for i in np.flatnonzero(voltear):
+            cv2.flip(destino[i], 1, dst=destino[i])
+        
+        # Ajuste de brillo: factor 1.0 en las imágenes no seleccionadas
+        np.multiply(destino, factores[:, None, None, None], out=destino)
+        np.clip(destino, 0, 1, out=destino)
+        
+        # Ruido gaussiano leve, generado en un buffer reutilizado
+        indices = np.flatnonzero(ruido)
+        if len(indices):
+            gauss = np.empty(origen.shape[1:], dtype=np.float32)
+            for i in indices:
+                rng.standard_normal(dtype=np.float32, out=gauss)
+                gauss *= 0.02
+                destino[i] += gauss
+                np.clip(destino[i], 0, 1, out=destino[i])
+    
+    def aumentar_imagen(self, imagen):
+        """Aumenta una sola imagen (H, W, 3); retorna una copia"""
+        return self.aumentar_lote(imagen[np.newaxis])[0]
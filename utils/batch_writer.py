@@ -0,0 +1,231 @@
+# utils/batch_writer.py - ESCRITURA EN SEGUNDO PLANO POR LOTES CON JOURNAL LOCAL
+
+import json
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Clave que marca los valores no JSON (fechas) en el journal
+TIPO_JOURNAL = "__tipo__"
+
+class EscritorLotes:
+    """
+    Encola registros y los escribe por lotes desde un hilo de fondo
+    
+    Un lote se envía al juntar max_lote registros o cuando el más antiguo
+    lleva intervalo_s esperando. Los fallos se reintentan con backoff
+    exponencial; los lotes que agotan los reintentos y lo que queda en la
+    cola al detenerse se guardan en un journal JSONL que se reenvía con
+    recuperar_journal().
+    """
+    
+    def __init__(self, escribir_lote, journal_file, max_lote=500, intervalo_s=2.0,
+                 max_reintentos=5, backoff_base_s=0.5, backoff_max_s=30.0):
+        """
+        Args:
+            escribir_lote: Función que recibe una lista de registros y los escribe
+                           (debe ser idempotente: un lote puede reenviarse)
+            journal_file: Archivo JSONL para registros no enviados
+            max_lote: Máximo de registros por escritura
+            intervalo_s: Espera máxima de un registro antes de enviar el lote
+            max_reintentos: Reintentos de un lote antes de pasarlo al journal
+            backoff_base_s: Espera del primer reintento (se duplica en cada uno)
+            backoff_max_s: Espera máxima entre reintentos
+        """
+        self.escribir_lote = escribir_lote
+        self.journal_file = Path(journal_file)
+        self.max_lote = max(1, int(max_lote))
+        self.intervalo = max(0.0, intervalo_s)
+        self.max_reintentos = max(0, int(max_reintentos))
+        self.backoff_base = backoff_base_s
+        self.backoff_max = backoff_max_s
+        
+        self._cola = queue.Queue()
+        self._activo = True
+        self._parar = threading.Event()  # Interrumpe las esperas de backoff
+        self._journal_lock = threading.Lock()
+        
+        # Métricas
+        self.enviados = 0
+        self.lotes_enviados = 0
+        self.reintentos = 0
+        self.enviados_a_journal = 0
+        
+        self._hilo = threading.Thread(target=self._bucle, name="escritor-lotes", daemon=True)
+        self._hilo.start()
+    
+    def encolar(self, registro):
+        """Agrega un registro a la cola (no bloquea)"""
+        if not self._activo:
+            self._guardar_journal([registro])
+            return
+        self._cola.put(registro)
+    
+    def pendientes(self):
+        """Registros esperando en la cola"""
+        return self._cola.qsize()
+    
+    def detener(self, timeout=5.0):
+        """
+        Envía lo pendiente (un intento) y guarda el resto en el journal
+        
+        Args:
+            timeout: Tiempo máximo de espera al hilo de fondo
+        """
+        if not self._activo:
+            return
+        self._activo = False
+        self._parar.set()
+        self._cola.put(None)
+        self._hilo.join(timeout=timeout)
+        
+        # Si el hilo no terminó a tiempo, lo que siga en la cola va al journal
+        restantes = self._vaciar_cola()
+        if restantes:
+            self._guardar_journal(restantes)
+    
+    def recuperar_journal(self):
+        """
+        Vuelve a encolar los registros guardados en el journal
+        
+        Returns:
+            int: Registros recuperados
+        """
+        # Renombrar primero: lo que falle de nuevo se escribe en un journal nuevo.
+        # El nombre es propio del proceso y el rename es atómico: si varios workers
+        # recuperan a la vez, solo uno se queda con el journal
+        en_proceso = self.journal_file.with_name(f"{self.journal_file.name}.{os.getpid()}.recuperando")
+        with self._journal_lock:
+            try:
+                os.replace(self.journal_file, en_proceso)
+            except FileNotFoundError:
+                return 0
+        
+        registros = []
+        with open(en_proceso, 'r', encoding='utf-8') as f:
+            for linea in f:
+                linea = linea.strip()
+                if not linea:
+                    continue
+                try:
+                    registros.append(json.loads(linea, object_hook=_deserializar))
+                except json.JSONDecodeError:
+                    print(f"⚠️ Línea corrupta en journal ignorada: {linea[:80]}")
+        
+        for registro in registros:
+            self._cola.put(registro)
+        en_proceso.unlink()
+        
+        if registros:
+            print(f"📤 {len(registros)} registros recuperados del journal")
+        return len(registros)
+    
+    def exportar_metricas(self):
+        """Contadores del escritor"""
+        return {
+            "pendientes": self.pendientes(),
+            "enviados": self.enviados,
+            "lotes_enviados": self.lotes_enviados,
+            "reintentos": self.reintentos,
+            "enviados_a_journal": self.enviados_a_journal
+        }
+    
+    def _vaciar_cola(self):
+        """Saca todo lo que quede en la cola sin bloquear"""
+        registros = []
+        while True:
+            try:
+                registro = self._cola.get_nowait()
+            except queue.Empty:
+                return registros
+            if registro is not None:
+                registros.append(registro)
+    
+    def _bucle(self):
+        """Bucle principal: arma lotes por tamaño o tiempo y los envía"""
+        while True:
+            primero = self._cola.get()
+            if primero is None:
+                break
+            
+            lote = [primero]
+            limite = time.monotonic() + self.intervalo
+            fin = False
+            
+            while len(lote) < self.max_lote:
+                restante = limite - time.monotonic()
+                try:
+                    registro = self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                if registro is None:
+                    fin = True
+                    break
+                lote.append(registro)
+            
+            self._enviar(lote, reintentar=not fin)
+            if fin:
+                break
+        
+        # Al detenerse: un único intento por lote con lo que quede
+        restantes = self._vaciar_cola()
+        for inicio in range(0, len(restantes), self.max_lote):
+            self._enviar(restantes[inicio:inicio + self.max_lote], reintentar=False)
+    
+    def _enviar(self, lote, reintentar=True):
+        """Escribe un lote con reintentos; si no se logra, lo guarda en el journal"""
+        intentos = self.max_reintentos + 1 if reintentar else 1
+        
+        for intento in range(intentos):
+            try:
+                self.escribir_lote(lote)
+                self.enviados += len(lote)
+                self.lotes_enviados += 1
+                return True
+            except Exception as e:
+                if intento + 1 >= intentos:
+                    print(f"❌ Lote de {len(lote)} registros no enviado: {e}")
+                    break
+                
+                self.reintentos += 1
+                espera = min(self.backoff_max, self.backoff_base * (2 ** intento))
+                espera *= random.uniform(0.5, 1.0)  # jitter para no sincronizar reintentos
+                print(f"⚠️ Error enviando lote ({e}); reintento en {espera:.1f}s")
+                
+                # Si se pide detener durante la espera, no seguir reintentando
+                if self._parar.wait(espera):
+                    break
+        
+        self._guardar_journal(lote)
+        return False
+    
+    def _guardar_journal(self, registros):
+        """Agrega registros al journal JSONL (una línea por registro)"""
+        try:
+            with self._journal_lock:
+                self.journal_file.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.journal_file, 'a', encoding='utf-8') as f:
+                    for registro in registros:
+                        f.write(json.dumps(registro, ensure_ascii=False, default=_serializar) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            self.enviados_a_journal += len(registros)
+            print(f"💾 {len(registros)} registros guardados en journal: {self.journal_file}")
+        except Exception as e:
+            print(f"❌ Error escribiendo journal ({len(registros)} registros perdidos): {e}")
+
+def _serializar(valor):
+    """Fechas como {"__tipo__": "datetime", "valor": ISO 8601}; cualquier otro valor como texto"""
+    if isinstance(valor, datetime):
+        return {TIPO_JOURNAL: "datetime", "valor": valor.isoformat()}
+    return str(valor)
+
+def _deserializar(objeto):
+    """object_hook de json.loads: restaura las fechas marcadas por _serializar a cualquier profundidad"""
+    if objeto.get(TIPO_JOURNAL) == "datetime" and len(objeto) == 2:
+        return datetime.fromisoformat(objeto["valor"])
+    return objeto
@@ -2,17 +2,29 @@
 
 import firebase_admin
 from firebase_admin import credentials, firestore
+import atexit
 import json
 import os
 import re
+import threading
+import unicodedata
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
 import sys
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 
 # Agregar directorio padre al path
 sys.path.append(str(Path(__file__).parent.parent))
-from config import FIREBASE_CONFIG, API_CONFIG
+from config import FIREBASE_CONFIG, API_CONFIG, PATHS
+from utils.batch_writer import EscritorLotes
+
+# Campos de cada documento de plantas que se guardan en el cache local
+CAMPOS_CACHE_ESPECIES = ("nombre_cientifico", "nombre_comun", "descripcion",
+                         "fecha_observacion", "fuente", "imagenes", "taxonomia")
+
+# Rangos infraespecíficos que forman parte del nombre (no del autor)
+RANGOS_INFRAESPECIFICOS = {"var", "subsp", "ssp", "forma", "subvar"}
 
 class FirestoreManager:
     """Gestiona la conexión y operaciones con Firestore Database - VERSION CORREGIDA"""
@@ -24,9 +36,22 @@ class FirestoreManager:
         self.collections = FIREBASE_CONFIG["collections"]
         self.plantas_schema = FIREBASE_CONFIG["plantas_schema"]
         
-        # Cache para mapeo de nombres (mejora rendimiento)
+        # Cache para mapeo de nombres: nombre del modelo -> id del documento (None = no existe)
         self._nombre_cache = {}
         
+        # Índices de nombres normalizados -> id del documento
+        self._indice_claves = {}
+        self._indice_binomial = {}  # None si el binomio es ambiguo
+        
+        # Cache completo de la colección plantas: id del documento -> registro
+        self._especies_cache = {}
+        self._especies_cache_timestamp = None  # time.time() de la carga desde Firestore
+        self._especies_cache_intento = 0.0  # Último intento de carga fallido
+        self._especies_cache_lock = threading.Lock()
+        
+        # Escritor en segundo plano de analisis_usuarios (se crea al inicializar)
+        self._escritor_analisis = None
+        
     def initialize_firestore(self, service_account_path=None):
         """Inicializa Firestore con las credenciales reales"""
         try:
@@ -44,6 +69,8 @@ class FirestoreManager:
                 print("✅ Firebase ya está inicializado")
                 self.initialized = True
                 self.db = firestore.client()
+                self._cargar_cache_especies()
+                self._obtener_escritor_analisis()
                 return True
             
             # Inicializar Firebase para Firestore
@@ -59,9 +86,10 @@ class FirestoreManager:
             print(f"📊 Proyecto: {FIREBASE_CONFIG['project_id']}")
             print(f"📋 Colección plantas: {self.collections['plantas']}")
             
-            # Verificar conexión y cargar cache de nombres
+            # Verificar conexión y cargar cache de especies
             if self._test_connection():
-                self._cargar_cache_nombres()
+                self._cargar_cache_especies()
+                self._obtener_escritor_analisis()
                 return True
             else:
                 return False
@@ -99,89 +127,205 @@ class FirestoreManager:
     
     # ==================== NUEVAS FUNCIONES DE NORMALIZACIÓN ====================
     
-    def _normalizar_nombre_a_firestore(self, nombre_modelo: str) -> List[str]:
+    def _claves_normalizadas(self, nombre: str) -> Tuple[str, str]:
         """
-        Convierte nombre del modelo al formato de Firestore
+        Claves de búsqueda de un nombre científico (formato del modelo o de Firestore)
         
-        Args:
-            nombre_modelo: "Agave_americana_L" (formato del modelo)
+        Se ignoran mayúsculas, tildes, puntuación y espacios, así
+        "Acrocomia_aculeata_(Jacq.)_Lodd._ex_R.Keith" y
+        "Acrocomia aculeata (Jacq.) Lodd. ex R. Keith" tienen la misma clave.
         
         Returns:
-            List[str]: Lista de posibles nombres en Firestore ["Agave americana L.", "Agave americana L", etc.]
-        """
-        variaciones = []
-        
-        # Conversión básica: guiones bajos a espacios
-        nombre_espacios = nombre_modelo.replace('_', ' ')
-        variaciones.append(nombre_espacios)
-        
-        # Con punto al final
-        if not nombre_espacios.endswith('.'):
-            variaciones.append(nombre_espacios + '.')
-        
-        # Sin punto al final
-        if nombre_espacios.endswith('.'):
-            variaciones.append(nombre_espacios[:-1])
-        
-        # Variaciones con paréntesis (común en nombres científicos)
-        # Ejemplo: "Agave_americana_(L.)_Oerst" -> "Agave americana (L.) Oerst."
-        if '(' in nombre_modelo:
-            nombre_parentesis = re.sub(r'_\(', ' (', nombre_modelo)
-            nombre_parentesis = re.sub(r'\)_', ') ', nombre_parentesis)
-            nombre_parentesis = nombre_parentesis.replace('_', ' ')
-            variaciones.append(nombre_parentesis)
-            if not nombre_parentesis.endswith('.'):
-                variaciones.append(nombre_parentesis + '.')
-        
-        # Remover duplicados manteniendo orden
-        variaciones_unicas = []
-        for var in variaciones:
-            if var not in variaciones_unicas:
-                variaciones_unicas.append(var)
-        
-        return variaciones_unicas
-    
-    def _normalizar_nombre_a_modelo(self, nombre_firestore: str) -> str:
+            Tuple[str, str]: (clave completa, clave del binomio sin autores
+                              pero con rango infraespecífico si lo hay)
         """
-        Convierte nombre de Firestore al formato del modelo
+        nombre = unicodedata.normalize('NFKD', nombre.replace('_', ' '))
+        nombre = ''.join(c for c in nombre if not unicodedata.combining(c)).casefold()
+        tokens = re.findall(r'[a-z0-9]+', nombre)
         
-        Args:
-            nombre_firestore: "Agave americana L." (formato Firestore)
+        binomio = tokens[:2]
+        for i in range(2, len(tokens) - 1):
+            if tokens[i] in RANGOS_INFRAESPECIFICOS:
+                binomio += tokens[i:i + 2]
+                break
         
-        Returns:
-            str: "Agave_americana_L" (formato del modelo)
+        return ''.join(tokens), ' '.join(binomio)
+    
+    # ==================== CACHE LOCAL DE ESPECIES ====================
+    
+    def _registro_cache(self, data: Dict[str, Any], documento_id: str) -> Dict[str, Any]:
+        """Campos de un documento de plantas serializables a JSON"""
+        registro = {campo: data[campo] for campo in CAMPOS_CACHE_ESPECIES if campo in data}
+        if 'fecha_observacion' in registro:
+            registro['fecha_observacion'] = str(registro['fecha_observacion'])
+        registro['documento_id'] = documento_id
+        return registro
+    
+    def _indexar_especies(self, registros: List[Dict[str, Any]], timestamp: float):
+        """Reemplaza el cache en memoria por una lista de registros"""
+        especies = {}
+        indice_claves = {}
+        indice_binomial = {}
+        for registro in registros:
+            documento_id = registro['documento_id']
+            especies[documento_id] = registro
+            
+            nombre_firestore = registro.get('nombre_cientifico', '')
+            if nombre_firestore:
+                clave, binomio = self._claves_normalizadas(nombre_firestore)
+                indice_claves.setdefault(clave, documento_id)
+                # Un binomio compartido por varios documentos no identifica a ninguno
+                indice_binomial[binomio] = None if binomio in indice_binomial else documento_id
+        
+        self._especies_cache = especies
+        self._indice_claves = indice_claves
+        self._indice_binomial = indice_binomial
+        self._nombre_cache = {}
+        self._especies_cache_timestamp = timestamp
+        
+        # Resolver de una vez todas las clases del modelo
+        especies_modelo = self._cargar_especies_modelo()
+        resueltas = sum(self._resolver_documento_id(nombre) is not None for nombre in especies_modelo)
+        if especies_modelo:
+            print(f"🔗 Índice de nombres: {resueltas}/{len(especies_modelo)} especies del modelo en Firestore")
+    
+    def _cargar_especies_modelo(self) -> List[str]:
+        """Nombres de las clases del modelo (lista vacía si no hay species_list)"""
+        try:
+            with open(PATHS["species_list_file"], 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return []
+    
+    def _resolver_documento_id(self, nombre_cientifico: str) -> Optional[str]:
         """
-        # Remover punto final si existe
-        nombre = nombre_firestore.rstrip('.')
+        Id del documento de una especie usando solo los índices en memoria
         
-        # Reemplazar espacios con guiones bajos
-        nombre = nombre.replace(' ', '_')
+        Primero la clave completa (mismo nombre y autores) y luego el binomio,
+        que tolera autores abreviados u omitidos si no es ambiguo.
+        """
+        if nombre_cientifico in self._nombre_cache:
+            return self._nombre_cache[nombre_cientifico]
         
-        # Manejar paréntesis
-        nombre = re.sub(r' \(', '_(', nombre)
-        nombre = re.sub(r'\) ', ')_', nombre)
+        clave, binomio = self._claves_normalizadas(nombre_cientifico)
+        documento_id = self._indice_claves.get(clave) or self._indice_binomial.get(binomio)
         
-        return nombre
+        self._nombre_cache[nombre_cientifico] = documento_id
+        return documento_id
     
-    def _cargar_cache_nombres(self):
-        """Carga un cache de nombres para búsquedas más rápidas"""
+    def _obtener_registro(self, documento_id: str) -> Optional[Dict[str, Any]]:
+        """Registro de un documento: del cache o con una lectura directa por id"""
+        registro = self._especies_cache.get(documento_id)
+        if registro is not None:
+            return registro
+        
+        doc = self.db.collection(self.collections["plantas"]).document(documento_id).get()
+        if not doc.exists:
+            return None
+        
+        registro = self._registro_cache(doc.to_dict(), doc.id)
+        self._especies_cache[documento_id] = registro
+        return registro
+    
+    def _cache_especies_vigente(self, timestamp: Optional[float]) -> bool:
+        """True si un cache cargado en timestamp no superó el TTL"""
+        ttl = FIREBASE_CONFIG["species_cache_ttl_hours"] * 3600
+        return timestamp is not None and time.time() - timestamp < ttl
+    
+    def _leer_snapshot_especies(self) -> Optional[Dict[str, Any]]:
+        """Snapshot en disco si existe y corresponde a la versión y colección actuales"""
+        snapshot_file = PATHS["species_cache_file"]
+        if not snapshot_file.exists():
+            return None
+        
         try:
-            print("📋 Cargando cache de nombres científicos...")
-            
-            plantas_ref = self.db.collection(self.collections["plantas"])
-            docs = plantas_ref.limit(50).stream()  # Cargar primeros 50 para cache inicial
-            
-            for doc in docs:
-                data = doc.to_dict()
-                nombre_firestore = data.get('nombre_cientifico', '')
-                if nombre_firestore:
-                    nombre_modelo = self._normalizar_nombre_a_modelo(nombre_firestore)
-                    self._nombre_cache[nombre_modelo] = nombre_firestore
-            
-            print(f"✅ Cache cargado con {len(self._nombre_cache)} nombres")
-            
+            with open(snapshot_file, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
         except Exception as e:
-            print(f"⚠️ Error cargando cache de nombres: {e}")
+            print(f"⚠️ Snapshot de especies ilegible, se recargará: {e}")
+            return None
+        
+        if (snapshot.get('version') != FIREBASE_CONFIG["species_cache_version"] or
+                snapshot.get('coleccion') != self.collections["plantas"]):
+            return None
+        return snapshot
+    
+    def _guardar_snapshot_especies(self, registros: List[Dict[str, Any]], timestamp: float):
+        """Escribe el snapshot de especies de forma atómica"""
+        snapshot_file = PATHS["species_cache_file"]
+        snapshot_file.parent.mkdir(parents=True, exist_ok=True)
+        
+        tmp_file = snapshot_file.with_suffix(".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                "version": FIREBASE_CONFIG["species_cache_version"],
+                "coleccion": self.collections["plantas"],
+                "timestamp": timestamp,
+                "registros": registros
+            }, f, ensure_ascii=False, default=str)
+        os.replace(tmp_file, snapshot_file)
+    
+    def _cargar_cache_especies(self, forzar: bool = False) -> bool:
+        """
+        Carga todos los documentos de plantas en memoria
+        
+        Usa el snapshot en disco mientras esté vigente; si no, lee la colección
+        completa en una sola consulta y reescribe el snapshot.
+        
+        Args:
+            forzar: Ignorar el snapshot y releer desde Firestore
+        
+        Returns:
+            bool: True si el cache quedó cargado
+        """
+        with self._especies_cache_lock:
+            if not forzar:
+                snapshot = self._leer_snapshot_especies()
+                if snapshot and self._cache_especies_vigente(snapshot.get('timestamp')):
+                    self._indexar_especies(snapshot['registros'], snapshot['timestamp'])
+                    print(f"💾 Cache de especies desde snapshot: {len(self._especies_cache)} especies")
+                    return True
+            
+            try:
+                print("📋 Cargando colección de plantas completa...")
+                
+                plantas_ref = self.db.collection(self.collections["plantas"])
+                registros = [self._registro_cache(doc.to_dict(), doc.id) for doc in plantas_ref.stream()]
+                timestamp = time.time()
+                
+                self._indexar_especies(registros, timestamp)
+                self._guardar_snapshot_especies(registros, timestamp)
+                
+                print(f"✅ Cache cargado con {len(self._especies_cache)} especies")
+                return True
+                
+            except Exception as e:
+                print(f"⚠️ Error cargando cache de especies: {e}")
+                self._especies_cache_intento = time.time()
+                
+                # Un snapshot vencido es mejor que consultar Firestore en cada búsqueda
+                snapshot = None if self._especies_cache else self._leer_snapshot_especies()
+                if snapshot:
+                    self._indexar_especies(snapshot['registros'], snapshot['timestamp'])
+                    print(f"💾 Usando snapshot vencido: {len(self._especies_cache)} especies")
+                return bool(self._especies_cache)
+    
+    def refrescar_cache_especies(self) -> bool:
+        """Relee la colección de plantas desde Firestore (p. ej. tras editar documentos)"""
+        if not self.initialized:
+            return False
+        return self._cargar_cache_especies(forzar=True)
+    
+    def _verificar_cache_especies(self):
+        """Recarga el cache si superó el TTL o si la carga inicial falló"""
+        if self._cache_especies_vigente(self._especies_cache_timestamp):
+            return
+        
+        # Sin Firestore disponible, no reintentar en cada búsqueda
+        if time.time() - self._especies_cache_intento < FIREBASE_CONFIG["species_cache_retry_minutes"] * 60:
+            return
+        
+        self._cargar_cache_especies(forzar=bool(self._especies_cache))
     
     # ==================== FUNCIÓN PRINCIPAL CORREGIDA ====================
     
@@ -200,43 +344,18 @@ class FirestoreManager:
                 print("⚠️ Firestore no inicializado")
                 return self._generar_info_no_encontrada(nombre_cientifico)
             
-            print(f"🔍 Búsqueda con normalización para: {nombre_cientifico}")
+            self._verificar_cache_especies()
             
-            # 1. Buscar en cache primero
-            if nombre_cientifico in self._nombre_cache:
-                nombre_firestore = self._nombre_cache[nombre_cientifico]
-                print(f"💨 Encontrado en cache: {nombre_firestore}")
-                return self._buscar_por_nombre_exacto(nombre_firestore, nombre_cientifico)
+            # 1. Nombre -> id del documento con los índices en memoria
+            documento_id = self._resolver_documento_id(nombre_cientifico)
             
-            # 2. Generar variaciones de nombres para Firestore
-            variaciones = self._normalizar_nombre_a_firestore(nombre_cientifico)
-            print(f"🔄 Probando variaciones: {variaciones}")
+            # 2. Registro desde el cache (a lo sumo una lectura directa por id)
+            registro = self._obtener_registro(documento_id) if documento_id else None
             
-            plantas_ref = self.db.collection(self.collections["plantas"])
+            if registro is not None:
+                return self._procesar_datos_firestore(registro, nombre_cientifico)
             
-            # 3. Buscar cada variación
-            for variacion in variaciones:
-                query = plantas_ref.where('nombre_cientifico', '==', variacion).limit(1)
-                docs = list(query.stream())
-                
-                if docs:
-                    print(f"✅ Encontrado con variación: '{variacion}'")
-                    
-                    # Agregar al cache
-                    self._nombre_cache[nombre_cientifico] = variacion
-                    
-                    # Procesar y retornar datos
-                    data = docs[0].to_dict()
-                    return self._procesar_datos_firestore(data, nombre_cientifico)
-            
-            # 4. Búsqueda parcial como último recurso
-            print(f"🔍 Búsqueda parcial para: {nombre_cientifico}")
-            resultado_parcial = self._busqueda_parcial_inteligente(nombre_cientifico)
-            
-            if resultado_parcial:
-                return resultado_parcial
-            
-            # 5. No encontrado
+            # 3. No encontrado
             print(f"❌ No encontrado en Firestore: {nombre_cientifico}")
             return self._generar_info_no_encontrada(nombre_cientifico)
                 
@@ -244,57 +363,57 @@ class FirestoreManager:
             print(f"❌ Error en búsqueda básica: {e}")
             return self._generar_info_error(nombre_cientifico, str(e))
     
-    def _buscar_por_nombre_exacto(self, nombre_firestore: str, nombre_original: str) -> Dict[str, Any]:
-        """Busca por nombre exacto en Firestore"""
+    def obtener_info_especies_lote(self, nombres_cientificos: List[str]) -> List[Dict[str, Any]]:
+        """
+        Información de varias especies con una sola lectura en lote
+        
+        Los nombres se resuelven con los índices en memoria; los documentos
+        que no estén en el cache se leen juntos con get_all.
+        
+        Args:
+            nombres_cientificos: Nombres en formato del modelo
+        
+        Returns:
+            List[dict]: Información de cada especie, en el mismo orden
+        """
         try:
-            plantas_ref = self.db.collection(self.collections["plantas"])
-            query = plantas_ref.where('nombre_cientifico', '==', nombre_firestore).limit(1)
-            docs = list(query.stream())
+            if not self.initialized:
+                print("⚠️ Firestore no inicializado")
+                return [self._generar_info_no_encontrada(nombre) for nombre in nombres_cientificos]
             
-            if docs:
-                data = docs[0].to_dict()
-                return self._procesar_datos_firestore(data, nombre_original)
-            else:
-                return self._generar_info_no_encontrada(nombre_original)
-                
-        except Exception as e:
-            return self._generar_info_error(nombre_original, str(e))
-    
-    def _busqueda_parcial_inteligente(self, nombre_cientifico: str) -> Optional[Dict[str, Any]]:
-        """Búsqueda parcial más inteligente"""
-        try:
-            # Extraer género y especie
-            partes = nombre_cientifico.replace('_', ' ').split()
+            self._verificar_cache_especies()
             
-            if len(partes) >= 2:
-                genero = partes[0]
-                especie = partes[1]
-                
-                print(f"🔍 Buscando género '{genero}' y especie '{especie}'")
-                
-                plantas_ref = self.db.collection(self.collections["plantas"])
-                
-                # Buscar documentos que contengan el género en el nombre científico
-                docs = plantas_ref.limit(50).stream()
+            documento_ids = [self._resolver_documento_id(nombre) for nombre in nombres_cientificos]
+            
+            faltantes = [documento_id for documento_id in dict.fromkeys(documento_ids)
+                         if documento_id and documento_id not in self._especies_cache]
+            if faltantes:
+                self._leer_documentos_lote(faltantes)
+            
+            resultados = []
+            for nombre, documento_id in zip(nombres_cientificos, documento_ids):
+                registro = self._especies_cache.get(documento_id) if documento_id else None
                 
-                for doc in docs:
-                    data = doc.to_dict()
-                    nombre_doc = data.get('nombre_cientifico', '').lower()
-                    
-                    # Verificar si contiene género y especie
-                    if genero.lower() in nombre_doc and especie.lower() in nombre_doc:
-                        print(f"🎯 Coincidencia parcial encontrada: {data.get('nombre_cientifico')}")
-                        
-                        # Agregar al cache
-                        self._nombre_cache[nombre_cientifico] = data.get('nombre_cientifico')
-                        
-                        return self._procesar_datos_firestore(data, nombre_cientifico)
+                if registro is not None:
+                    resultados.append(self._procesar_datos_firestore(registro, nombre))
+                else:
+                    print(f"❌ No encontrado en Firestore: {nombre}")
+                    resultados.append(self._generar_info_no_encontrada(nombre))
             
-            return None
+            return resultados
             
         except Exception as e:
-            print(f"❌ Error en búsqueda parcial: {e}")
-            return None
+            print(f"❌ Error en búsqueda por lote: {e}")
+            return [self._generar_info_error(nombre, str(e)) for nombre in nombres_cientificos]
+    
+    def _leer_documentos_lote(self, documento_ids: List[str]):
+        """Lee varios documentos de plantas en una sola llamada y los agrega al cache"""
+        plantas_ref = self.db.collection(self.collections["plantas"])
+        referencias = [plantas_ref.document(documento_id) for documento_id in documento_ids]
+        
+        for doc in self.db.get_all(referencias):
+            if doc.exists:
+                self._especies_cache[doc.id] = self._registro_cache(doc.to_dict(), doc.id)
     
     def _procesar_datos_firestore(self, data: Dict[str, Any], nombre_original: str) -> Dict[str, Any]:
         """Procesa datos obtenidos de Firestore"""
@@ -394,8 +513,20 @@ class FirestoreManager:
         """Función original mantenida para compatibilidad"""
         return self.obtener_info_especie_basica(nombre_cientifico)
     
-    def guardar_analisis_usuario(self, datos_analisis: Dict[str, Any]) -> Dict[str, str]:
-        """Guarda un análisis de usuario en Firestore"""
+    def guardar_analisis_usuario(self, datos_analisis: Dict[str, Any], sincrono: bool = False) -> Dict[str, str]:
+        """
+        Guarda un análisis de usuario en Firestore
+        
+        Por defecto solo lo encola: el id del documento se genera localmente
+        y un hilo de fondo lo escribe en lote (ver EscritorLotes).
+        
+        Args:
+            datos_analisis: Datos del análisis
+            sincrono: Esperar la escritura (collection.add) como antes
+        
+        Returns:
+            dict: status "encolado"/"guardado" con el id, o "error"
+        """
         if not self.initialized:
             print("⚠️ Firestore no inicializado")
             return {"status": "error", "mensaje": "Firestore no inicializado"}
@@ -410,15 +541,65 @@ class FirestoreManager:
             }
             
             analisis_ref = self.db.collection(self.collections["analisis_usuarios"])
-            doc_ref = analisis_ref.add(analisis_completo)
             
-            print(f"✅ Análisis guardado en Firestore: {doc_ref[1].id}")
-            return {"status": "guardado", "id": doc_ref[1].id}
+            if sincrono:
+                doc_ref = analisis_ref.add(analisis_completo)
+                print(f"✅ Análisis guardado en Firestore: {doc_ref[1].id}")
+                return {"status": "guardado", "id": doc_ref[1].id}
+            
+            # document() sin argumentos genera el id sin ir a la red
+            documento_id = analisis_ref.document().id
+            self._obtener_escritor_analisis().encolar({"id": documento_id, "datos": analisis_completo})
+            
+            print(f"📨 Análisis encolado para Firestore: {documento_id}")
+            return {"status": "encolado", "id": documento_id}
             
         except Exception as e:
             print(f"❌ Error guardando análisis: {e}")
             return {"status": "error", "mensaje": str(e)}
     
+    def _obtener_escritor_analisis(self) -> EscritorLotes:
+        """Escritor en lotes de analisis_usuarios; al crearlo reenvía el journal pendiente"""
+        if self._escritor_analisis is None:
+            self._escritor_analisis = EscritorLotes(
+                self._escribir_lote_analisis,
+                PATHS["analysis_journal_file"],
+                max_lote=FIREBASE_CONFIG["analysis_batch_size"],
+                intervalo_s=FIREBASE_CONFIG["analysis_flush_interval_s"],
+                max_reintentos=FIREBASE_CONFIG["analysis_max_retries"],
+                backoff_base_s=FIREBASE_CONFIG["analysis_backoff_base_s"],
+                backoff_max_s=FIREBASE_CONFIG["analysis_backoff_max_s"]
+            )
+            atexit.register(self._escritor_analisis.detener)
+            self._escritor_analisis.recuperar_journal()
+        
+        return self._escritor_analisis
+    
+    def _escribir_lote_analisis(self, registros: List[Dict[str, Any]]):
+        """
+        Escribe análisis con un único batch de Firestore
+        
+        Cada registro lleva su id, así reenviar un lote (reintento o journal)
+        sobrescribe los mismos documentos en lugar de duplicarlos.
+        """
+        analisis_ref = self.db.collection(self.collections["analisis_usuarios"])
+        batch = self.db.batch()
+        
+        for registro in registros:
+            datos = dict(registro["datos"])
+            # Journals escritos antes de marcar las fechas las traen como texto
+            if isinstance(datos.get("timestamp"), str):
+                datos["timestamp"] = datetime.fromisoformat(datos["timestamp"])
+            batch.set(analisis_ref.document(registro["id"]), datos)
+        
+        batch.commit()
+        print(f"✅ {len(registros)} análisis guardados en Firestore")
+    
+    def detener_escritor_analisis(self, timeout: float = 5.0):
+        """Envía los análisis pendientes y guarda el resto en el journal"""
+        if self._escritor_analisis is not None:
+            self._escritor_analisis.detener(timeout=timeout)
+    
     def listar_todas_especies(self, limite: int = 100) -> List[Dict[str, Any]]:
         """Lista todas las especies disponibles en Firestore"""
         try:
@@ -462,6 +643,10 @@ def obtener_info_planta(nombre_especie):
     """Función de conveniencia para obtener info de planta"""
     return firestore_manager.obtener_info_especie_basica(nombre_especie)
 
+def obtener_info_plantas_lote(nombres_especies):
+    """Función de conveniencia para obtener info de varias plantas en una lectura"""
+    return firestore_manager.obtener_info_especies_lote(nombres_especies)
+
 def guardar_analisis(datos):
     """Función de conveniencia para guardar análisis"""
     return firestore_manager.guardar_analisis_usuario(datos)
@@ -3,13 +3,46 @@ import numpy as np
 from PIL import Image
 import os
 import json
+import hashlib
 from pathlib import Path
 from datetime import datetime
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Agregar el directorio padre al path para importar config
 sys.path.append(str(Path(__file__).parent.parent))
 from config import MODEL_CONFIG, PLANTAS_DIR, PATHS
+from utils.augmentation import AumentadorLotes
+
+# Buffers reutilizables por hilo (sesiones concurrentes de Streamlit no comparten memoria)
+_buffers_locales = threading.local()
+
+def obtener_buffer_lote(num_imagenes, input_shape=None):
+    """
+    Retorna un buffer float32 (num_imagenes, H, W, 3) reutilizable del pool del hilo
+    
+    El buffer se reutiliza en la siguiente llamada desde el mismo hilo:
+    consumir (o copiar) el resultado antes de procesar otro lote.
+    """
+    if input_shape is None:
+        input_shape = MODEL_CONFIG["input_shape"]
+    
+    buffer = getattr(_buffers_locales, "lote", None)
+    if buffer is None or buffer.shape[1:] != tuple(input_shape) or len(buffer) < num_imagenes:
+        buffer = np.empty((num_imagenes,) + tuple(input_shape), dtype=np.float32)
+        _buffers_locales.lote = buffer
+    
+    return buffer[:num_imagenes]
+
+def _obtener_buffer_redimension(num_valores):
+    """Buffer uint8 plano del hilo para que cv2.resize escriba sin asignar memoria"""
+    buffer = getattr(_buffers_locales, "redimension", None)
+    if buffer is None or buffer.size < num_valores:
+        buffer = np.empty(num_valores, dtype=np.uint8)
+        _buffers_locales.redimension = buffer
+    return buffer
 
 class ImageProcessor:
     """Clase para manejar todo el procesamiento de imágenes"""
@@ -28,61 +61,132 @@ class ImageProcessor:
         Returns:
             numpy array procesado o None si hay error
         """
+        destino = np.empty(self.input_shape, dtype=np.float32)
+        
+        if self.procesar_en_buffer(ruta_imagen, destino):
+            return destino
+        
+        return None
+    
+    def procesar_para_prediccion(self, imagen):
+        """
+        Procesa una imagen para hacer predicción (agrega dimensión batch)
+        
+        Args:
+            imagen: Imagen en cualquier formato soportado
+        
+        Returns:
+            numpy array con shape (1, 224, 224, 3)
+        """
+        destino = np.empty((1,) + tuple(self.input_shape), dtype=np.float32)
+        
+        if self.procesar_en_buffer(imagen, destino[0]):
+            return destino
+        
+        return None
+    
+    def procesar_lote(self, imagenes, buffer=None):
+        """
+        Procesa varias imágenes escribiendo directamente en un buffer (N, 224, 224, 3)
+        
+        Args:
+            imagenes: Lista de imágenes en cualquier formato soportado
+            buffer: Buffer float32 del llamador (si es None se usa el pool del hilo)
+        
+        Returns:
+            tuple: (vista del buffer con las imágenes válidas, índices de las imágenes válidas)
+        """
+        if buffer is None:
+            buffer = obtener_buffer_lote(len(imagenes), self.input_shape)
+        
+        indices_validos = []
+        for indice, imagen in enumerate(imagenes):
+            # Las imágenes válidas se compactan al inicio del buffer
+            if self.procesar_en_buffer(imagen, buffer[len(indices_validos)]):
+                indices_validos.append(indice)
+        
+        return buffer[:len(indices_validos)], indices_validos
+    
+    def procesar_en_buffer(self, ruta_imagen, destino):
+        """
+        Carga, redimensiona y normaliza una imagen dentro de un array float32 existente
+        
+        Args:
+            ruta_imagen: Ruta a la imagen, PIL Image, o numpy array
+            destino: Vista float32 (224, 224, 3) donde escribir el resultado
+        
+        Returns:
+            bool: True si se procesó correctamente
+        """
         try:
-            # Determinar el tipo de entrada y cargar
-            if isinstance(ruta_imagen, (str, Path)):
-                # Es una ruta de archivo
-                imagen = cv2.imread(str(ruta_imagen))
-                if imagen is None:
-                    print(f"❌ Error: No se pudo cargar la imagen {ruta_imagen}")
-                    return None
-                imagen = cv2.cvtColor(imagen, cv2.COLOR_BGR2RGB)
-                
-            elif isinstance(ruta_imagen, Image.Image):
-                # Es una imagen PIL (desde Streamlit)
-                imagen = np.array(ruta_imagen.convert('RGB'))
-                
-            elif isinstance(ruta_imagen, np.ndarray):
-                # Ya es un numpy array
-                imagen = ruta_imagen.copy()
-                
-            else:
-                print(f"❌ Tipo de imagen no soportado: {type(ruta_imagen)}")
-                return None
+            imagen = self._cargar_rgb(ruta_imagen)
+            if imagen is None:
+                return False
             
-            # Redimensionar manteniendo aspecto
-            imagen_redim = self._redimensionar_con_aspecto(imagen)
+            # Redimensionar manteniendo aspecto directamente en el destino
+            region = self._redimensionar_con_aspecto(imagen, destino)
             
-            # Normalizar valores (0-1)
-            imagen_norm = imagen_redim.astype(np.float32) / 255.0
+            # Normalizar valores (0-1) en el lugar, el padding ya es 0
+            np.divide(region, 255.0, out=region)
             
-            return imagen_norm
+            return True
             
         except Exception as e:
             print(f"❌ Error procesando imagen: {e}")
-            return None
+            return False
     
-    def procesar_para_prediccion(self, imagen):
+    def cargar_imagen_uint8(self, ruta_imagen):
         """
-        Procesa una imagen para hacer predicción (agrega dimensión batch)
-        
-        Args:
-            imagen: Imagen en cualquier formato soportado
+        Carga y redimensiona una imagen sin normalizar (uint8, 224x224x3)
         
         Returns:
-            numpy array con shape (1, 224, 224, 3)
+            numpy array uint8 o None si hay error
         """
-        img_procesada = self.cargar_y_procesar_imagen(imagen)
+        try:
+            imagen = self._cargar_rgb(ruta_imagen)
+            if imagen is None:
+                return None
+            
+            if imagen.dtype != np.uint8:
+                imagen = (imagen * 255).astype(np.uint8)
+            
+            return self._redimensionar_con_aspecto(imagen)
+            
+        except Exception as e:
+            print(f"❌ Error procesando imagen: {e}")
+            return None
+    
+    def _cargar_rgb(self, ruta_imagen):
+        """Convierte la entrada a un array RGB sin copias innecesarias"""
+        # Determinar el tipo de entrada y cargar
+        if isinstance(ruta_imagen, (str, Path)):
+            # Es una ruta de archivo
+            imagen = cv2.imread(str(ruta_imagen))
+            if imagen is None:
+                print(f"❌ Error: No se pudo cargar la imagen {ruta_imagen}")
+                return None
+            return cv2.cvtColor(imagen, cv2.COLOR_BGR2RGB, dst=imagen)
+        
+        elif isinstance(ruta_imagen, Image.Image):
+            # Es una imagen PIL (desde Streamlit)
+            if ruta_imagen.mode != 'RGB':
+                ruta_imagen = ruta_imagen.convert('RGB')
+            return np.asarray(ruta_imagen)
         
-        if img_procesada is not None:
-            # Agregar dimensión batch
-            return np.expand_dims(img_procesada, axis=0)
+        elif isinstance(ruta_imagen, np.ndarray):
+            # Ya es un numpy array (cv2.resize no lo modifica)
+            return ruta_imagen
         
+        print(f"❌ Tipo de imagen no soportado: {type(ruta_imagen)}")
         return None
     
-    def _redimensionar_con_aspecto(self, imagen):
+    def _redimensionar_con_aspecto(self, imagen, destino=None):
         """
         Redimensiona manteniendo la relación de aspecto y rellenando con padding
+        
+        Si se pasa destino, escribe ahí (rellenando solo el padding con ceros)
+        y retorna la vista de la región de la imagen. Sin destino, retorna
+        una imagen nueva del mismo dtype que la entrada.
         """
         h, w = imagen.shape[:2]
         target_h, target_w = self.target_size
@@ -94,19 +198,34 @@ class ImageProcessor:
         nuevo_w = int(w * escala)
         nuevo_h = int(h * escala)
         
-        # Redimensionar
-        imagen_redim = cv2.resize(imagen, (nuevo_w, nuevo_h))
-        
-        # Crear imagen final con padding negro
-        imagen_final = np.zeros((target_h, target_w, 3), dtype=imagen.dtype)
-        
         # Centrar la imagen redimensionada
         y_offset = (target_h - nuevo_h) // 2
         x_offset = (target_w - nuevo_w) // 2
         
-        imagen_final[y_offset:y_offset+nuevo_h, x_offset:x_offset+nuevo_w] = imagen_redim
-        
-        return imagen_final
+        if destino is None:
+            # Crear imagen final con padding negro
+            imagen_final = np.zeros((target_h, target_w, 3), dtype=imagen.dtype)
+            imagen_final[y_offset:y_offset+nuevo_h, x_offset:x_offset+nuevo_w] = cv2.resize(imagen, (nuevo_w, nuevo_h))
+            return imagen_final
+        
+        # Redimensionar (uint8 en un buffer reutilizable, sin asignar memoria)
+        if imagen.dtype == np.uint8 and imagen.ndim == 3 and imagen.shape[2] == 3:
+            plano = _obtener_buffer_redimension(nuevo_h * nuevo_w * 3)
+            scratch = plano[:nuevo_h * nuevo_w * 3].reshape(nuevo_h, nuevo_w, 3)
+            imagen_redim = cv2.resize(imagen, (nuevo_w, nuevo_h), dst=scratch)
+        else:
+            imagen_redim = cv2.resize(imagen, (nuevo_w, nuevo_h))
+        
+        # Padding negro solo en los bordes
+        destino[:y_offset] = 0
+        destino[y_offset+nuevo_h:] = 0
+        destino[y_offset:y_offset+nuevo_h, :x_offset] = 0
+        destino[y_offset:y_offset+nuevo_h, x_offset+nuevo_w:] = 0
+        
+        region = destino[y_offset:y_offset+nuevo_h, x_offset:x_offset+nuevo_w]
+        region[...] = imagen_redim
+        
+        return region
 
 class DatasetManager:
     """Clase para manejar el dataset de plantas"""
@@ -114,23 +233,22 @@ class DatasetManager:
     def __init__(self):
         self.plantas_dir = PLANTAS_DIR
         self.processor = ImageProcessor()
+        self.aumentador = AumentadorLotes(
+            MODEL_CONFIG["augmentation_seed"],
+            num_workers=MODEL_CONFIG["dataset_workers"]
+        )
     
-    def cargar_dataset_completo(self, incluir_augmentation=False):
+    def listar_imagenes_dataset(self, verbose=True):
         """
-        Carga todo el dataset desde las carpetas
-        
-        Args:
-            incluir_augmentation: Si aplicar data augmentation
+        Lista todas las imágenes del dataset con su etiqueta
         
         Returns:
-            tuple: (imagenes, etiquetas, nombres_especies)
+            tuple: (rutas, etiquetas, nombres_especies)
         """
-        print("🔍 Cargando dataset completo...")
-        
         if not self.plantas_dir.exists():
             raise Exception(f"Directorio de plantas no encontrado: {self.plantas_dir}")
         
-        imagenes = []
+        rutas = []
         etiquetas = []
         nombres_especies = []
         
@@ -138,33 +256,259 @@ class DatasetManager:
         carpetas_especies = sorted([d for d in self.plantas_dir.iterdir() if d.is_dir()])
         
         for idx, carpeta_especie in enumerate(carpetas_especies):
-            nombre_especie = carpeta_especie.name
-            nombres_especies.append(nombre_especie)
+            nombres_especies.append(carpeta_especie.name)
             
             # Obtener imágenes de esta especie
             imagenes_especie = self._obtener_imagenes_carpeta(carpeta_especie)
             
-            print(f"📁 {nombre_especie}: {len(imagenes_especie)} imágenes")
+            if verbose:
+                print(f"📁 {carpeta_especie.name}: {len(imagenes_especie)} imágenes")
             
-            for ruta_imagen in imagenes_especie:
-                img_procesada = self.processor.cargar_y_procesar_imagen(ruta_imagen)
-                
-                if img_procesada is not None:
-                    imagenes.append(img_procesada)
-                    etiquetas.append(idx)
-                    
-                    # Aplicar data augmentation si se solicita
-                    if incluir_augmentation:
-                        img_aug = self._aplicar_augmentation(img_procesada)
-                        imagenes.append(img_aug)
-                        etiquetas.append(idx)
+            rutas.extend(imagenes_especie)
+            etiquetas.extend([idx] * len(imagenes_especie))
+        
+        return rutas, etiquetas, nombres_especies
+    
+    def cargar_imagenes_uint8(self, rutas, destino=None, usar_cache=True, num_workers=None):
+        """
+        Decodifica imágenes en paralelo dentro de un array uint8 preasignado
+        
+        Args:
+            rutas: Lista de rutas de imágenes
+            destino: Array uint8 (N, 224, 224, 3) donde escribir (se crea si es None)
+            usar_cache: Si leer/escribir el cache en disco de imágenes decodificadas
+            num_workers: Hilos de decodificación (usa config si es None)
+        
+        Returns:
+            tuple: (array uint8, máscara booleana de imágenes cargadas correctamente)
+        """
+        if destino is None:
+            destino = np.empty((len(rutas),) + tuple(MODEL_CONFIG["input_shape"]), dtype=np.uint8)
+        if num_workers is None:
+            num_workers = MODEL_CONFIG["dataset_workers"]
+        
+        validas = np.zeros(len(rutas), dtype=bool)
+        
+        def cargar(indice):
+            imagen = self._cargar_con_cache(rutas[indice], usar_cache)
+            if imagen is not None:
+                destino[indice] = imagen
+                validas[indice] = True
+        
+        # cv2 libera el GIL al decodificar y redimensionar
+        with ThreadPoolExecutor(max_workers=max(1, num_workers)) as executor:
+            list(executor.map(cargar, range(len(rutas))))
+        
+        return destino, validas
+    
+    def _clave_cache(self, ruta):
+        """Clave del cache: ruta + mtime + tamaño + tamaño objetivo"""
+        stat = os.stat(ruta)
+        clave = f"{Path(ruta).resolve()}|{stat.st_mtime_ns}|{stat.st_size}|{self.processor.target_size}"
+        return hashlib.sha1(clave.encode('utf-8')).hexdigest()
+    
+    def _cargar_con_cache(self, ruta, usar_cache=True):
+        """Carga una imagen uint8 desde el cache en disco o la decodifica y la guarda"""
+        if not usar_cache:
+            return self.processor.cargar_imagen_uint8(ruta)
+        
+        cache_dir = PATHS["dataset_cache_dir"]
+        archivo_cache = cache_dir / f"{self._clave_cache(ruta)}.npy"
+        
+        if archivo_cache.exists():
+            try:
+                return np.load(archivo_cache)
+            except Exception:
+                pass  # Cache corrupto: volver a decodificar
+        
+        imagen = self.processor.cargar_imagen_uint8(ruta)
+        
+        if imagen is not None:
+            try:
+                cache_dir.mkdir(parents=True, exist_ok=True)
+                temporal = archivo_cache.with_suffix(f".{threading.get_ident()}.tmp")
+                with open(temporal, 'wb') as f:
+                    np.save(f, imagen)
+                os.replace(temporal, archivo_cache)
+            except Exception as e:
+                print(f"⚠️ No se pudo escribir cache de {ruta}: {e}")
+        
+        return imagen
+    
+    def limpiar_cache(self, rutas=None):
+        """
+        Borra del cache las imágenes decodificadas de archivos que ya no existen
+        o cambiaron (la clave incluye mtime y tamaño, así que quedan huérfanas)
+        
+        Args:
+            rutas: Dataset completo; si es None se lista data/plantas. Nunca
+                   pasar un subconjunto: se borraría el cache del resto
+        
+        Returns:
+            int: Archivos eliminados
+        """
+        cache_dir = PATHS["dataset_cache_dir"]
+        if not cache_dir.exists():
+            return 0
+        
+        if rutas is None:
+            rutas, _, _ = self.listar_imagenes_dataset(verbose=False)
+        
+        vigentes = set()
+        for ruta in rutas:
+            try:
+                vigentes.add(self._clave_cache(ruta))
+            except FileNotFoundError:
+                continue
+        
+        # Temporales de más de una hora: escrituras interrumpidas
+        limite_tmp = time.time() - 3600
+        eliminados = 0
+        for archivo in cache_dir.iterdir():
+            try:
+                if ((archivo.suffix == ".npy" and archivo.stem not in vigentes) or
+                        (archivo.suffix == ".tmp" and archivo.stat().st_mtime < limite_tmp)):
+                    archivo.unlink()
+                    eliminados += 1
+            except FileNotFoundError:
+                continue
+        
+        if eliminados:
+            print(f"🧹 Cache de imágenes: {eliminados} archivos huérfanos eliminados")
+        return eliminados
+    
+    def cargar_dataset_completo(self, incluir_augmentation=False, usar_cache=True):
+        """
+        Carga todo el dataset desde las carpetas
+        
+        Args:
+            incluir_augmentation: Si aplicar data augmentation
+            usar_cache: Si usar el cache en disco de imágenes decodificadas
+        
+        Returns:
+            tuple: (imagenes, etiquetas, nombres_especies)
+        """
+        print("🔍 Cargando dataset completo...")
+        
+        rutas, etiquetas, nombres_especies = self.listar_imagenes_dataset()
+        imagenes, etiquetas, _ = self.cargar_imagenes_float(rutas, etiquetas, incluir_augmentation, usar_cache)
+        if usar_cache:
+            self.limpiar_cache(rutas)
         
         print(f"✅ Dataset cargado: {len(imagenes)} imágenes de {len(nombres_especies)} especies")
         
         # Guardar lista de especies para uso posterior
         self._guardar_lista_especies(nombres_especies)
         
-        return np.array(imagenes), np.array(etiquetas), nombres_especies
+        return imagenes, etiquetas, nombres_especies
+    
+    def cargar_imagenes_float(self, rutas, etiquetas, incluir_augmentation=False, usar_cache=True):
+        """
+        Carga una lista de imágenes normalizadas (0-1) en un array float32
+        
+        Args:
+            rutas, etiquetas: Imágenes a cargar y sus etiquetas
+            incluir_augmentation: Si agregar una copia aumentada de cada imagen
+            usar_cache: Si usar el cache en disco de imágenes decodificadas
+        
+        Returns:
+            tuple: (imagenes, etiquetas, validas) sin las imágenes que no se
+                   pudieron leer; validas marca cuáles de rutas se cargaron
+        """
+        # Decodificar en paralelo (solo las imágenes nuevas o modificadas)
+        imagenes_uint8, validas = self.cargar_imagenes_uint8(rutas, usar_cache=usar_cache)
+        
+        if not validas.all():
+            imagenes_uint8 = imagenes_uint8[validas]
+        etiquetas = np.asarray(etiquetas, dtype=np.int64)[validas]
+        
+        # Array final de tamaño conocido: [original, aumentada] por imagen si aplica
+        factor = 2 if incluir_augmentation else 1
+        imagenes = np.empty((len(imagenes_uint8) * factor,) + imagenes_uint8.shape[1:], dtype=np.float32)
+        originales = imagenes[::factor]
+        
+        # Normalizar valores (0-1)
+        np.divide(imagenes_uint8, np.float32(255.0), out=originales, dtype=np.float32)
+        del imagenes_uint8
+        
+        if incluir_augmentation:
+            self.aumentador.aumentar_lote(originales, out=imagenes[1::2])
+            etiquetas = np.repeat(etiquetas, 2)
+        
+        return imagenes, etiquetas, validas
+    
+    def obtener_dataset_mmap(self, reconstruir=False, usar_cache=True):
+        """
+        Dataset uint8 en disco (memory-mapped) con su índice de etiquetas y rutas
+        
+        Se reconstruye solo si cambió alguna imagen (ruta, mtime o tamaño).
+        
+        Args:
+            reconstruir: Forzar la reconstrucción del archivo
+            usar_cache: Si usar el cache de imágenes decodificadas al reconstruir
+        
+        Returns:
+            tuple: (imagenes memmap uint8 (N, 224, 224, 3), etiquetas, rutas, nombres_especies)
+        """
+        mmap_dir = PATHS["dataset_mmap_dir"]
+        archivo_imagenes = mmap_dir / "imagenes.npy"
+        archivo_indice = mmap_dir / "indice.json"
+        
+        rutas, etiquetas, nombres_especies = self.listar_imagenes_dataset(verbose=False)
+        firma = [[str(ruta), os.stat(ruta).st_mtime_ns, os.stat(ruta).st_size] for ruta in rutas]
+        
+        if not reconstruir and archivo_imagenes.exists() and archivo_indice.exists():
+            try:
+                with open(archivo_indice, 'r', encoding='utf-8') as f:
+                    indice = json.load(f)
+                
+                if indice.get("firma") == firma and indice.get("nombres_especies") == nombres_especies:
+                    imagenes = np.load(archivo_imagenes, mmap_mode='r')[:len(indice["etiquetas"])]
+                    print(f"💾 Dataset memory-mapped reutilizado: {len(imagenes)} imágenes")
+                    return (imagenes, np.asarray(indice["etiquetas"], dtype=np.int64),
+                            indice["rutas"], nombres_especies)
+            except Exception as e:
+                print(f"⚠️ Índice del dataset inválido, reconstruyendo: {e}")
+        
+        print(f"🔨 Construyendo dataset memory-mapped con {len(rutas)} imágenes...")
+        mmap_dir.mkdir(parents=True, exist_ok=True)
+        
+        imagenes = np.lib.format.open_memmap(
+            archivo_imagenes, mode='w+', dtype=np.uint8,
+            shape=(len(rutas),) + tuple(MODEL_CONFIG["input_shape"])
+        )
+        _, validas = self.cargar_imagenes_uint8(rutas, destino=imagenes, usar_cache=usar_cache)
+        if usar_cache:
+            self.limpiar_cache(rutas)
+        
+        # Compactar en el lugar: las imágenes que fallaron quedan fuera del índice
+        indices_validos = np.flatnonzero(validas)
+        for fila, indice_original in enumerate(indices_validos):
+            if fila != indice_original:
+                imagenes[fila] = imagenes[indice_original]
+        imagenes.flush()
+        
+        etiquetas = np.asarray(etiquetas, dtype=np.int64)[indices_validos]
+        rutas_validas = [str(rutas[i]) for i in indices_validos]
+        
+        indice = {
+            "timestamp": datetime.now().isoformat(),
+            "shape": list(imagenes.shape),
+            "etiquetas": etiquetas.tolist(),
+            "rutas": rutas_validas,
+            "nombres_especies": nombres_especies,
+            "firma": firma
+        }
+        with open(archivo_indice, 'w', encoding='utf-8') as f:
+            json.dump(indice, f, ensure_ascii=False)
+        
+        del imagenes
+        imagenes = np.load(archivo_imagenes, mmap_mode='r')[:len(etiquetas)]
+        
+        self._guardar_lista_especies(nombres_especies)
+        
+        print(f"✅ Dataset memory-mapped listo: {len(rutas_validas)} imágenes de {len(nombres_especies)} especies")
+        return imagenes, etiquetas, rutas_validas, nombres_especies
     
     def _obtener_imagenes_carpeta(self, carpeta):
         """Obtiene todas las imágenes de una carpeta"""
@@ -176,32 +520,8 @@ class DatasetManager:
         return sorted(imagenes)
     
     def _aplicar_augmentation(self, imagen):
-        """Aplica transformaciones de data augmentation"""
-        img_aug = imagen.copy()
-        
-        # Rotación aleatoria (-15 a +15 grados)
-        if np.random.random() > 0.5:
-            angulo = np.random.uniform(-15, 15)
-            h, w = img_aug.shape[:2]
-            centro = (w//2, h//2)
-            matriz_rot = cv2.getRotationMatrix2D(centro, angulo, 1.0)
-            img_aug = cv2.warpAffine(img_aug, matriz_rot, (w, h))
-        
-        # Flip horizontal
-        if np.random.random() > 0.5:
-            img_aug = cv2.flip(img_aug, 1)
-        
-        # Ajuste de brillo
-        if np.random.random() > 0.5:
-            factor = np.random.uniform(0.8, 1.2)
-            img_aug = np.clip(img_aug * factor, 0, 1)
-        
-        # Ruido gaussiano leve
-        if np.random.random() > 0.7:
-            ruido = np.random.normal(0, 0.02, img_aug.shape)
-            img_aug = np.clip(img_aug + ruido, 0, 1)
-        
-        return img_aug
+        """Aplica transformaciones de data augmentation a una sola imagen"""
+        return self.aumentador.aumentar_imagen(imagen)
     
     def _guardar_lista_especies(self, nombres_especies):
         """Guarda la lista de especies en un archivo JSON"""
@@ -241,7 +561,8 @@ class DatasetManager:
     
     def contar_imagenes_nuevas(self):
         """
-        Cuenta imágenes nuevas (que contienen 'user_' en el nombre)
+        Cuenta imágenes nuevas (que contienen 'user_' en el nombre) que aún
+        no figuran en el manifiesto de entrenamiento
         
         Returns:
             tuple: (total_nuevas, especies_con_nuevas, detalle_por_especie)
@@ -249,11 +570,12 @@ class DatasetManager:
         total_nuevas = 0
         especies_con_nuevas = set()
         detalle = {}
+        manifiesto = self.cargar_manifiesto_entrenamiento()
         
         for carpeta in self.plantas_dir.iterdir():
             if carpeta.is_dir():
                 imagenes_nuevas = [img for img in self._obtener_imagenes_carpeta(carpeta)
-                                 if 'user_' in img.name]
+                                 if 'user_' in img.name and self.es_imagen_nueva(img, manifiesto)]
                 
                 if len(imagenes_nuevas) > 0:
                     total_nuevas += len(imagenes_nuevas)
@@ -262,6 +584,123 @@ class DatasetManager:
         
         return total_nuevas, len(especies_con_nuevas), detalle
     
+    def _clave_manifiesto(self, ruta):
+        """Ruta relativa a data/plantas usada como clave del manifiesto"""
+        return Path(ruta).relative_to(self.plantas_dir).as_posix()
+    
+    def cargar_manifiesto_entrenamiento(self):
+        """
+        Carga el manifiesto con los archivos usados en el último entrenamiento
+        
+        Returns:
+            dict: Manifiesto ({} si no existe)
+        """
+        manifiesto_file = PATHS["training_manifest_file"]
+        
+        try:
+            if manifiesto_file.exists():
+                with open(manifiesto_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            print(f"⚠️ Error leyendo manifiesto de entrenamiento: {e}")
+        
+        return {}
+    
+    def capturar_estado_archivos(self, rutas, etiquetas):
+        """
+        Estado (mtime, tamaño, etiqueta) de los archivos en el momento de cargarlos
+        
+        Se toma antes de entrenar para que el manifiesto registre exactamente
+        lo que vio el modelo: lo agregado, editado o borrado durante el
+        entrenamiento se detecta como nuevo en el siguiente.
+        
+        Returns:
+            dict: clave de manifiesto -> {mtime_ns, size, etiqueta} (sin los archivos que ya no existen)
+        """
+        archivos = {}
+        for ruta, etiqueta in zip(rutas, etiquetas):
+            try:
+                stat = Path(ruta).stat()
+            except FileNotFoundError:
+                continue
+            archivos[self._clave_manifiesto(ruta)] = {
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "etiqueta": int(etiqueta)
+            }
+        return archivos
+    
+    def descartar_archivos(self, archivos, rutas, validas):
+        """
+        Quita del estado capturado los archivos que no se pudieron decodificar
+        
+        Así no quedan registrados como entrenados y el próximo entrenamiento
+        incremental los vuelve a intentar.
+        
+        Args:
+            archivos: Estado de capturar_estado_archivos (se modifica)
+            rutas, validas: Rutas intentadas y si cada una se cargó
+        """
+        for ruta, valida in zip(rutas, validas):
+            if not valida:
+                archivos.pop(self._clave_manifiesto(ruta), None)
+    
+    def guardar_manifiesto_entrenamiento(self, archivos, nombres_especies, modo, validacion=()):
+        """
+        Registra qué archivos conoce el modelo actual
+        
+        Args:
+            archivos: Estado capturado al cargar los datos (capturar_estado_archivos)
+            nombres_especies: Lista de especies del modelo
+            modo: "completo" o "incremental"
+            validacion: Rutas de validación (el modelo no entrenó con ellas)
+        """
+        manifiesto = {
+            "timestamp": datetime.now().isoformat(),
+            "modo": modo,
+            "nombres_especies": list(nombres_especies),
+            "archivos": archivos,
+            "validacion": sorted({self._clave_manifiesto(ruta) for ruta in validacion})
+        }
+        
+        manifiesto_file = PATHS["training_manifest_file"]
+        tmp_file = manifiesto_file.with_suffix(".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(manifiesto, f, ensure_ascii=False)
+        os.replace(tmp_file, manifiesto_file)
+        
+        print(f"✅ Manifiesto de entrenamiento guardado: {len(archivos)} archivos")
+    
+    def es_imagen_nueva(self, ruta, manifiesto):
+        """
+        Indica si una imagen no fue vista por el modelo actual
+        
+        Sin manifiesto (modelos anteriores a este registro) se consideran
+        nuevas solo las imágenes 'user_'.
+        """
+        if not manifiesto:
+            return 'user_' in Path(ruta).name
+        
+        registro = manifiesto.get("archivos", {}).get(self._clave_manifiesto(ruta))
+        if registro is None:
+            return True
+        
+        try:
+            stat = Path(ruta).stat()
+        except FileNotFoundError:
+            return False  # Borrada después de listarla: no hay nada que entrenar
+        return registro["mtime_ns"] != stat.st_mtime_ns or registro["size"] != stat.st_size
+    
+    def marcar_validacion(self, rutas, manifiesto):
+        """
+        Indica qué imágenes quedaron en la validación del modelo actual
+        
+        Returns:
+            numpy array bool, uno por ruta
+        """
+        validacion = set(manifiesto.get("validacion", ()))
+        return np.array([self._clave_manifiesto(ruta) in validacion for ruta in rutas], dtype=bool)
+    
     def guardar_imagen_validada(self, imagen, nombre_especie, session_id, correcto=True):
         """
         Guarda una imagen validada por el usuario
@@ -379,6 +818,30 @@ def procesar_imagen_simple(imagen):
     processor = ImageProcessor()
     return processor.procesar_para_prediccion(imagen)
 
+def calcular_hash_imagen(imagen):
+    """
+    Calcula un hash del contenido de una imagen (PIL, numpy array o ruta)
+    
+    Returns:
+        str: Hash hexadecimal o None si el tipo no es soportado
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    
+    if isinstance(imagen, (str, Path)):
+        with open(imagen, 'rb') as f:
+            for bloque in iter(lambda: f.read(1 << 20), b''):
+                hasher.update(bloque)
+    elif isinstance(imagen, Image.Image):
+        hasher.update(f"{imagen.mode}{imagen.size}".encode())
+        hasher.update(imagen.tobytes())
+    elif isinstance(imagen, np.ndarray):
+        hasher.update(f"{imagen.dtype}{imagen.shape}".encode())
+        hasher.update(np.ascontiguousarray(imagen).data)
+    else:
+        return None
+    
+    return hasher.hexdigest()
+
 def obtener_estadisticas_dataset():
     """Función simple para obtener estadísticas del dataset"""
     dataset_manager = DatasetManager()
@@ -403,6 +866,11 @@ def obtener_estadisticas_dataset():
     }
 
 if __name__ == "__main__":
+    # python utils/image_processing.py --limpiar-cache: solo limpia el cache de imágenes decodificadas
+    if "--limpiar-cache" in sys.argv:
+        DatasetManager().limpiar_cache()
+        sys.exit(0)
+    
     # Si ejecutas este archivo directamente, muestra estadísticas
     print("🔍 ANÁLISIS DEL DATASET")
     print("=" * 50)
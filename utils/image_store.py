@@ -0,0 +1,143 @@
+# utils/image_store.py - IMÁGENES ORIGINALES DE SESIONES ACTIVAS EN DISCO
+
+import io
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Modos que PNG escribe sin conversión; el resto (CMYK, YCbCr, ...) se guarda como RGB
+MODOS_PNG = {"1", "L", "LA", "I", "I;16", "P", "RGB", "RGBA"}
+
+class AlmacenImagenes:
+    """
+    Guarda en disco la imagen original de cada sesión activa
+    
+    Las sesiones en memoria solo conservan hash, probabilidades y una
+    miniatura; el original se relee de aquí al guardar el feedback. Las
+    imágenes PIL se guardan como PNG (sin pérdida; los modos que PNG no
+    admite, como CMYK, se convierten a RGB) y los arrays con np.save para
+    conservar dtype y rango exactos.
+    """
+    
+    def __init__(self, directorio):
+        """
+        Args:
+            directorio: Carpeta donde se guardan los originales
+        """
+        self.directorio = Path(directorio)
+        self.directorio.mkdir(parents=True, exist_ok=True)
+    
+    def _rutas(self, clave):
+        return self.directorio / f"{clave}.png", self.directorio / f"{clave}.npy"
+    
+    def guardar(self, clave, imagen):
+        """
+        Escribe la imagen bajo una clave (normalmente el session_id)
+        
+        Returns:
+            bool: True si se guardó
+        """
+        ruta_png, ruta_npy = self._rutas(clave)
+        try:
+            if isinstance(imagen, Image.Image):
+                if imagen.mode not in MODOS_PNG:
+                    imagen = imagen.convert("RGB")
+                ruta, tmp_file = ruta_png, ruta_png.with_suffix(".png.tmp")
+                with open(tmp_file, 'wb') as f:
+                    imagen.save(f, format='PNG', compress_level=1)  # Prioriza velocidad
+            elif isinstance(imagen, np.ndarray):
+                ruta, tmp_file = ruta_npy, ruta_npy.with_suffix(".npy.tmp")
+                with open(tmp_file, 'wb') as f:
+                    np.save(f, imagen, allow_pickle=False)
+            else:
+                return False
+            
+            os.replace(tmp_file, ruta)
+            return True
+        except Exception as e:
+            print(f"⚠️ Error guardando imagen de sesión {clave}: {e}")
+            return False
+    
+    def cargar(self, clave):
+        """
+        Relee la imagen guardada
+        
+        Returns:
+            PIL Image, numpy array o None si no existe
+        """
+        ruta_png, ruta_npy = self._rutas(clave)
+        try:
+            if ruta_png.exists():
+                with Image.open(ruta_png) as imagen:
+                    imagen.load()
+                    return imagen
+            if ruta_npy.exists():
+                return np.load(ruta_npy, allow_pickle=False)
+        except Exception as e:
+            print(f"⚠️ Error leyendo imagen de sesión {clave}: {e}")
+        return None
+    
+    def eliminar(self, clave):
+        for ruta in self._rutas(clave):
+            ruta.unlink(missing_ok=True)
+    
+    def limpiar(self, max_edad_s):
+        """
+        Elimina originales más viejos que max_edad_s (sesiones de ejecuciones anteriores)
+        
+        Returns:
+            int: Archivos eliminados
+        """
+        limite = time.time() - max_edad_s
+        eliminados = 0
+        for ruta in self.directorio.iterdir():
+            try:
+                if ruta.is_file() and ruta.stat().st_mtime < limite:
+                    ruta.unlink()
+                    eliminados += 1
+            except FileNotFoundError:
+                continue
+        return eliminados
+
+def crear_miniatura_jpeg(imagen, lado=256, calidad=75):
+    """
+    Miniatura JPEG de una imagen (PIL o array HxWxC en [0, 1] o [0, 255])
+    
+    Returns:
+        bytes o None si el formato no es soportado
+    """
+    try:
+        if isinstance(imagen, np.ndarray):
+            if imagen.dtype != np.uint8:
+                escala = 255.0 if imagen.max(initial=0) <= 1.0 else 1.0
+                imagen = np.clip(imagen * escala, 0, 255).astype(np.uint8)
+            imagen = Image.fromarray(imagen)
+        elif not isinstance(imagen, Image.Image):
+            return None
+        
+        miniatura = imagen.convert("RGB")
+        miniatura.thumbnail((lado, lado))
+        
+        buffer = io.BytesIO()
+        miniatura.save(buffer, format='JPEG', quality=calidad)
+        return buffer.getvalue()
+    except Exception as e:
+        print(f"⚠️ Error creando miniatura: {e}")
+        return None
+
+_almacen = None
+_almacen_lock = threading.Lock()
+
+def obtener_almacen_imagenes():
+    """Almacén compartido del proceso (carpeta PATHS["session_images_dir"])"""
+    global _almacen
+    if _almacen is None:
+        with _almacen_lock:
+            if _almacen is None:
+                from config import PATHS
+                _almacen = AlmacenImagenes(PATHS["session_images_dir"])
+    return _almacen
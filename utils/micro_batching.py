@@ -0,0 +1,279 @@
+# utils/micro_batching.py - AGRUPACIÓN DINÁMICA DE SOLICITUDES DE INFERENCIA
+
+import threading
+import queue
+import time
+from concurrent.futures import Future, TimeoutError
+
+import numpy as np
+
+class Histograma:
+    """Histograma acumulado con buckets fijos (formato compatible con Prometheus)"""
+    
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self.conteos = [0] * len(self.buckets)
+        self.total = 0
+        self.suma = 0.0
+        self._lock = threading.Lock()
+    
+    def observar(self, valor):
+        """Registra un valor en el histograma"""
+        with self._lock:
+            self.total += 1
+            self.suma += valor
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    self.conteos[i] += 1
+                    break
+    
+    def exportar(self):
+        """Retorna el histograma como diccionario con buckets acumulados"""
+        with self._lock:
+            acumulado = 0
+            buckets = {}
+            for limite, conteo in zip(self.buckets, self.conteos):
+                acumulado += conteo
+                buckets[str(limite)] = acumulado
+            buckets["+Inf"] = self.total
+            
+            return {
+                "buckets": buckets,
+                "count": self.total,
+                "sum": self.suma,
+                "mean": self.suma / self.total if self.total else 0.0
+            }
+
+class _Solicitud:
+    """Solicitud individual pendiente en la cola"""
+    
+    __slots__ = ("datos", "future", "timestamp")
+    
+    def __init__(self, datos):
+        self.datos = datos
+        self.future = Future()
+        self.timestamp = time.perf_counter()
+
+class MicroBatcher:
+    """
+    Agrupa solicitudes concurrentes en un único lote para el modelo
+    
+    Cada llamador envía su tensor (1, H, W, 3) y recibe sus propias
+    probabilidades. Un hilo de fondo espera como máximo max_latency_ms
+    desde la primera solicitud o hasta juntar max_batch_size imágenes.
+    Una solicitud que no entra en el lote actual pasa al siguiente; solo
+    una solicitud que por sí sola supera max_batch_size va en un lote mayor.
+    """
+    
+    def __init__(self, ejecutar_lote, max_batch_size=16, max_latency_ms=5.0):
+        """
+        Args:
+            ejecutar_lote: Función que recibe un array (N, H, W, 3) y retorna (N, clases)
+            max_batch_size: Máximo de imágenes por llamada al modelo
+            max_latency_ms: Tiempo máximo de espera para completar un lote
+        """
+        self.ejecutar_lote = ejecutar_lote
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_latency = max(0.0, max_latency_ms) / 1000.0
+        
+        self._cola = queue.Queue()
+        self._activo = True
+        self._lock = threading.Lock()  # Ninguna solicitud entra detrás del centinela
+        
+        # Métricas exportables
+        buckets_lote = [1, 2, 4, 8, 16, 32, 64, 128]
+        self.hist_tamano_lote = Histograma(buckets_lote)
+        self.hist_profundidad_cola = Histograma([0, 1, 2, 4, 8, 16, 32, 64, 128, 256])
+        self.hist_espera_ms = Histograma([0.5, 1, 2, 5, 10, 20, 50, 100, 250, 500])
+        self.lotes_ejecutados = 0
+        self.errores = 0
+        
+        self._hilo = threading.Thread(target=self._bucle, name="micro-batcher", daemon=True)
+        self._hilo.start()
+    
+    def enviar(self, imagen_array):
+        """
+        Encola una imagen procesada para inferencia
+        
+        Args:
+            imagen_array: Array (H, W, 3) o (n, H, W, 3)
+        
+        Returns:
+            Future: Se resuelve con las probabilidades (n, clases)
+        """
+        if imagen_array.ndim == 3:
+            imagen_array = imagen_array[np.newaxis]
+        
+        solicitud = _Solicitud(imagen_array)
+        with self._lock:
+            if not self._activo:
+                raise RuntimeError("MicroBatcher detenido")
+            self._cola.put(solicitud)
+        return solicitud.future
+    
+    def predecir(self, imagen_array, timeout=None):
+        """
+        Envía una imagen y espera su resultado (bloqueante)
+        
+        Args:
+            imagen_array: Array (H, W, 3) o (n, H, W, 3)
+            timeout: Segundos máximos de espera (None: sin límite)
+        
+        Raises:
+            TimeoutError: Si no hubo resultado a tiempo (la solicitud se cancela)
+        """
+        future = self.enviar(imagen_array)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            future.cancel()  # Si aún no entró en un lote, no se ejecuta
+            raise
+    
+    def profundidad_cola(self):
+        """Número de solicitudes esperando en la cola"""
+        return self._cola.qsize()
+    
+    def detener(self, timeout=1.0):
+        """
+        Detiene el hilo de fondo
+        
+        Lo encolado antes de detener se procesa; si el hilo no termina a
+        tiempo, las solicitudes que sigan en la cola fallan con RuntimeError.
+        """
+        with self._lock:
+            if not self._activo:
+                return
+            self._activo = False
+            self._cola.put(None)
+        self._hilo.join(timeout=timeout)
+        self._fallar_pendientes()
+    
+    def _fallar_pendientes(self):
+        """Resuelve con error las solicitudes que quedan en la cola"""
+        while True:
+            try:
+                solicitud = self._cola.get_nowait()
+            except queue.Empty:
+                return
+            if solicitud is not None and solicitud.future.set_running_or_notify_cancel():
+                solicitud.future.set_exception(RuntimeError("MicroBatcher detenido"))
+    
+    def _bucle(self):
+        """Bucle principal: arma lotes y ejecuta el modelo"""
+        siguiente = None  # Solicitud que no entró en el lote anterior
+        fin = False
+        
+        while not fin or siguiente is not None:
+            if siguiente is not None:
+                primera, siguiente = siguiente, None
+            else:
+                primera = self._cola.get()
+                if primera is None:
+                    break
+            
+            lote = [primera]
+            imagenes = len(primera.datos)
+            limite = primera.timestamp + self.max_latency
+            
+            while not fin and imagenes < self.max_batch_size:
+                restante = limite - time.perf_counter()
+                try:
+                    solicitud = self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                
+                if solicitud is None:
+                    fin = True
+                    break
+                
+                if imagenes + len(solicitud.datos) > self.max_batch_size:
+                    siguiente = solicitud
+                    break
+                
+                lote.append(solicitud)
+                imagenes += len(solicitud.datos)
+            
+            self._procesar_lote(lote)
+        
+        self._fallar_pendientes()
+    
+    def _procesar_lote(self, lote):
+        """Ejecuta un lote y reparte los resultados entre los llamadores"""
+        # Las solicitudes canceladas (timeout del llamador) no se ejecutan
+        lote = [solicitud for solicitud in lote if solicitud.future.set_running_or_notify_cancel()]
+        if not lote:
+            return
+        imagenes = sum(len(solicitud.datos) for solicitud in lote)
+        
+        self.hist_tamano_lote.observar(imagenes)
+        self.hist_profundidad_cola.observar(self._cola.qsize())
+        
+        ahora = time.perf_counter()
+        for solicitud in lote:
+            self.hist_espera_ms.observar((ahora - solicitud.timestamp) * 1000)
+        
+        try:
+            if len(lote) == 1:
+                entrada = lote[0].datos
+            else:
+                entrada = np.concatenate([s.datos for s in lote], axis=0)
+            
+            salida = self.ejecutar_lote(entrada)
+            self.lotes_ejecutados += 1
+            
+            inicio = 0
+            for solicitud in lote:
+                fin = inicio + len(solicitud.datos)
+                solicitud.future.set_result(salida[inicio:fin])
+                inicio = fin
+        
+        except Exception as e:
+            self.errores += 1
+            for solicitud in lote:
+                if not solicitud.future.done():
+                    solicitud.future.set_exception(e)
+    
+    def exportar_metricas(self):
+        """
+        Exporta las métricas del batcher
+        
+        Returns:
+            dict: Configuración, profundidad de cola e histogramas
+        """
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_latency_ms": self.max_latency * 1000,
+            "profundidad_cola": self.profundidad_cola(),
+            "lotes_ejecutados": self.lotes_ejecutados,
+            "errores": self.errores,
+            "tamano_lote": self.hist_tamano_lote.exportar(),
+            "profundidad_cola_hist": self.hist_profundidad_cola.exportar(),
+            "espera_ms": self.hist_espera_ms.exportar()
+        }
+    
+    def exportar_prometheus(self, prefijo="bucaraflora_microbatch"):
+        """Exporta las métricas en formato de texto de Prometheus"""
+        lineas = [
+            f"# TYPE {prefijo}_queue_depth gauge",
+            f"{prefijo}_queue_depth {self.profundidad_cola()}",
+            f"# TYPE {prefijo}_batches_total counter",
+            f"{prefijo}_batches_total {self.lotes_ejecutados}",
+            f"# TYPE {prefijo}_errors_total counter",
+            f"{prefijo}_errors_total {self.errores}"
+        ]
+        
+        histogramas = {
+            "batch_size": self.hist_tamano_lote,
+            "queue_depth_observed": self.hist_profundidad_cola,
+            "wait_ms": self.hist_espera_ms
+        }
+        
+        for nombre, histograma in histogramas.items():
+            datos = histograma.exportar()
+            lineas.append(f"# TYPE {prefijo}_{nombre} histogram")
+            for limite, conteo in datos["buckets"].items():
+                lineas.append(f'{prefijo}_{nombre}_bucket{{le="{limite}"}} {conteo}')
+            lineas.append(f"{prefijo}_{nombre}_sum {datos['sum']}")
+            lineas.append(f"{prefijo}_{nombre}_count {datos['count']}")
+        
+        return "\n".join(lineas) + "\n"
@@ -0,0 +1,367 @@
+# utils/session_log.py - HISTORIAL DE SESIONES EN SEGMENTOS JSONL DE SOLO-AGREGADO
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo exclusión entre hilos del mismo proceso
+    fcntl = None
+
+PREFIJO_SEGMENTO = "sesiones-"
+EXTENSION_SEGMENTO = ".jsonl"
+CAMPO_SECUENCIA = "_secuencia"
+
+class RegistroSesiones:
+    """
+    Historial de sesiones como log de solo-agregado en segmentos JSONL
+    
+    Cada sesión es una línea escrita con una única llamada write en modo
+    append, bajo un flock sobre el directorio para que varios procesos
+    puedan escribir a la vez. Al pasar max_bytes_segmento se abre un
+    segmento nuevo; cuando hay más de max_segmentos cerrados se compactan
+    en uno solo (última versión de cada session_id, hasta max_registros)
+    desde un hilo de fondo, sin frenar a quien agrega.
+    
+    Cada registro lleva un número de secuencia creciente (CAMPO_SECUENCIA)
+    que la compactación conserva: un lector sabe qué registros ya había
+    visto aunque su segmento haya sido compactado.
+    """
+    
+    def __init__(self, directorio, max_bytes_segmento=1024 * 1024, max_segmentos=8,
+                 max_registros=10000):
+        """
+        Args:
+            directorio: Carpeta de los segmentos
+            max_bytes_segmento: Tamaño a partir del cual se rota el segmento activo
+            max_segmentos: Segmentos cerrados permitidos antes de compactar
+            max_registros: Sesiones que conserva la compactación (las más recientes)
+        """
+        self.directorio = Path(directorio)
+        self.max_bytes_segmento = max(1, int(max_bytes_segmento))
+        self.max_segmentos = max(1, int(max_segmentos))
+        self.max_registros = max(1, int(max_registros))
+        self._lock_hilos = threading.Lock()
+        self._compactando = threading.Lock()
+        
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self._lock_file = self.directorio / ".lock"
+        self._lock_compactacion_file = self.directorio / ".compactacion"
+        self._secuencia_file = self.directorio / ".secuencia"
+        self._migracion_file = self.directorio / ".migrado"
+    
+    # ==================== ESCRITURA ====================
+    
+    @contextmanager
+    def _bloqueo(self):
+        """Exclusión entre hilos y, con fcntl, entre procesos"""
+        with self._lock_hilos:
+            if fcntl is None:
+                yield
+                return
+            
+            with open(self._lock_file, 'a') as lock:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+    
+    @contextmanager
+    def _bloqueo_compactacion(self):
+        """
+        Un solo compactador a la vez entre hilos y procesos (sin esperar)
+        
+        Returns:
+            bool: True si se obtuvo el bloqueo; False si otro ya está compactando
+        """
+        if not self._compactando.acquire(blocking=False):
+            yield False
+            return
+        try:
+            if fcntl is None:
+                yield True
+                return
+            
+            with open(self._lock_compactacion_file, 'a') as lock:
+                try:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    yield False
+                    return
+                try:
+                    yield True
+                finally:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._compactando.release()
+    
+    def segmentos(self):
+        """Segmentos existentes, del más antiguo al más reciente"""
+        return sorted(self.directorio.glob(f"{PREFIJO_SEGMENTO}*{EXTENSION_SEGMENTO}"))
+    
+    def _ruta_segmento(self, numero):
+        return self.directorio / f"{PREFIJO_SEGMENTO}{numero:06d}{EXTENSION_SEGMENTO}"
+    
+    def _numero_segmento(self, ruta):
+        return int(ruta.stem[len(PREFIJO_SEGMENTO):])
+    
+    def agregar(self, registro):
+        """
+        Agrega una sesión al final del log
+        
+        Args:
+            registro: dict serializable a JSON (normalmente SesionPrediccion.to_dict())
+        """
+        self.agregar_lote([registro])
+    
+    def _reservar_secuencia(self, cantidad):
+        """
+        Reserva cantidad números de secuencia consecutivos (requiere el bloqueo)
+        
+        Returns:
+            int: Primer número reservado
+        """
+        fd = os.open(self._secuencia_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            contenido = os.read(fd, 32).strip()
+            try:
+                ultima = int(contenido)
+            except ValueError:
+                # Contador nuevo o dañado: continuar desde el máximo del log
+                ultima = max((registro.get(CAMPO_SECUENCIA, 0) for registro in self.leer()), default=0)
+            
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, str(ultima + cantidad).encode('ascii'))
+        finally:
+            os.close(fd)
+        return ultima + 1
+    
+    def agregar_lote(self, registros):
+        """
+        Agrega varias sesiones con una sola escritura (un bloqueo, un write)
+        
+        Args:
+            registros: Lista de dicts serializables a JSON
+        """
+        if not registros:
+            return
+        
+        with self._bloqueo():
+            primera = self._reservar_secuencia(len(registros))
+            lineas = "".join(
+                json.dumps({**registro, CAMPO_SECUENCIA: primera + i}, ensure_ascii=False, separators=(',', ':')) + "\n"
+                for i, registro in enumerate(registros)
+            ).encode('utf-8')
+            
+            segmentos = self.segmentos()
+            activo = segmentos[-1] if segmentos else self._ruta_segmento(1)
+            
+            rotado = activo.exists() and activo.stat().st_size >= self.max_bytes_segmento
+            if rotado:
+                activo = self._ruta_segmento(self._numero_segmento(activo) + 1)
+            
+            fd = os.open(activo, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, lineas)
+            finally:
+                os.close(fd)
+        
+        if rotado and len(segmentos) > self.max_segmentos:
+            self._compactar_en_segundo_plano()
+    
+    def _compactar_en_segundo_plano(self):
+        """Lanza compactar() en un hilo para no demorar la escritura que rotó el segmento"""
+        if self._compactando.locked():
+            return
+        threading.Thread(target=self.compactar, name="compactar-sesiones", daemon=True).start()
+    
+    def compactar(self):
+        """
+        Une los segmentos cerrados en el más antiguo (el activo no se toca)
+        
+        Los segmentos cerrados ya no reciben escrituras: se leen y se escribe
+        el compactado sin el bloqueo de escritura, que solo se toma para
+        reemplazar los archivos. Si otro hilo o proceso ya está compactando,
+        no hace nada.
+        
+        Returns:
+            bool: True si se compactó
+        """
+        with self._bloqueo_compactacion() as obtenido:
+            if not obtenido:
+                return False
+            try:
+                return self._compactar(self.segmentos()[:-1])
+            except Exception as e:
+                print(f"⚠️ Error compactando historial de sesiones: {e}")
+                return False
+    
+    def _compactar(self, cerrados):
+        """Compacta una lista de segmentos cerrados (requiere el bloqueo de compactación)"""
+        if len(cerrados) < 2:
+            return False
+        
+        estado = {segmento: self._firma(segmento) for segmento in cerrados}
+        
+        # Última versión de cada sesión, en orden de escritura
+        por_sesion = {}
+        sin_id = []
+        for registro in self._leer_segmentos(cerrados):
+            session_id = registro.get("session_id")
+            if session_id is None:
+                sin_id.append(registro)
+            else:
+                por_sesion.pop(session_id, None)
+                por_sesion[session_id] = registro
+        
+        registros = (sin_id + list(por_sesion.values()))[-self.max_registros:]
+        
+        destino = cerrados[0]
+        tmp_file = destino.with_suffix(".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            for registro in registros:
+                f.write(json.dumps(registro, ensure_ascii=False, separators=(',', ':')) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        
+        with self._bloqueo():
+            # Una migración pudo agregar al segmento 0 mientras se leía
+            if any(self._firma(segmento) != firma for segmento, firma in estado.items()):
+                tmp_file.unlink(missing_ok=True)
+                return False
+            
+            os.replace(tmp_file, destino)
+            for segmento in cerrados[1:]:
+                segmento.unlink(missing_ok=True)
+        
+        print(f"🗜️ Historial de sesiones compactado: {len(cerrados)} segmentos -> 1 ({len(registros)} sesiones)")
+        return True
+    
+    def _firma(self, segmento):
+        """(inodo, tamaño) de un segmento o None si ya no existe"""
+        try:
+            info = segmento.stat()
+        except FileNotFoundError:
+            return None
+        return info.st_ino, info.st_size
+    
+    # ==================== LECTURA ====================
+    
+    def _leer_segmentos(self, segmentos):
+        """Registros de una lista de segmentos (ignora líneas incompletas o corruptas)"""
+        for segmento in segmentos:
+            try:
+                with open(segmento, 'r', encoding='utf-8') as f:
+                    for linea in f:
+                        if not linea.endswith("\n"):
+                            break  # Escritura en curso de otro proceso
+                        try:
+                            yield json.loads(linea)
+                        except json.JSONDecodeError:
+                            continue
+            except FileNotFoundError:
+                continue  # Eliminado por una compactación concurrente
+    
+    def leer(self):
+        """Itera todas las sesiones del historial, de la más antigua a la más reciente"""
+        return self._leer_segmentos(self.segmentos())
+    
+    def leer_desde(self, cursor=None):
+        """
+        Sesiones agregadas después de un cursor (lectura incremental)
+        
+        Args:
+            cursor: dict devuelto por una llamada anterior o None
+        
+        Returns:
+            tuple: (registros, nuevo_cursor, reiniciado). reiniciado es True si
+                   el cursor ya no era válido (compactación) y se leyó todo el log;
+                   nuevo_cursor["secuencia"] es la mayor secuencia leída
+        """
+        segmentos = self.segmentos()
+        inicio, offset, reiniciado = 0, 0, True
+        
+        if cursor:
+            nombres = [segmento.name for segmento in segmentos]
+            if cursor["segmento"] in nombres:
+                indice = nombres.index(cursor["segmento"])
+                try:
+                    info = segmentos[indice].stat()
+                    # Una compactación reemplaza el archivo (otro inodo)
+                    if info.st_ino == cursor["inodo"] and info.st_size >= cursor["offset"]:
+                        inicio, offset, reiniciado = indice, cursor["offset"], False
+                except FileNotFoundError:
+                    pass
+        
+        registros = []
+        nuevo_cursor = None if reiniciado else cursor
+        secuencia = 0 if reiniciado else cursor.get("secuencia", 0)
+        for segmento in segmentos[inicio:]:
+            try:
+                with open(segmento, 'rb') as f:
+                    inodo = os.fstat(f.fileno()).st_ino
+                    f.seek(offset)
+                    datos = f.read()
+            except FileNotFoundError:
+                continue
+            
+            # Solo líneas completas: el resto se lee en la próxima llamada
+            completo = datos.rfind(b"\n") + 1
+            for linea in datos[:completo].splitlines():
+                try:
+                    registro = json.loads(linea)
+                except json.JSONDecodeError:
+                    continue
+                registros.append(registro)
+                secuencia = max(secuencia, registro.get(CAMPO_SECUENCIA, 0))
+            
+            nuevo_cursor = {"segmento": segmento.name, "offset": offset + completo, "inodo": inodo,
+                            "secuencia": secuencia}
+            offset = 0
+        
+        return registros, nuevo_cursor, reiniciado
+    
+    # ==================== MIGRACIÓN ====================
+    
+    def migrar_json(self, archivo_json):
+        """
+        Importa una sola vez un historial antiguo (lista JSON)
+        
+        El archivo original no se modifica (puede estar versionado); la
+        migración hecha queda registrada en un marcador del directorio del log.
+        
+        Returns:
+            int: Sesiones importadas
+        """
+        archivo_json = Path(archivo_json)
+        
+        with self._bloqueo():
+            # Segmento 0 sin marcador: migrado por una versión que renombraba el archivo
+            if (self._migracion_file.exists() or self._ruta_segmento(0).exists()
+                    or not archivo_json.exists()):
+                return 0
+            
+            try:
+                with open(archivo_json, 'r', encoding='utf-8') as f:
+                    historial = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"⚠️ No se pudo migrar {archivo_json}: {e}")
+                return 0
+            
+            # El segmento 0 queda reservado al historial migrado: siempre es el más antiguo
+            with open(self._ruta_segmento(0), 'a', encoding='utf-8') as f:
+                for registro in historial:
+                    f.write(json.dumps(registro, ensure_ascii=False, separators=(',', ':')) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            
+            with open(self._migracion_file, 'w', encoding='utf-8') as f:
+                json.dump({"archivo": str(archivo_json), "sesiones": len(historial)}, f, ensure_ascii=False)
+        
+        print(f"📦 {len(historial)} sesiones migradas de {archivo_json.name} al historial JSONL")
+        return len(historial)
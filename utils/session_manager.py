@@ -1,18 +1,45 @@
-import json
+import atexit
 import uuid
 from datetime import datetime, timedelta
 from pathlib import Path
 import sys
+from collections import OrderedDict
 
 # Agregar el directorio padre al path
 sys.path.append(str(Path(__file__).parent.parent))
-from config import PATHS, RETRAINING_CONFIG
+from config import PATHS, RETRAINING_CONFIG, MODEL_CONFIG, SESSION_CONFIG
+from utils.session_log import RegistroSesiones
+from utils.session_stats import EstadisticasSesiones
+from utils.image_store import crear_miniatura_jpeg, obtener_almacen_imagenes
+from utils.session_store import ConflictoVersion, crear_almacen_sesiones
+
+def sesion_desactualizada(session_id):
+    """Resultado cuando la actualización optimista de una sesión pierde contra otro worker"""
+    return {
+        "error": "Sesión desactualizada",
+        "mensaje": f"La sesión {session_id} fue modificada en otro proceso; recárgala e inténtalo de nuevo",
+        "recargar_sesion": True
+    }
 
 class SesionPrediccion:
-    """Clase para manejar una sesión individual de predicción"""
+    """
+    Clase para manejar una sesión individual de predicción
+    
+    En memoria solo guarda el hash de la imagen, su vector de probabilidades
+    y una miniatura JPEG (unos KB por sesión). El original se escribe en el
+    AlmacenImagenes y imagen_original lo relee de disco cuando se necesita.
+    """
+    
+    __slots__ = ("session_id", "imagen_hash", "probabilidades", "miniatura", "_imagen_memoria", "intento_actual",
+                 "max_intentos", "predicciones_anteriores", "especies_descartadas",
+                 "timestamp_inicio", "estado", "resultado_final")
     
     def __init__(self, imagen_original=None):
         self.session_id = str(uuid.uuid4())[:8]  # ID corto único
+        self.imagen_hash = None
+        self.probabilidades = None  # Salida del modelo, se llena en el primer intento
+        self.miniatura = None  # bytes JPEG
+        self._imagen_memoria = None  # Solo si no se pudo escribir en el almacén
         self.imagen_original = imagen_original
         self.intento_actual = 1
         self.max_intentos = RETRAINING_CONFIG["max_attempts_per_prediction"]
@@ -22,6 +49,38 @@ class SesionPrediccion:
         self.estado = "activa"  # activa, completada, abandonada
         self.resultado_final = None
     
+    @property
+    def imagen_original(self):
+        """Imagen original leída del almacén en disco (None si no hay)"""
+        if self._imagen_memoria is not None:
+            return self._imagen_memoria
+        if self.imagen_hash is None:
+            return None
+        return obtener_almacen_imagenes().cargar(self.session_id)
+    
+    @imagen_original.setter
+    def imagen_original(self, imagen):
+        if imagen is None:
+            return
+        
+        from utils.image_processing import calcular_hash_imagen
+        
+        self.imagen_hash = calcular_hash_imagen(imagen)
+        self.miniatura = crear_miniatura_jpeg(
+            imagen, SESSION_CONFIG["thumbnail_size"], SESSION_CONFIG["thumbnail_quality"]
+        )
+        self._imagen_memoria = None
+        if not obtener_almacen_imagenes().guardar(self.session_id, imagen):
+            # Sin copia en disco el feedback perdería la imagen: se conserva en memoria
+            print(f"⚠️ Imagen de la sesión {self.session_id} conservada en memoria")
+            self._imagen_memoria = imagen
+    
+    def liberar_imagen(self):
+        """Elimina el original del disco (la sesión ya no lo necesita)"""
+        self._imagen_memoria = None
+        if self.imagen_hash is not None:
+            obtener_almacen_imagenes().eliminar(self.session_id)
+    
     def agregar_prediccion(self, especie, confianza, correcto=None):
         """
         Agrega una predicción a la sesión
@@ -79,6 +138,7 @@ class SesionPrediccion:
         """Convierte la sesión a diccionario para serialización"""
         return {
             "session_id": self.session_id,
+            "imagen_hash": self.imagen_hash,
             "intento_actual": self.intento_actual,
             "max_intentos": self.max_intentos,
             "predicciones_anteriores": self.predicciones_anteriores,
@@ -86,15 +146,48 @@ class SesionPrediccion:
             "timestamp_inicio": self.timestamp_inicio.isoformat(),
             "estado": self.estado,
             "resultado_final": self.resultado_final,
-            "tiempo_transcurrido": str(self.tiempo_transcurrido())
+            "tiempo_transcurrido": str(self.tiempo_transcurrido()),
+            "duracion_segundos": self.tiempo_transcurrido().total_seconds()
         }
+    
+    def to_estado(self):
+        """Estado completo para el almacén de sesiones activas"""
+        return {
+            "datos": self.to_dict(),
+            "probabilidades": self.probabilidades,
+            "miniatura": self.miniatura
+        }
+    
+    @classmethod
+    def from_estado(cls, estado):
+        """Reconstruye una sesión guardada con to_estado (sin volver a escribir la imagen)"""
+        datos = estado["datos"]
+        sesion = cls.__new__(cls)
+        sesion.session_id = datos["session_id"]
+        sesion.imagen_hash = datos.get("imagen_hash")
+        sesion.probabilidades = estado.get("probabilidades")
+        sesion.miniatura = estado.get("miniatura")
+        sesion._imagen_memoria = None
+        sesion.intento_actual = datos["intento_actual"]
+        sesion.max_intentos = datos["max_intentos"]
+        sesion.predicciones_anteriores = datos["predicciones_anteriores"]
+        sesion.especies_descartadas = set(datos["especies_descartadas"])
+        sesion.timestamp_inicio = datetime.fromisoformat(datos["timestamp_inicio"])
+        sesion.estado = datos["estado"]
+        sesion.resultado_final = datos["resultado_final"]
+        return sesion
 
 class SessionManager:
     """Gestiona todas las sesiones de predicción activas"""
     
     def __init__(self):
-        self.sesiones_activas = {}
+        # Almacén compartido (fuente de verdad) + caché local de lectura con la versión leída
+        self.almacen = crear_almacen_sesiones(SESSION_CONFIG["store_backend"], PATHS["session_store_file"])
+        self.sesiones_activas = OrderedDict()
+        self._versiones = {}
         self.sesiones_archivo = PATHS["session_data_file"]
+        self.registro = RegistroSesiones(PATHS["session_log_dir"])
+        self.estadisticas = EstadisticasSesiones(self.registro, PATHS["session_stats_file"])
         self.max_sesiones_memoria = 100  # Máximo de sesiones en memoria
         self.tiempo_expiracion = timedelta(hours=2)  # Sesiones expiran en 2 horas
         
@@ -112,6 +205,7 @@ class SessionManager:
             SesionPrediccion: Nueva sesión creada
         """
         sesion = SesionPrediccion(imagen_original)
+        self._versiones[sesion.session_id] = self.almacen.guardar(sesion.to_estado())
         self.sesiones_activas[sesion.session_id] = sesion
         
         # Limpiar sesiones viejas si hay demasiadas
@@ -130,18 +224,59 @@ class SessionManager:
         Returns:
             SesionPrediccion o None si no existe
         """
-        return self.sesiones_activas.get(session_id)
+        version = self.almacen.version(session_id)
+        if version is None:
+            # Expirada o eliminada (quizás por otro worker)
+            self.sesiones_activas.pop(session_id, None)
+            self._versiones.pop(session_id, None)
+            return None
+        
+        # Caché local vigente: nadie la modificó desde la última lectura/escritura
+        if session_id in self.sesiones_activas and self._versiones.get(session_id) == version:
+            return self.sesiones_activas[session_id]
+        
+        entrada = self.almacen.obtener(session_id)
+        if entrada is None:
+            return None
+        
+        estado, version = entrada
+        sesion = SesionPrediccion.from_estado(estado)
+        self.sesiones_activas[session_id] = sesion
+        self._versiones[session_id] = version
+        self._recortar_cache()
+        return sesion
+    
+    def guardar_sesion(self, sesion):
+        """
+        Guarda los cambios de una sesión activa en el almacén
+        
+        Si otro worker la modificó desde que se leyó, no se sobrescribe: se
+        descarta la copia local para que la próxima lectura traiga la vigente.
+        
+        Returns:
+            bool: True si se guardó
+        """
+        try:
+            self._versiones[sesion.session_id] = self.almacen.guardar(
+                sesion.to_estado(), self._versiones.get(sesion.session_id)
+            )
+            return True
+        except ConflictoVersion as e:
+            print(f"⚠️ Sesión modificada por otro proceso, se descartan los cambios locales: {e}")
+            self.sesiones_activas.pop(sesion.session_id, None)
+            self._versiones.pop(sesion.session_id, None)
+            return False
     
     def actualizar_sesion(self, session_id, **kwargs):
         """Actualiza una sesión existente"""
-        if session_id in self.sesiones_activas:
-            sesion = self.sesiones_activas[session_id]
-            
+        sesion = self.obtener_sesion(session_id)
+        if sesion is not None:
             # Actualizar atributos
             for key, value in kwargs.items():
                 if hasattr(sesion, key):
                     setattr(sesion, key, value)
             
+            self.guardar_sesion(sesion)
             return sesion
         return None
     
@@ -154,9 +289,8 @@ class SessionManager:
             especie_final: Especie confirmada
             metodo: Método de confirmación
         """
-        if session_id in self.sesiones_activas:
-            sesion = self.sesiones_activas[session_id]
-            
+        sesion = self.obtener_sesion(session_id)
+        if sesion is not None:
             if metodo == "seleccion_manual":
                 sesion.completar_con_seleccion_manual(especie_final)
             else:
@@ -170,7 +304,9 @@ class SessionManager:
                     "metodo": metodo
                 }
             
-            # Guardar sesión completada
+            # Guardar sesión completada (solo si este worker ganó la actualización)
+            if not self.guardar_sesion(sesion):
+                return None
             self.guardar_sesion_completada(sesion)
             
             print(f"✅ Sesión completada: {session_id} -> {especie_final}")
@@ -178,162 +314,95 @@ class SessionManager:
         return None
     
     def _limpiar_sesiones_viejas(self):
-        """Limpia sesiones viejas de la memoria"""
-        ahora = datetime.now()
-        sesiones_a_eliminar = []
+        """
+        Limpia sesiones viejas del almacén
         
-        for session_id, sesion in self.sesiones_activas.items():
-            if (ahora - sesion.timestamp_inicio) > self.tiempo_expiracion:
-                sesiones_a_eliminar.append(session_id)
+        El almacén quita en una operación las expiradas y las más antiguas
+        por encima de max_sesiones_memoria (cada una la extrae un solo
+        worker). Las sesiones abandonadas se guardan juntas en una sola
+        escritura.
+        """
+        limite = datetime.now() - self.tiempo_expiracion
+        abandonadas = []
         
-        for session_id in sesiones_a_eliminar:
+        for estado in self.almacen.extraer_expiradas(limite.timestamp(), self.max_sesiones_memoria):
+            sesion = SesionPrediccion.from_estado(estado)
+            self.sesiones_activas.pop(sesion.session_id, None)
+            self._versiones.pop(sesion.session_id, None)
+            sesion.liberar_imagen()
+            
             # Guardar sesión antes de eliminar si no está completada
-            sesion = self.sesiones_activas[session_id]
             if sesion.estado == "activa":
                 sesion.abandonar_sesion()
-                self.guardar_sesion_completada(sesion)
+                abandonadas.append(sesion)
             
-            del self.sesiones_activas[session_id]
-            print(f"🧹 Sesión expirada eliminada: {session_id}")
+            expirada = sesion.timestamp_inicio < limite
+            print(f"🧹 Sesión {'expirada' if expirada else 'antigua'} eliminada: {sesion.session_id}")
         
-        # Si aún hay demasiadas, eliminar las más antiguas
-        if len(self.sesiones_activas) > self.max_sesiones_memoria:
-            sesiones_ordenadas = sorted(
-                self.sesiones_activas.items(),
-                key=lambda x: x[1].timestamp_inicio
-            )
-            
-            for session_id, sesion in sesiones_ordenadas[:-self.max_sesiones_memoria]:
-                if sesion.estado == "activa":
-                    sesion.abandonar_sesion()
-                    self.guardar_sesion_completada(sesion)
-                del self.sesiones_activas[session_id]
-                print(f"🧹 Sesión antigua eliminada: {session_id}")
+        if abandonadas:
+            self.guardar_sesiones_completadas(abandonadas)
+        
+        self._recortar_cache()
+    
+    def _recortar_cache(self):
+        """Limita la caché local (las sesiones siguen en el almacén)"""
+        while len(self.sesiones_activas) > self.max_sesiones_memoria:
+            session_id, _ = self.sesiones_activas.popitem(last=False)
+            self._versiones.pop(session_id, None)
     
     def cargar_sesiones(self):
-        """Carga sesiones desde archivo (solo para estadísticas)"""
+        """Migra el historial sessions.json anterior al log JSONL (solo la primera vez)"""
         try:
-            if self.sesiones_archivo.exists():
-                with open(self.sesiones_archivo, 'r', encoding='utf-8') as f:
-                    # Solo cargar para estadísticas, no restaurar sesiones activas
-                    pass
+            self.registro.migrar_json(self.sesiones_archivo)
+            obtener_almacen_imagenes().limpiar(SESSION_CONFIG["image_max_age_hours"] * 3600)
+            self.estadisticas.actualizar()
+            atexit.register(self.estadisticas.guardar)
         except Exception as e:
             print(f"⚠️ No se pudieron cargar sesiones: {e}")
     
     def guardar_sesion_completada(self, sesion):
-        """Guarda una sesión completada para estadísticas"""
+        """Guarda una sesión completada para estadísticas (una línea al final del log)"""
         try:
-            sesiones_historial = []
-            
-            # Cargar historial existente
-            if self.sesiones_archivo.exists():
-                with open(self.sesiones_archivo, 'r', encoding='utf-8') as f:
-                    try:
-                        sesiones_historial = json.load(f)
-                    except json.JSONDecodeError:
-                        sesiones_historial = []
-            
-            # Agregar nueva sesión
-            sesiones_historial.append(sesion.to_dict())
-            
-            # Mantener solo las últimas 1000 sesiones
-            if len(sesiones_historial) > 1000:
-                sesiones_historial = sesiones_historial[-1000:]
-            
-            # Guardar
-            with open(self.sesiones_archivo, 'w', encoding='utf-8') as f:
-                json.dump(sesiones_historial, f, ensure_ascii=False, indent=2)
-            
+            self.registro.agregar(sesion.to_dict())
+            self.estadisticas.actualizar()
             print(f"💾 Sesión guardada en historial: {sesion.session_id}")
             
         except Exception as e:
             print(f"❌ Error guardando sesión: {e}")
     
+    def guardar_sesiones_completadas(self, sesiones):
+        """Guarda varias sesiones en el historial con una sola escritura"""
+        try:
+            self.registro.agregar_lote([sesion.to_dict() for sesion in sesiones])
+            self.estadisticas.actualizar()
+            print(f"💾 {len(sesiones)} sesiones guardadas en historial")
+            
+        except Exception as e:
+            print(f"❌ Error guardando sesiones: {e}")
+    
     def obtener_estadisticas(self):
         """
         Obtiene estadísticas de las sesiones
         
         Returns:
-            dict: Estadísticas de uso
+            dict: Estadísticas de uso (acumuladas y por ventana: última hora/día/semana)
         """
         stats = {
-            "sesiones_activas": len(self.sesiones_activas),
+            "sesiones_activas": self.almacen.contar(),
             "sesiones_historial": 0,
             "exito_primer_intento": 0,
             "exito_tres_intentos": 0,
             "requirio_seleccion_manual": 0,
             "sesiones_abandonadas": 0,
             "especies_mas_consultadas": {},
-            "tiempo_promedio_sesion": 0
+            "tiempo_promedio_sesion": 0,
+            "ventanas": {}
         }
         
         try:
-            # Leer historial completo
-            if self.sesiones_archivo.exists():
-                with open(self.sesiones_archivo, 'r', encoding='utf-8') as f:
-                    sesiones_historial = json.load(f)
-                
-                stats["sesiones_historial"] = len(sesiones_historial)
-                
-                if sesiones_historial:
-                    # Analizar estadísticas
-                    primer_intento = 0
-                    tres_intentos = 0
-                    manual = 0
-                    abandonadas = 0
-                    especies_count = {}
-                    tiempos = []
-                    
-                    for sesion_data in sesiones_historial:
-                        estado = sesion_data.get("estado", "")
-                        resultado = sesion_data.get("resultado_final", {})
-                        
-                        if estado == "completada" and resultado:
-                            intentos = resultado.get("intentos_necesarios", 0)
-                            metodo = resultado.get("metodo", "")
-                            especie = resultado.get("especie_final", "")
-                            
-                            if intentos == 1:
-                                primer_intento += 1
-                            if intentos <= 3:
-                                tres_intentos += 1
-                            if metodo == "seleccion_manual":
-                                manual += 1
-                            
-                            # Contar especies
-                            if especie:
-                                especies_count[especie] = especies_count.get(especie, 0) + 1
-                            
-                            # Tiempo de sesión
-                            tiempo_str = sesion_data.get("tiempo_transcurrido", "0:00:00")
-                            try:
-                                # Parse tiempo (formato "H:MM:SS.microseconds")
-                                tiempo_parts = tiempo_str.split(":")
-                                if len(tiempo_parts) >= 2:
-                                    minutos = int(tiempo_parts[1])
-                                    tiempos.append(minutos)
-                            except:
-                                pass
-                                
-                        elif estado == "abandonada":
-                            abandonadas += 1
-                    
-                    # Calcular porcentajes
-                    total_completadas = primer_intento + manual
-                    if total_completadas > 0:
-                        stats["exito_primer_intento"] = primer_intento / total_completadas
-                        stats["exito_tres_intentos"] = tres_intentos / total_completadas
-                        stats["requirio_seleccion_manual"] = manual / total_completadas
-                    
-                    stats["sesiones_abandonadas"] = abandonadas
-                    
-                    # Top 5 especies más consultadas
-                    especies_ordenadas = sorted(especies_count.items(), key=lambda x: x[1], reverse=True)
-                    stats["especies_mas_consultadas"] = dict(especies_ordenadas[:5])
-                    
-                    # Tiempo promedio
-                    if tiempos:
-                        stats["tiempo_promedio_sesion"] = sum(tiempos) / len(tiempos)
+            # Solo se leen las sesiones agregadas al log desde la última consulta
+            self.estadisticas.actualizar()
+            stats.update(self.estadisticas.resumen())
         
         except Exception as e:
             print(f"❌ Error calculando estadísticas: {e}")
@@ -348,6 +417,11 @@ class PlantPredictor:
     def __init__(self):
         self.model_utils = None
         self.modelo_cargado = False
+        
+        # Probabilidades por imagen (hash del contenido -> vector)
+        self._cache_probabilidades = OrderedDict()
+        self.max_cache_probabilidades = MODEL_CONFIG["prediction_cache_size"]
+        
         self.cargar_modelo()
     
     def cargar_modelo(self):
@@ -370,6 +444,51 @@ class PlantPredictor:
         """Verifica si el modelo está disponible"""
         return self.modelo_cargado and self.model_utils is not None
     
+    def obtener_probabilidades(self, imagen):
+        """
+        Retorna el vector de probabilidades de una imagen, ejecutando el modelo
+        solo la primera vez (cache por hash del contenido)
+        
+        Args:
+            imagen: Imagen a analizar (PIL Image, numpy array, etc.)
+        
+        Returns:
+            numpy array (clases,) o None si no se pudo procesar
+        """
+        from utils.image_processing import procesar_imagen_simple, calcular_hash_imagen
+        from utils.tracing import span
+        
+        with span("hash"):
+            clave = calcular_hash_imagen(imagen)
+        
+        if clave is not None and clave in self._cache_probabilidades:
+            self._cache_probabilidades.move_to_end(clave)
+            return self._cache_probabilidades[clave]
+        
+        with span("preprocess"):
+            imagen_procesada = procesar_imagen_simple(imagen)
+        if imagen_procesada is None:
+            return None
+        
+        with span("inference"):
+            probabilidades = self.model_utils.calcular_probabilidades(imagen_procesada)
+        
+        if probabilidades is not None and clave is not None:
+            self.precargar_probabilidades(clave, probabilidades)
+        
+        return probabilidades
+    
+    def precargar_probabilidades(self, clave, probabilidades):
+        """
+        Agrega al cache probabilidades ya calculadas (por ejemplo, las de una
+        sesión creada en otro worker) para no repetir el forward pass
+        """
+        probabilidades.setflags(write=False)  # Compartido entre intentos
+        self._cache_probabilidades[clave] = probabilidades
+        self._cache_probabilidades.move_to_end(clave)
+        while len(self._cache_probabilidades) > self.max_cache_probabilidades:
+            self._cache_probabilidades.popitem(last=False)
+    
     def predecir_planta(self, imagen, especies_excluir=None):
         """
         Predice la especie de una planta
@@ -388,11 +507,12 @@ class PlantPredictor:
             }
         
         try:
-            # Procesar imagen
-            from utils.image_processing import procesar_imagen_simple
-            imagen_procesada = procesar_imagen_simple(imagen)
+            from utils.tracing import span
+            
+            # Probabilidades (forward pass solo la primera vez por imagen)
+            probabilidades = self.obtener_probabilidades(imagen)
             
-            if imagen_procesada is None:
+            if probabilidades is None:
                 return {
                     "error": "Error procesando imagen",
                     "mensaje": "No se pudo procesar la imagen"
@@ -402,15 +522,17 @@ class PlantPredictor:
             if especies_excluir:
                 print(f"🚫 Predictor: Excluyendo {len(especies_excluir)} especies: {list(especies_excluir)[:3]}...")
             
-            # Hacer predicción
-            resultado = self.model_utils.predecir_especie(imagen_procesada, especies_excluir)
+            # Re-rankear con las exclusiones actuales
+            with span("topk"):
+                resultado = self.model_utils.rankear_predicciones(probabilidades, especies_excluir)
             
             if "error" in resultado:
                 return resultado
             
             # Obtener información adicional de la especie
             from utils.firebase_config import obtener_info_planta
-            info_especie = obtener_info_planta(resultado["especie_predicha"])
+            with span("db_lookup"):
+                info_especie = obtener_info_planta(resultado["especie_predicha"])
             
             # Preparar respuesta completa
             respuesta = {
@@ -432,7 +554,7 @@ class PlantPredictor:
                 "mensaje": str(e)
             }
     
-    def obtener_top_especies(self, imagen, cantidad=6, especies_excluir=None):
+    def obtener_top_especies(self, imagen, cantidad=6, especies_excluir=None, probabilidades=None):
         """
         Obtiene las top especies más probables
         
@@ -440,6 +562,7 @@ class PlantPredictor:
             imagen: Imagen a analizar
             cantidad: Número de especies a retornar
             especies_excluir: Especies a excluir
+            probabilidades: Vector ya calculado para la imagen (evita releerla)
         
         Returns:
             list: Lista de especies con información completa
@@ -448,27 +571,31 @@ class PlantPredictor:
             return []
         
         try:
-            # Procesar imagen
-            from utils.image_processing import procesar_imagen_simple
-            imagen_procesada = procesar_imagen_simple(imagen)
+            # Probabilidades cacheadas de la imagen
+            if probabilidades is None:
+                probabilidades = self.obtener_probabilidades(imagen)
             
-            if imagen_procesada is None:
+            if probabilidades is None:
                 return []
             
             print(f"🔍 Predictor: Obteniendo top {cantidad} especies, excluyendo {len(especies_excluir) if especies_excluir else 0}")
             
             # Obtener top especies
-            top_especies = self.model_utils.obtener_top_especies(
-                imagen_procesada, cantidad, especies_excluir
+            top_especies = self.model_utils.obtener_top_desde_probabilidades(
+                probabilidades, cantidad, especies_excluir
             )
             
+            from utils.firebase_config import obtener_info_plantas_lote
+            from utils.tracing import span
+            
+            # Información de todas las especies en una sola lectura
+            with span("db_lookup"):
+                infos_especies = obtener_info_plantas_lote([especie_data["especie"] for especie_data in top_especies])
+            
             # Agregar información completa de cada especie
             especies_completas = []
             
-            for especie_data in top_especies:
-                from utils.firebase_config import obtener_info_planta
-                info_especie = obtener_info_planta(especie_data["especie"])
-                
+            for especie_data, info_especie in zip(top_especies, infos_especies):
                 especie_completa = {
                     "especie": especie_data["especie"],
                     "confianza": especie_data["confianza"],
@@ -596,6 +723,13 @@ class EnhancedSessionManager:
         else:
             print("ℹ️ SessionManager: Sin especies excluidas")
         
+        # Guardar las probabilidades en la sesión (predecir_planta las reutiliza por hash).
+        # Si la sesión viene de otro worker, sus probabilidades evitan repetir el modelo
+        if sesion.probabilidades is not None and sesion.imagen_hash is not None:
+            self.predictor.precargar_probabilidades(sesion.imagen_hash, sesion.probabilidades)
+        elif self.predictor.verificar_modelo_disponible():
+            sesion.probabilidades = self.predictor.obtener_probabilidades(imagen)
+        
         # Hacer predicción
         resultado = self.predictor.predecir_planta(imagen, especies_excluir)
         
@@ -618,6 +752,9 @@ class EnhancedSessionManager:
         else:
             print(f"❌ SessionManager: Error en predicción: {resultado.get('mensaje', 'Desconocido')}")
         
+        if not self.session_manager.guardar_sesion(sesion):
+            return sesion_desactualizada(sesion.session_id)
+        
         return resultado
     
     def _obtener_siguiente_mejor_prediccion(self, imagen, especies_excluir):
@@ -668,18 +805,29 @@ class EnhancedSessionManager:
             confianza=sesion.predicciones_anteriores[-1]["confianza"] if sesion.predicciones_anteriores else 0.0,
             correcto=True
         )
+        if not self.session_manager.guardar_sesion(sesion):
+            # Otro worker actualizó la sesión primero: no duplicar el feedback
+            return sesion_desactualizada(sesion.session_id)
         
-        # Guardar feedback
-        return self.predictor.guardar_resultado_feedback(
+        # Guardar feedback (última lectura del original: después se libera del disco)
+        resultado = self.predictor.guardar_resultado_feedback(
             imagen=sesion.imagen_original,
             especie_final=especie_confirmada,
             session_id=sesion.session_id,
             correcto=True,
             metodo="prediccion"
         )
+        sesion.liberar_imagen()
+        return resultado
     
     def rechazar_prediccion(self, sesion, especie_rechazada):
-        """Rechaza la predicción actual"""
+        """
+        Rechaza la predicción actual
+        
+        Returns:
+            bool: Si ya hay que mostrar las top especies; None si otro worker
+                  modificó la sesión (recargarla con obtener_sesion_activa)
+        """
         print(f"🚫 SessionManager: Rechazando predicción: {especie_rechazada}")
         
         # Actualizar sesión
@@ -688,6 +836,8 @@ class EnhancedSessionManager:
         
         sesion.especies_descartadas.add(especie_rechazada)
         sesion.intento_actual += 1
+        if not self.session_manager.guardar_sesion(sesion):
+            return None
         
         print(f"📊 SessionManager: Intento actual: {sesion.intento_actual}/{sesion.max_intentos}")
         print(f"🚫 SessionManager: Especies descartadas: {list(sesion.especies_descartadas)}")
@@ -697,15 +847,20 @@ class EnhancedSessionManager:
     def completar_con_seleccion_manual(self, sesion, especie_seleccionada):
         """Completa la sesión con selección manual del usuario"""
         sesion.completar_con_seleccion_manual(especie_seleccionada)
+        if not self.session_manager.guardar_sesion(sesion):
+            # Otro worker actualizó la sesión primero: no duplicar el feedback
+            return sesion_desactualizada(sesion.session_id)
         
-        # Guardar feedback
-        return self.predictor.guardar_resultado_feedback(
+        # Guardar feedback (última lectura del original: después se libera del disco)
+        resultado = self.predictor.guardar_resultado_feedback(
             imagen=sesion.imagen_original,
             especie_final=especie_seleccionada,
             session_id=sesion.session_id,
             correcto=False,  # No fue predicción correcta automática
             metodo="seleccion_manual"
         )
+        sesion.liberar_imagen()
+        return resultado
     
     def obtener_top_especies_para_seleccion(self, sesion):
         """Obtiene las top especies para selección manual"""
@@ -713,10 +868,12 @@ class EnhancedSessionManager:
         
         print(f"🔍 SessionManager: Obteniendo {cantidad} especies, excluyendo: {list(sesion.especies_descartadas)}")
         
+        # Con las probabilidades de la sesión no hace falta leer el original de disco
         return self.predictor.obtener_top_especies(
-            imagen=sesion.imagen_original,
+            imagen=sesion.imagen_original if sesion.probabilidades is None else None,
             cantidad=cantidad,
-            especies_excluir=sesion.especies_descartadas
+            especies_excluir=sesion.especies_descartadas,
+            probabilidades=sesion.probabilidades
         )
 
 # Instancia global del gestor de sesiones mejorado
@@ -730,6 +887,10 @@ def obtener_sesion_activa(session_id):
     """Función de conveniencia para obtener una sesión"""
     return session_manager.session_manager.obtener_sesion(session_id)
 
+def guardar_sesion_activa(sesion):
+    """Función de conveniencia para guardar los cambios de una sesión"""
+    return session_manager.session_manager.guardar_sesion(sesion)
+
 def completar_sesion_exitosa(session_id, especie_final, metodo="prediccion"):
     """Función de conveniencia para completar una sesión"""
     return session_manager.session_manager.completar_sesion(session_id, especie_final, metodo)
@@ -0,0 +1,305 @@
+# utils/session_stats.py - ESTADÍSTICAS INCREMENTALES DEL HISTORIAL DE SESIONES
+
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from utils.session_log import CAMPO_SECUENCIA
+
+# Contadores acumulados por sesión (mismo orden en totales y buckets)
+CAMPOS = ("sesiones", "completadas", "primer_intento", "tres_intentos",
+          "seleccion_manual", "abandonadas", "suma_segundos", "con_duracion")
+
+# nombre -> (número de buckets, ancho del bucket en segundos)
+VENTANAS = {
+    "ultima_hora": (60, 60),
+    "ultimo_dia": (24, 3600),
+    "ultima_semana": (7 * 24, 3600)
+}
+
+VERSION_SNAPSHOT = 1
+
+def duracion_segundos(sesion_data):
+    """
+    Duración de una sesión del historial en segundos
+    
+    Usa duracion_segundos si existe; los registros anteriores solo traen
+    str(timedelta): "H:MM:SS.ffffff" o "N days, H:MM:SS.ffffff".
+    """
+    if sesion_data.get("duracion_segundos") is not None:
+        return float(sesion_data["duracion_segundos"])
+    
+    texto = sesion_data.get("tiempo_transcurrido")
+    if not texto:
+        return None
+    
+    coincidencia = re.fullmatch(r"(?:(-?\d+) days?, )?(\d+):(\d{2}):(\d{2}(?:\.\d+)?)", texto.strip())
+    if not coincidencia:
+        return None
+    
+    dias, horas, minutos, segundos = coincidencia.groups()
+    return int(dias or 0) * 86400 + int(horas) * 3600 + int(minutos) * 60 + float(segundos)
+
+def _timestamp_fin(sesion_data, duracion):
+    """Momento (epoch) en que terminó la sesión; ahora si no se puede calcular"""
+    try:
+        inicio = datetime.fromisoformat(sesion_data["timestamp_inicio"]).timestamp()
+        return inicio + (duracion or 0.0)
+    except (KeyError, TypeError, ValueError):
+        return time.time()
+
+class _Anillo:
+    """Buckets circulares con totales corridos: consultar la ventana es O(1)"""
+    
+    def __init__(self, num_buckets, ancho_s):
+        self.num_buckets = num_buckets
+        self.ancho = ancho_s
+        self.buckets = [[0] * len(CAMPOS) for _ in range(num_buckets)]
+        self.totales = [0] * len(CAMPOS)
+        self.ultimo = None  # Índice absoluto (epoch // ancho) del bucket más reciente
+    
+    def _avanzar(self, indice):
+        """Descarta los buckets que salen de la ventana al llegar a indice"""
+        if self.ultimo is None:
+            self.ultimo = indice
+            return
+        if indice <= self.ultimo:
+            return
+        
+        for paso in range(1, min(indice - self.ultimo, self.num_buckets) + 1):
+            bucket = self.buckets[(self.ultimo + paso) % self.num_buckets]
+            for i, valor in enumerate(bucket):
+                self.totales[i] -= valor
+                bucket[i] = 0
+        self.ultimo = indice
+    
+    def agregar(self, timestamp, valores):
+        indice = int(timestamp // self.ancho)
+        self._avanzar(indice)
+        if indice <= self.ultimo - self.num_buckets:
+            return  # Fuera de la ventana
+        
+        bucket = self.buckets[indice % self.num_buckets]
+        for i, valor in enumerate(valores):
+            bucket[i] += valor
+            self.totales[i] += valor
+    
+    def totales_en(self, ahora):
+        self._avanzar(int(ahora // self.ancho))
+        return dict(zip(CAMPOS, self.totales))
+    
+    def to_dict(self):
+        return {"buckets": self.buckets, "totales": self.totales, "ultimo": self.ultimo}
+    
+    def cargar(self, datos):
+        if len(datos["buckets"]) == self.num_buckets:
+            self.buckets = datos["buckets"]
+            self.totales = datos["totales"]
+            self.ultimo = datos["ultimo"]
+
+class EstadisticasSesiones:
+    """
+    Agregados del historial de sesiones mantenidos de forma incremental
+    
+    actualizar() lee solo lo agregado al RegistroSesiones desde la última
+    vez (también lo escrito por otros procesos). Los agregados y el cursor
+    del log se guardan en un snapshot junto al log, así al reiniciar solo
+    se procesan las sesiones nuevas.
+    
+    Si una compactación invalida el cursor, el log se relee completo pero
+    solo se aplican los registros con secuencia posterior a la ya vista:
+    los agregados no se limitan a las sesiones que conserva el log.
+    """
+    
+    def __init__(self, registro, archivo_snapshot, guardar_cada=50):
+        """
+        Args:
+            registro: RegistroSesiones con el historial
+            archivo_snapshot: JSON donde se persisten los agregados
+            guardar_cada: Sesiones aplicadas entre escrituras del snapshot
+        """
+        self.registro = registro
+        self.archivo_snapshot = Path(archivo_snapshot)
+        self.guardar_cada = max(1, int(guardar_cada))
+        self._lock = threading.Lock()
+        self._sin_guardar = 0
+        
+        self._reiniciar()
+        self._cargar_snapshot()
+    
+    def _reiniciar(self):
+        self.totales = dict.fromkeys(CAMPOS, 0)
+        self.especies = Counter()
+        self.anillos = {nombre: _Anillo(*parametros) for nombre, parametros in VENTANAS.items()}
+        self.cursor = None
+    
+    # ==================== ACTUALIZACIÓN ====================
+    
+    def aplicar(self, sesion_data):
+        """Incorpora una sesión del historial a los agregados"""
+        valores = dict.fromkeys(CAMPOS, 0)
+        valores["sesiones"] = 1
+        
+        estado = sesion_data.get("estado", "")
+        resultado = sesion_data.get("resultado_final") or {}
+        duracion = None
+        
+        if estado == "completada" and resultado:
+            intentos = resultado.get("intentos_necesarios", 0)
+            valores["completadas"] = 1
+            valores["primer_intento"] = int(intentos == 1)
+            valores["tres_intentos"] = int(intentos <= 3)
+            valores["seleccion_manual"] = int(resultado.get("metodo", "") == "seleccion_manual")
+            
+            especie = resultado.get("especie_final", "")
+            if especie:
+                self.especies[especie] += 1
+            
+            duracion = duracion_segundos(sesion_data)
+            if duracion is not None:
+                valores["suma_segundos"] = duracion
+                valores["con_duracion"] = 1
+        
+        elif estado == "abandonada":
+            valores["abandonadas"] = 1
+        
+        for campo, valor in valores.items():
+            self.totales[campo] += valor
+        
+        fin = _timestamp_fin(sesion_data, duracion)
+        fila = [valores[campo] for campo in CAMPOS]
+        for anillo in self.anillos.values():
+            anillo.agregar(fin, fila)
+    
+    def actualizar(self):
+        """
+        Aplica las sesiones agregadas al log desde la última actualización
+        
+        Returns:
+            int: Sesiones nuevas aplicadas
+        """
+        with self._lock:
+            vista = (self.cursor or {}).get("secuencia", 0)
+            registros, cursor, reiniciado = self.registro.leer_desde(self.cursor)
+            if reiniciado:
+                if vista:
+                    # Log compactado: saltar lo ya aplicado (por secuencia)
+                    registros = [r for r in registros if r.get(CAMPO_SECUENCIA, 0) > vista]
+                else:
+                    # Primera carga o cursor sin secuencia: reconstruir desde cero
+                    self._reiniciar()
+            
+            for sesion_data in registros:
+                self.aplicar(sesion_data)
+            self.cursor = cursor
+            
+            self._sin_guardar += len(registros)
+            if self._sin_guardar >= self.guardar_cada or (reiniciado and registros):
+                self._guardar_snapshot()
+            
+            return len(registros)
+    
+    # ==================== CONSULTA ====================
+    
+    def _tasas(self, totales):
+        """Porcentajes y tiempo promedio a partir de un conjunto de contadores"""
+        # Mismo denominador que el cálculo original sobre sessions.json
+        total_completadas = totales["primer_intento"] + totales["seleccion_manual"]
+        tasas = {
+            "exito_primer_intento": 0,
+            "exito_tres_intentos": 0,
+            "requirio_seleccion_manual": 0,
+            "sesiones_abandonadas": totales["abandonadas"],
+            "tiempo_promedio_sesion": 0  # minutos
+        }
+        
+        if total_completadas > 0:
+            tasas["exito_primer_intento"] = totales["primer_intento"] / total_completadas
+            tasas["exito_tres_intentos"] = totales["tres_intentos"] / total_completadas
+            tasas["requirio_seleccion_manual"] = totales["seleccion_manual"] / total_completadas
+        
+        if totales["con_duracion"]:
+            tasas["tiempo_promedio_sesion"] = totales["suma_segundos"] / totales["con_duracion"] / 60
+        
+        return tasas
+    
+    def resumen(self, cantidad_especies=5):
+        """
+        Estadísticas globales y por ventana de tiempo
+        
+        Returns:
+            dict: Mismas claves que SessionManager.obtener_estadisticas más "ventanas"
+        """
+        with self._lock:
+            ahora = time.time()
+            stats = {
+                "sesiones_historial": self.totales["sesiones"],
+                **self._tasas(self.totales),
+                "especies_mas_consultadas": dict(self.especies.most_common(cantidad_especies)),
+                "ventanas": {}
+            }
+            
+            for nombre, anillo in self.anillos.items():
+                totales = anillo.totales_en(ahora)
+                stats["ventanas"][nombre] = {
+                    "sesiones": totales["sesiones"],
+                    "completadas": totales["completadas"],
+                    **self._tasas(totales)
+                }
+            
+            return stats
+    
+    # ==================== PERSISTENCIA ====================
+    
+    def guardar(self):
+        """Escribe el snapshot de los agregados"""
+        with self._lock:
+            self._guardar_snapshot()
+    
+    def _guardar_snapshot(self):
+        tmp_file = None
+        try:
+            self.archivo_snapshot.parent.mkdir(parents=True, exist_ok=True)
+            # Temporal propio de cada proceso: varios workers guardan el mismo snapshot
+            fd, tmp_file = tempfile.mkstemp(prefix=self.archivo_snapshot.name + ".",
+                                            suffix=".tmp", dir=self.archivo_snapshot.parent)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({
+                    "version": VERSION_SNAPSHOT,
+                    "cursor": self.cursor,
+                    "totales": self.totales,
+                    "especies": dict(self.especies),
+                    "anillos": {nombre: anillo.to_dict() for nombre, anillo in self.anillos.items()}
+                }, f, ensure_ascii=False)
+            os.replace(tmp_file, self.archivo_snapshot)
+            self._sin_guardar = 0
+        except Exception as e:
+            print(f"⚠️ Error guardando estadísticas de sesiones: {e}")
+            if tmp_file is not None:
+                Path(tmp_file).unlink(missing_ok=True)
+    
+    def _cargar_snapshot(self):
+        if not self.archivo_snapshot.exists():
+            return
+        
+        try:
+            with open(self.archivo_snapshot, 'r', encoding='utf-8') as f:
+                datos = json.load(f)
+            if datos.get("version") != VERSION_SNAPSHOT:
+                return
+            
+            self.totales.update(datos["totales"])
+            self.especies = Counter(datos["especies"])
+            for nombre, anillo in self.anillos.items():
+                if nombre in datos["anillos"]:
+                    anillo.cargar(datos["anillos"][nombre])
+            self.cursor = datos["cursor"]
+        except Exception as e:
+            print(f"⚠️ Snapshot de estadísticas ilegible, se reconstruirá: {e}")
+            self._reiniciar()
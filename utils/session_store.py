@@ -0,0 +1,233 @@
+# utils/session_store.py - ALMACÉN DE SESIONES ACTIVAS COMPARTIDO ENTRE PROCESOS
+
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+class ConflictoVersion(Exception):
+    """La sesión cambió (otro proceso la guardó) desde que se leyó"""
+
+def _timestamp(estado):
+    return datetime.fromisoformat(estado["datos"]["timestamp_inicio"]).timestamp()
+
+class AlmacenSesionesMemoria:
+    """
+    Sesiones activas en un OrderedDict del proceso (un solo worker)
+    
+    El estado de una sesión es un dict {"datos", "probabilidades", "miniatura"}
+    (ver SesionPrediccion.to_estado). Cada guardado incrementa la versión;
+    guardar con una versión distinta de la actual lanza ConflictoVersion.
+    """
+    
+    def __init__(self):
+        self._sesiones = OrderedDict()  # session_id -> (estado, version), en orden de creación
+        self._lock = threading.Lock()
+    
+    def obtener(self, session_id):
+        """
+        Returns:
+            tuple: (estado, version) o None si no existe
+        """
+        with self._lock:
+            return self._sesiones.get(session_id)
+    
+    def version(self, session_id):
+        with self._lock:
+            entrada = self._sesiones.get(session_id)
+            return entrada[1] if entrada else None
+    
+    def guardar(self, estado, version_esperada=None):
+        """
+        Inserta (version_esperada=None) o actualiza una sesión
+        
+        Returns:
+            int: Nueva versión
+        """
+        session_id = estado["datos"]["session_id"]
+        with self._lock:
+            actual = self._sesiones.get(session_id)
+            version_actual = actual[1] if actual else None
+            if version_actual != version_esperada:
+                raise ConflictoVersion(f"{session_id}: versión {version_actual}, se esperaba {version_esperada}")
+            
+            version = (version_actual or 0) + 1
+            self._sesiones[session_id] = (estado, version)
+            return version
+    
+    def eliminar(self, session_id):
+        with self._lock:
+            self._sesiones.pop(session_id, None)
+    
+    def contar(self):
+        with self._lock:
+            return len(self._sesiones)
+    
+    def extraer_expiradas(self, limite_ts, max_sesiones):
+        """
+        Quita y retorna las sesiones iniciadas antes de limite_ts y, si aún
+        sobran, las más antiguas hasta dejar max_sesiones
+        
+        Returns:
+            list: Estados de las sesiones quitadas
+        """
+        extraidas = []
+        with self._lock:
+            while self._sesiones:
+                estado, _ = next(iter(self._sesiones.values()))
+                if _timestamp(estado) >= limite_ts and len(self._sesiones) <= max_sesiones:
+                    break
+                self._sesiones.popitem(last=False)
+                extraidas.append(estado)
+        return extraidas
+
+class AlmacenSesionesSQLite:
+    """
+    Sesiones activas en una base SQLite en modo WAL
+    
+    Los workers de la misma máquina comparten el archivo: un reintento que
+    llega a otro proceso encuentra la sesión (con sus probabilidades) y las
+    sesiones sobreviven a reinicios. Mismo contrato que AlmacenSesionesMemoria;
+    las escrituras son UPDATE ... WHERE version = ? (concurrencia optimista).
+    """
+    
+    def __init__(self, ruta, timeout_s=5.0):
+        """
+        Args:
+            ruta: Archivo de la base de datos
+            timeout_s: Espera máxima por el bloqueo de escritura de otro proceso
+        """
+        self.ruta = Path(ruta)
+        self.timeout = timeout_s
+        self._local = threading.local()  # Una conexión por hilo
+        
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        conexion = self._conexion()
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.execute("""
+            CREATE TABLE IF NOT EXISTS sesiones (
+                session_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                timestamp_inicio REAL NOT NULL,
+                datos TEXT NOT NULL,
+                probabilidades BLOB,
+                miniatura BLOB
+            )
+        """)
+        conexion.execute("CREATE INDEX IF NOT EXISTS idx_sesiones_inicio ON sesiones (timestamp_inicio)")
+    
+    def _conexion(self):
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            # isolation_level=None: transacciones explícitas con BEGIN IMMEDIATE
+            conexion = sqlite3.connect(self.ruta, timeout=self.timeout, isolation_level=None)
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return conexion
+    
+    def _estado(self, fila):
+        datos, probabilidades, miniatura = fila
+        return {
+            "datos": json.loads(datos),
+            "probabilidades": np.frombuffer(probabilidades, dtype=np.float32) if probabilidades else None,
+            "miniatura": miniatura
+        }
+    
+    def obtener(self, session_id):
+        fila = self._conexion().execute(
+            "SELECT datos, probabilidades, miniatura, version FROM sesiones WHERE session_id = ?",
+            (session_id,)
+        ).fetchone()
+        if fila is None:
+            return None
+        return self._estado(fila[:3]), fila[3]
+    
+    def version(self, session_id):
+        fila = self._conexion().execute(
+            "SELECT version FROM sesiones WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return fila[0] if fila else None
+    
+    def guardar(self, estado, version_esperada=None):
+        datos = estado["datos"]
+        probabilidades = estado.get("probabilidades")
+        valores = (
+            json.dumps(datos, ensure_ascii=False, separators=(',', ':')),
+            np.asarray(probabilidades, dtype=np.float32).tobytes() if probabilidades is not None else None,
+            estado.get("miniatura")
+        )
+        conexion = self._conexion()
+        
+        if version_esperada is None:
+            try:
+                conexion.execute(
+                    "INSERT INTO sesiones (datos, probabilidades, miniatura, session_id, version, timestamp_inicio) "
+                    "VALUES (?, ?, ?, ?, 1, ?)",
+                    valores + (datos["session_id"], _timestamp(estado))
+                )
+            except sqlite3.IntegrityError:
+                raise ConflictoVersion(f"{datos['session_id']}: la sesión ya existe")
+            return 1
+        
+        cursor = conexion.execute(
+            "UPDATE sesiones SET datos = ?, probabilidades = ?, miniatura = ?, version = version + 1 "
+            "WHERE session_id = ? AND version = ?",
+            valores + (datos["session_id"], version_esperada)
+        )
+        if cursor.rowcount == 0:
+            raise ConflictoVersion(f"{datos['session_id']}: se esperaba la versión {version_esperada}")
+        return version_esperada + 1
+    
+    def eliminar(self, session_id):
+        self._conexion().execute("DELETE FROM sesiones WHERE session_id = ?", (session_id,))
+    
+    def contar(self):
+        return self._conexion().execute("SELECT COUNT(*) FROM sesiones").fetchone()[0]
+    
+    def extraer_expiradas(self, limite_ts, max_sesiones):
+        conexion = self._conexion()
+        # BEGIN IMMEDIATE: un solo worker extrae (y registra como abandonada) cada sesión
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            filas = conexion.execute(
+                "SELECT session_id, datos, probabilidades, miniatura FROM sesiones "
+                "WHERE timestamp_inicio < ? ORDER BY timestamp_inicio",
+                (limite_ts,)
+            ).fetchall()
+            
+            sobrantes = conexion.execute("SELECT COUNT(*) FROM sesiones").fetchone()[0] - len(filas) - max_sesiones
+            if sobrantes > 0:
+                filas += conexion.execute(
+                    "SELECT session_id, datos, probabilidades, miniatura FROM sesiones "
+                    "WHERE timestamp_inicio >= ? ORDER BY timestamp_inicio LIMIT ?",
+                    (limite_ts, sobrantes)
+                ).fetchall()
+            
+            conexion.executemany("DELETE FROM sesiones WHERE session_id = ?", [(fila[0],) for fila in filas])
+            conexion.execute("COMMIT")
+        except Exception:
+            conexion.execute("ROLLBACK")
+            raise
+        
+        return [self._estado(fila[1:]) for fila in filas]
+
+def crear_almacen_sesiones(backend, ruta=None):
+    """
+    Crea el almacén de sesiones activas
+    
+    Args:
+        backend: "memoria" (por proceso) o "sqlite" (compartido entre workers locales)
+        ruta: Archivo de la base de datos para "sqlite"
+    """
+    if backend == "sqlite":
+        try:
+            return AlmacenSesionesSQLite(ruta)
+        except sqlite3.Error as e:
+            print(f"⚠️ No se pudo abrir {ruta} ({e}); sesiones solo en memoria")
+    elif backend != "memoria":
+        print(f"⚠️ Backend de sesiones desconocido: {backend}; usando memoria")
+    return AlmacenSesionesMemoria()
@@ -0,0 +1,219 @@
+# utils/tracing.py - TIEMPOS POR ETAPA DEL FLUJO DE IDENTIFICACIÓN
+
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+import numpy as np
+
+from utils.micro_batching import Histograma
+
+# Etapas habituales: decode, preprocess, hash, inference, topk, db_lookup, render
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+# Duraciones por etapa de la solicitud en curso (por hilo / contexto)
+_traza_activa = ContextVar("traza_activa", default=None)
+
+class Tracer:
+    """
+    Mide la duración de cada etapa de una identificación
+    
+    Por etapa mantiene un Histograma acumulado (exportable a Prometheus) y
+    una ventana con las últimas duraciones para los percentiles recientes.
+    Los spans abiertos dentro de traza() también se suman al diccionario
+    de esa solicitud, para mostrar el desglose de una identificación.
+    """
+    
+    def __init__(self, ventana=1000, buckets_ms=None):
+        """
+        Args:
+            ventana: Duraciones recientes por etapa usadas en los percentiles
+            buckets_ms: Límites de los buckets del histograma (ms)
+        """
+        self.ventana = max(1, int(ventana))
+        self.buckets_ms = list(buckets_ms or BUCKETS_MS)
+        self._histogramas = {}
+        self._recientes = {}
+        self._lock = threading.Lock()
+        self._ultima_exportacion = 0.0
+    
+    def registrar(self, etapa, duracion_ms):
+        """Registra la duración de una etapa (ms)"""
+        with self._lock:
+            histograma = self._histogramas.get(etapa)
+            if histograma is None:
+                histograma = self._histogramas[etapa] = Histograma(self.buckets_ms)
+                self._recientes[etapa] = deque(maxlen=self.ventana)
+            self._recientes[etapa].append(duracion_ms)
+        
+        histograma.observar(duracion_ms)
+        
+        traza = _traza_activa.get()
+        if traza is not None:
+            traza[etapa] = traza.get(etapa, 0.0) + duracion_ms
+    
+    @contextmanager
+    def span(self, etapa):
+        """Mide el bloque como una etapa (también si lanza una excepción)"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(etapa, (time.perf_counter() - inicio) * 1000)
+    
+    @contextmanager
+    def traza(self, inicio=None, etapa_total="total"):
+        """
+        Agrupa los spans de una solicitud
+        
+        Args:
+            inicio: time.perf_counter() del comienzo si la solicitud empezó
+                    antes del bloque (por ejemplo, al decodificar la imagen)
+            etapa_total: Etapa en la que se registra la duración completa
+        
+        Yields:
+            dict: etapa -> ms de esta solicitud (incluye etapa_total al salir)
+        """
+        inicio = time.perf_counter() if inicio is None else inicio
+        traza = {}
+        token = _traza_activa.set(traza)
+        try:
+            yield traza
+        finally:
+            _traza_activa.reset(token)
+            total_ms = (time.perf_counter() - inicio) * 1000
+            self.registrar(etapa_total, total_ms)
+            traza[etapa_total] = total_ms
+    
+    def resumen(self):
+        """
+        Percentiles recientes e histograma acumulado por etapa
+        
+        Returns:
+            dict: etapa -> {p50_ms, p95_ms, p99_ms, media_ms, ventana, histograma}
+        """
+        with self._lock:
+            etapas = {etapa: (histograma, np.array(self._recientes[etapa]))
+                      for etapa, histograma in self._histogramas.items()}
+        
+        resumen = {}
+        for etapa, (histograma, recientes) in etapas.items():
+            p50, p95, p99 = np.percentile(recientes, [50, 95, 99]) if len(recientes) else (0.0, 0.0, 0.0)
+            resumen[etapa] = {
+                "p50_ms": float(p50),
+                "p95_ms": float(p95),
+                "p99_ms": float(p99),
+                "media_ms": float(recientes.mean()) if len(recientes) else 0.0,
+                "ventana": len(recientes),
+                "histograma": histograma.exportar()
+            }
+        
+        return resumen
+    
+    def exportar_json(self, ruta=None):
+        """
+        Exporta el resumen como JSON
+        
+        Args:
+            ruta: Archivo de destino (escritura atómica); None solo retorna el texto
+        
+        Returns:
+            str: JSON con timestamp y resumen por etapa
+        """
+        texto = json.dumps({"timestamp": time.time(), "etapas": self.resumen()},
+                           ensure_ascii=False, indent=2)
+        if ruta is not None:
+            _escribir_atomico(ruta, texto)
+        return texto
+    
+    def exportar_prometheus(self, prefijo="bucaraflora_stage", ruta=None):
+        """
+        Exporta las métricas en formato de texto de Prometheus
+        
+        Un histograma {prefijo}_duration_ms con la etiqueta stage y un gauge
+        {prefijo}_recent_ms con los cuantiles de la ventana reciente.
+        """
+        resumen = self.resumen()
+        
+        lineas = [f"# TYPE {prefijo}_duration_ms histogram"]
+        for etapa, datos in resumen.items():
+            histograma = datos["histograma"]
+            for limite, conteo in histograma["buckets"].items():
+                lineas.append(f'{prefijo}_duration_ms_bucket{{stage="{etapa}",le="{limite}"}} {conteo}')
+            lineas.append(f'{prefijo}_duration_ms_sum{{stage="{etapa}"}} {histograma["sum"]}')
+            lineas.append(f'{prefijo}_duration_ms_count{{stage="{etapa}"}} {histograma["count"]}')
+        
+        lineas.append(f"# TYPE {prefijo}_recent_ms gauge")
+        for etapa, datos in resumen.items():
+            for cuantil, clave in (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms")):
+                lineas.append(f'{prefijo}_recent_ms{{stage="{etapa}",quantile="{cuantil}"}} {datos[clave]}')
+        
+        texto = "\n".join(lineas) + "\n"
+        if ruta is not None:
+            _escribir_atomico(ruta, texto)
+        return texto
+    
+    def exportar_periodico(self, ruta_json=None, ruta_prometheus=None, intervalo_s=60):
+        """
+        Escribe los archivos de exportación si pasó el intervalo desde la última vez
+        
+        Returns:
+            bool: True si se escribieron
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            if ahora - self._ultima_exportacion < intervalo_s:
+                return False
+            self._ultima_exportacion = ahora
+        
+        try:
+            if ruta_json:
+                self.exportar_json(ruta_json)
+            if ruta_prometheus:
+                self.exportar_prometheus(ruta=ruta_prometheus)
+            return True
+        except OSError as e:
+            print(f"⚠️ Error exportando tiempos por etapa: {e}")
+            return False
+    
+    def reiniciar(self):
+        """Descarta todas las mediciones"""
+        with self._lock:
+            self._histogramas = {}
+            self._recientes = {}
+
+def _escribir_atomico(ruta, texto):
+    """Escribe un archivo de texto vía archivo temporal + os.replace"""
+    ruta = Path(ruta)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    # Temporal propio de cada proceso: varios workers exportan el mismo archivo
+    fd, tmp_file = tempfile.mkstemp(prefix=ruta.name + ".", suffix=".tmp", dir=ruta.parent)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(texto)
+        os.replace(tmp_file, ruta)
+    except BaseException:
+        Path(tmp_file).unlink(missing_ok=True)
+        raise
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+def obtener_tracer(ventana=1000):
+    """Tracer compartido del proceso (ventana solo aplica al crearlo)"""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = Tracer(ventana=ventana)
+    return _tracer
+
+def span(etapa):
+    """Span sobre el tracer compartido: with span("inference"): ..."""
+    return obtener_tracer().span(etapa)